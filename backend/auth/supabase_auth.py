@@ -1,63 +1,191 @@
-
 import os
-import jwt
-import base64
 import json
+import logging
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import jwt
 from dotenv import load_dotenv
+from services.metrics import record_cache_lookup
 
 load_dotenv()
 
 SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
 AUTH_MODE = os.getenv("AUTH_MODE", "supabase").lower()
 
+# Asymmetric (ES256) tokens are verified against the project's public keys:
+# https://<project>.supabase.co/auth/v1/.well-known/jwks.json, or a local copy
+SUPABASE_JWKS_URL = os.getenv("SUPABASE_JWKS_URL")
+SUPABASE_JWKS_FILE = os.getenv("SUPABASE_JWKS_FILE")
+JWKS_REFRESH_SECONDS = int(os.getenv("JWKS_REFRESH_SECONDS", "600"))
+
+# Verified tokens are reused until they expire, for at most this long (0 disables)
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "300"))
+AUTH_CACHE_MAX_TOKENS = int(os.getenv("AUTH_CACHE_MAX_TOKENS", "10000"))
+
+# Algorithms verified with a JWKS public key
+JWKS_ALGORITHMS = ("ES256", "RS256")
+
+logger = logging.getLogger(__name__)
+
 # Log auth mode on startup for clarity
-print(f"[AUTH] Mode: {AUTH_MODE}")
+logger.info("Auth mode: %s", AUTH_MODE)
+
+
+class VerifiedTokenCache:
+    """
+    Payloads of tokens whose signature has been verified, keyed by the token's
+    SHA-256 (raw tokens are not kept). An entry lives until the token's exp, and
+    never longer than ttl_seconds, so revoked keys stop being honoured soon after.
+    """
+
+    def __init__(self, ttl_seconds: int = 300, max_tokens: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_tokens = max(1, max_tokens)
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        if self.ttl_seconds <= 0:
+            return None
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def put(self, token: str, payload: Dict[str, Any]):
+        if self.ttl_seconds <= 0:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        if isinstance(payload.get("exp"), (int, float)):
+            expires_at = min(expires_at, payload["exp"])
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_tokens:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class JwksCache:
+    """
+    Public signing keys from a JWKS document (a URL, or a file for offline use),
+    reloaded every refresh_seconds. A token signed with an unknown key id triggers
+    an early reload (at most once per min_reload_seconds), which picks up rotated
+    keys; if a reload fails the previous keys stay in use.
+    """
+
+    def __init__(self, url: Optional[str] = None, path: Optional[str] = None,
+                 refresh_seconds: int = 600, min_reload_seconds: int = 30):
+        self.url = url
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self.min_reload_seconds = min_reload_seconds
+        self._keys: Dict[Optional[str], jwt.PyJWK] = {}
+        self._loaded_at = float("-inf")
+        self._lock = threading.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.url or self.path)
+
+    def _fetch(self) -> Dict[str, Any]:
+        if self.path:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        import httpx
+        response = httpx.get(self.url, timeout=10)
+        response.raise_for_status()
+        return response.json()
+
+    def _reload(self):
+        self._loaded_at = time.monotonic()
+        try:
+            jwk_set = jwt.PyJWKSet.from_dict(self._fetch())
+        except Exception as e:
+            logger.warning("Could not load JWKS from %s: %s", self.path or self.url, e)
+            return
+        self._keys = {key.key_id: key for key in jwk_set.keys}
+
+    def get_key(self, kid: Optional[str]) -> jwt.PyJWK:
+        with self._lock:
+            age = time.monotonic() - self._loaded_at
+            if age >= self.refresh_seconds or (kid not in self._keys and age >= self.min_reload_seconds):
+                self._reload()
+            key = self._keys.get(kid)
+            if key is None and kid is None and len(self._keys) == 1:
+                key = next(iter(self._keys.values()))
+        if key is None:
+            raise jwt.InvalidTokenError(f"Unknown signing key: {kid}")
+        return key
+
+
+_token_cache = VerifiedTokenCache(AUTH_CACHE_TTL_SECONDS, AUTH_CACHE_MAX_TOKENS)
+_jwks = JwksCache(SUPABASE_JWKS_URL, SUPABASE_JWKS_FILE, JWKS_REFRESH_SECONDS)
+
+
+def _decode(token: str) -> dict:
+    """Verifies the token's signature and expiry; returns its payload."""
+    header = jwt.get_unverified_header(token)
+    alg = header.get("alg", "HS256")
+
+    if alg in JWKS_ALGORITHMS:
+        if not _jwks.configured:
+            raise ValueError(f"{alg} tokens need SUPABASE_JWKS_URL or SUPABASE_JWKS_FILE")
+        key = _jwks.get_key(header.get("kid"))
+        if key.algorithm_name != alg:
+            raise jwt.InvalidAlgorithmError(f"Key {key.key_id} is not an {alg} key")
+        return jwt.decode(token, key, algorithms=[alg], options={"verify_aud": False})
+
+    # HS256 - use the shared secret
+    if not SUPABASE_JWT_SECRET:
+        raise ValueError("SUPABASE_JWT_SECRET is not set")
+    return jwt.decode(
+        token,
+        SUPABASE_JWT_SECRET,
+        algorithms=["HS256"],
+        options={"verify_aud": False}
+    )
+
 
 def verify_supabase_jwt(token: str) -> dict:
     # Dev bypass mode - skip all JWT validation
     if AUTH_MODE == "none":
-        print("[AUTH] Bypass mode active - returning mock user")
         return {"sub": "dev-user", "email": "dev@local", "role": "authenticated"}
-    
-    if not SUPABASE_JWT_SECRET:
-        raise ValueError("SUPABASE_JWT_SECRET is not set")
 
-    try:
-        # Decode header to see which algorithm is used
-        header_segment = token.split('.')[0]
-        # Add padding if needed
-        padded = header_segment + '=' * (4 - len(header_segment) % 4)
-        header = json.loads(base64.urlsafe_b64decode(padded))
-        alg = header.get("alg", "HS256")
-        print(f"[AUTH] JWT algorithm: {alg}")
-        
-        # ES256 requires a public key, not a secret
-        # For ES256 tokens, we need to skip verification or get the public key
-        if alg == "ES256":
-            # Supabase ES256 tokens need the public key from the JWKS endpoint
-            # For now, decode without verification but log a warning
-            print("[AUTH] WARNING: ES256 token detected. Decoding without signature verification.")
-            print("[AUTH] To properly verify ES256 tokens, configure SUPABASE_JWT_PUBLIC_KEY")
-            payload = jwt.decode(token, options={"verify_signature": False})
-            print(f"[AUTH] Decoded payload sub: {payload.get('sub')}")
-            return payload
-        
-        # HS256 - use the shared secret
-        payload = jwt.decode(
-            token, 
-            SUPABASE_JWT_SECRET, 
-            algorithms=["HS256"], 
-            options={"verify_aud": False}
-        )
+    payload = _token_cache.get(token)
+    record_cache_lookup("auth_token", payload is not None)
+    if payload is not None:
         return payload
-        
+
+    try:
+        payload = _decode(token)
     except jwt.ExpiredSignatureError:
-        print("[AUTH] Token expired")
         raise Exception("Token expired")
     except jwt.InvalidTokenError as e:
-        print(f"[AUTH] Invalid token error: {e}")
         raise Exception(f"Invalid token: {str(e)}")
+    except ValueError:
+        raise
     except Exception as e:
-        print(f"[AUTH] Unexpected error: {e}")
+        logger.exception("Unexpected JWT verification error")
         raise Exception(f"JWT verification error: {str(e)}")
 
+    _token_cache.put(token, payload)
+    return payload
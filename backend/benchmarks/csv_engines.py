@@ -0,0 +1,88 @@
+"""
+CSV ingestion benchmark: legacy utf-8 -> latin1 -> cp1252 retry chain vs. the
+sniffing reader (C engine, pyarrow engine, pyarrow with dtype hints).
+
+Usage (from backend/):  python -m benchmarks.csv_engines --rows 500000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.csv_reader as csv_reader
+from services.csv_reader import read_csv
+
+
+def legacy_read(path: str) -> pd.DataFrame:
+    try:
+        return pd.read_csv(path, encoding='utf-8')
+    except UnicodeDecodeError:
+        try:
+            return pd.read_csv(path, encoding='latin1')
+        except Exception:
+            return pd.read_csv(path, encoding='cp1252')
+
+
+def write_dataset(path: str, rows: int, late_bad_byte: bool):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "order_date": pd.date_range("2020-01-01", periods=rows, freq="min").strftime("%Y-%m-%d %H:%M:%S"),
+        "region": rng.choice(["North", "South", "East", "West"], rows),
+        "product": rng.choice([f"SKU-{i}" for i in range(500)], rows),
+        "units": rng.integers(1, 100, rows),
+        "price": rng.normal(50, 10, rows).round(2),
+        "note": np.where(rng.random(rows) < 0.3, None, "ok"),
+    })
+    df.to_csv(path, index=False)
+    if late_bad_byte:
+        with open(path, "ab") as f:
+            f.write(b"2099-01-01 00:00:00,North,Caf\xe9,1,1.0,ok\n")
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(rows: int, repeat: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        for late_bad_byte in (False, True):
+            path = os.path.join(tmp, "data.csv")
+            write_dataset(path, rows, late_bad_byte)
+            _, hints = read_csv(path)
+
+            def without_pyarrow():
+                saved = csv_reader.pa_csv
+                csv_reader.pa_csv = None
+                try:
+                    read_csv(path)
+                finally:
+                    csv_reader.pa_csv = saved
+
+            cases = {
+                "legacy retry chain": lambda: legacy_read(path),
+                "sniffed, C engine": without_pyarrow,
+                "sniffed, pyarrow": lambda: read_csv(path),
+                "sniffed, pyarrow + hints": lambda: read_csv(path, hints),
+            }
+            label = "late non-UTF-8 byte" if late_bad_byte else "clean UTF-8"
+            print(f"\n{rows} rows, {label} ({os.path.getsize(path) / 1e6:.1f} MB)")
+            for name, fn in cases.items():
+                print(f"  {name:<28}{timed(fn, repeat):8.3f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
@@ -0,0 +1,297 @@
+"""
+Hot path benchmark: dataset loads (CSV, XLSX, derived), summaries, every plan
+query_type, dashboard generation, cleaning and report operations, over a
+synthetic dataset. Results are written as JSON (one file per commit) so runs can
+be compared across commits.
+
+Usage (from backend/):
+    python -m benchmarks.hot_paths --rows 200000 --columns 12 --cardinality 50
+    python -m benchmarks.hot_paths --compare benchmarks/results/<baseline>.json
+    python -m benchmarks.hot_paths --diff OLD.json NEW.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.data_ingestion as data_ingestion
+import services.dashboard_cache as dashboard_cache
+from schemas import CleaningSuggestion
+from services.analytics_engine import AnalyticsEngine
+from services.dashboard_service import DashboardService
+from services.data_cleaning import DataCleaningService
+from services.report_service import ReportService
+from services.report_store import SqliteReportStore
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+USER = "bench"
+
+
+def synthetic_dataset(rows: int, columns: int, cardinality: int, seed: int = 0) -> pd.DataFrame:
+    """
+    A date column, then alternating categorical columns (`cardinality` distinct
+    values each) and numeric columns (5% missing), `columns` columns in all. About
+    1% of the rows are duplicates, so cleaning has something to remove.
+    """
+    rng = np.random.default_rng(seed)
+    data: Dict[str, Any] = {
+        "order_date": pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 4 * 365 * 24, rows), unit="h")
+    }
+    categories = np.array([f"value_{i}" for i in range(max(1, cardinality))])
+    for i in range(1, max(3, columns)):
+        if i % 2:
+            data[f"category_{i // 2 + 1}"] = rng.choice(categories, rows)
+        else:
+            values = rng.normal(100, 25, rows).round(2)
+            values[rng.random(rows) < 0.05] = np.nan
+            data[f"amount_{i // 2}"] = values
+    df = pd.DataFrame(data)
+    duplicates = rng.integers(0, rows, rows // 100)
+    df.iloc[duplicates[1::2]] = df.iloc[duplicates[::2]].to_numpy()[: len(duplicates[1::2])]
+    df["order_date"] = df["order_date"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    return df
+
+
+def timed(fn: Callable[[], Any], repeat: int, setup: Optional[Callable[[], Any]] = None) -> Dict[str, float]:
+    """Milliseconds per run of fn (setup, if given, runs untimed before each run and its result is passed in)."""
+    runs = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        fn(arg) if setup else fn()
+        runs.append((time.perf_counter() - start) * 1000)
+    return {
+        "min_ms": round(min(runs), 3),
+        "median_ms": round(statistics.median(runs), 3),
+        "mean_ms": round(statistics.fmean(runs), 3),
+        "repeat": repeat,
+    }
+
+
+class Workspace:
+    """Temporary data directories the services are pointed at for the run."""
+
+    def __init__(self):
+        self.root = tempfile.mkdtemp(prefix="hot_paths_")
+        self._saved = (data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR)
+        data_ingestion.UPLOAD_DIR = os.path.join(self.root, "original")
+        data_ingestion.PROCESSED_DIR = os.path.join(self.root, "processed")
+        dashboard_cache.DATA_DIR = self.root
+        self.upload_dir = os.path.join(data_ingestion.UPLOAD_DIR, USER)
+        os.makedirs(self.upload_dir)
+
+    def add(self, source: str) -> str:
+        """A new dataset id backed by a copy of source (as a fresh upload would be)."""
+        file_id = str(uuid.uuid4())
+        shutil.copyfile(source, os.path.join(self.upload_dir, file_id + os.path.splitext(source)[1]))
+        return file_id
+
+    def close(self):
+        data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR = self._saved
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def plans(df: pd.DataFrame) -> Dict[str, Dict[str, Any]]:
+    category = next(c for c in df.columns if c.startswith("category_"))
+    amount = next(c for c in df.columns if c.startswith("amount_"))
+    metrics = [{"column": amount, "operation": "sum"}, {"column": amount, "operation": "mean"}]
+    return {
+        "metadata": {"query_type": "metadata"},
+        "aggregation": {"query_type": "aggregation", "group_by": [category], "metrics": metrics, "sort": {"column": f"sum_{amount}", "order": "desc"}, "limit": 10},
+        "timeseries": {"query_type": "timeseries", "group_by": ["order_date"], "metrics": metrics[:1], "granularity": "month"},
+        "filter": {"query_type": "filter", "filters": [{"column": amount, "operator": "greater_than", "value": 120}], "sort": {"column": amount, "order": "desc"}},
+    }
+
+
+def dashboard_plan(df: pd.DataFrame) -> Dict[str, Any]:
+    categories = [c for c in df.columns if c.startswith("category_")]
+    amounts = [c for c in df.columns if c.startswith("amount_")]
+    return {"dashboard": {
+        "kpis": [{"title": "Rows", "metric": {"column": "ROW_COUNT", "operation": "count"}}]
+                + [{"title": f"Total {c}", "metric": {"column": c, "operation": "sum"}} for c in amounts[:3]],
+        "trends": [{"title": f"{c} by month", "chart_type": "line", "x": "order_date", "y": {"column": c, "operation": "sum"}} for c in amounts[:2]],
+        "distributions": [{"title": f"{amounts[0]} by {c}", "chart_type": "bar", "x": c, "y": {"column": amounts[0], "operation": "sum"}} for c in categories[:2]],
+        "data_health": {"include": True},
+    }}
+
+
+def check(result: Dict[str, Any], name: str):
+    """Fails the run if a case would only be timing its error path."""
+    if "error" in result or "error" in (result.get("result") or {}):
+        raise RuntimeError(f"{name} failed: {result}")
+
+
+def run_cases(args) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    workspace = Workspace()
+    try:
+        df = synthetic_dataset(args.rows, args.columns, args.cardinality, args.seed)
+        csv_path = os.path.join(workspace.root, "source.csv")
+        df.to_csv(csv_path, index=False)
+        ingestion = data_ingestion.DataIngestionService()
+
+        def record(name: str, fn, setup=None):
+            if args.cases and not any(name.startswith(prefix) for prefix in args.cases):
+                return
+            results[name] = timed(fn, args.repeat, setup)
+            print(f"  {name:<34}{results[name]['min_ms']:10.2f} ms  (median {results[name]['median_ms']:.2f})")
+
+        # Loads: first load of a fresh upload, then a reload once the frame cache is dropped
+        record("load_dataset.csv", lambda file_id: ingestion.load_dataset(file_id, USER), setup=lambda: workspace.add(csv_path))
+        file_id = workspace.add(csv_path)
+        ingestion.load_dataset(file_id, USER)
+
+        def drop_cached_frame():
+            data_ingestion._frame_cache.invalidate(USER, file_id)
+        record("load_dataset.csv_reload", lambda _: ingestion.load_dataset(file_id, USER), setup=drop_cached_frame)
+
+        xlsx_rows = min(args.rows, args.xlsx_rows)
+        if xlsx_rows:
+            xlsx_path = os.path.join(workspace.root, "source.xlsx")
+            df.head(xlsx_rows).to_excel(xlsx_path, index=False)
+            # Conversion of the workbook to parquet (normally done at upload) plus the load
+            record("load_dataset.xlsx", lambda xlsx_id: ingestion.load_dataset(xlsx_id, USER), setup=lambda: workspace.add(xlsx_path))
+
+        loaded = ingestion.load_dataset(file_id, USER)
+        cleaning = DataCleaningService()
+        record("generate_summary", lambda: cleaning.generate_summary(loaded))
+
+        engine = AnalyticsEngine()
+        for query_type, plan in plans(loaded).items():
+            check(engine.execute_plan(file_id, plan, USER), query_type)
+            record(f"execute_plan.{query_type}", lambda plan=plan: engine.execute_plan(file_id, plan, USER))
+
+        dashboards = DashboardService()
+        check(dashboards._execute_dashboard_plan(file_id, dashboard_plan(loaded), USER), "dashboard")
+        record("generate_dashboard_data", lambda: dashboards._execute_dashboard_plan(file_id, dashboard_plan(loaded), USER))
+
+        amount = next(c for c in loaded.columns if c.startswith("amount_"))
+        suggestions = [
+            CleaningSuggestion(action="DROP_DUPLICATES", reason="bench"),
+            CleaningSuggestion(action="FILL_NULLS", column=amount, value="median", reason="bench"),
+        ]
+        record("apply_cleaning", lambda: cleaning.apply_cleaning(file_id, suggestions, USER))
+        cleaned_id = cleaning.apply_cleaning(file_id, suggestions, USER)
+
+        def drop_cleaned_frame():
+            data_ingestion._frame_cache.invalidate(USER, cleaned_id)
+        record("load_dataset.derived", lambda _: ingestion.load_dataset(cleaned_id, USER), setup=drop_cleaned_frame)
+
+        reports = ReportService(SqliteReportStore(os.path.join(workspace.root, "reports.db"), legacy_dir=workspace.root))
+        for i in range(args.reports):
+            report = reports.create_report(f"Report {i}", file_id, USER)
+            for t in range(args.tiles):
+                reports.add_tile(report.report_id, {"type": "kpi", "title": f"KPI {t}", "data": {"value": t}}, USER)
+        tile = {"type": "chart", "title": "Chart", "chart_type": "bar", "data": [{"x": i, "y": i} for i in range(50)]}
+        record("report.create", lambda: reports.create_report("New", file_id, USER))
+        record("report.add_tile", lambda: reports.add_tile(report.report_id, dict(tile), USER))
+        record("report.get", lambda: reports.get_report(report.report_id, USER))
+        record("report.list", lambda: reports.list_reports(file_id, USER))
+        record("report.update", lambda: reports.update_report(report.report_id, {"title": "Renamed"}, USER))
+    finally:
+        workspace.close()
+    return results
+
+
+def git_commit() -> Dict[str, Any]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root, capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": sha, "dirty": dirty}
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Prints the change of each case's best time (less noisy than the median);
+    returns the cases slower than baseline by more than threshold (a fraction).
+    """
+    if baseline.get("params") != current.get("params"):
+        print(f"\nWarning: parameters differ ({baseline.get('params')} vs {current.get('params')})")
+    print(f"\nvs {baseline.get('commit')}{' (dirty)' if baseline.get('dirty') else ''}:")
+    regressions = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"  {name:<34}{'new':>10}")
+            continue
+        change = result["min_ms"] / before["min_ms"] - 1 if before["min_ms"] else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"  {name:<34}{before['min_ms']:10.2f} -> {result['min_ms']:10.2f} ms  {change:+7.1%}{flag}")
+    return regressions
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--columns", type=int, default=12, help="columns of the synthetic dataset (at least 3)")
+    parser.add_argument("--cardinality", type=int, default=50, help="distinct values per categorical column")
+    parser.add_argument("--xlsx-rows", type=int, default=20_000, help="rows of the XLSX variant (0 skips it; openpyxl is slow)")
+    parser.add_argument("--reports", type=int, default=50, help="reports stored before the report operations are timed")
+    parser.add_argument("--tiles", type=int, default=10, help="tiles per stored report")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cases", nargs="*", help="only run cases starting with these prefixes")
+    parser.add_argument("--output", help=f"result file (default: {RESULTS_DIR}/<commit>.json)")
+    parser.add_argument("--compare", help="baseline result file to compare against")
+    parser.add_argument("--diff", nargs=2, metavar=("OLD", "NEW"), help="compare two result files without running")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown (fraction of the baseline time) reported as a regression")
+    args = parser.parse_args()
+
+    if args.diff:
+        regressions = compare(load(args.diff[0]), load(args.diff[1]), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    params = {key: getattr(args, key) for key in ("rows", "columns", "cardinality", "xlsx_rows", "reports", "tiles", "repeat", "seed")}
+    print(f"{args.rows} rows x {max(3, args.columns)} columns, cardinality {args.cardinality}")
+    result = {
+        **git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.platform(),
+        "params": params,
+        "results": run_cases(args),
+    }
+
+    output = args.output
+    if output is None:
+        name = (result["commit"] or "unknown") + ("-dirty" if result["dirty"] else "")
+        output = os.path.join(RESULTS_DIR, f"{name}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nWrote {output}")
+
+    if args.compare:
+        regressions = compare(load(args.compare), result, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
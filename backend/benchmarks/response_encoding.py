@@ -0,0 +1,103 @@
+"""
+Response encoding benchmark: FastAPI's default path (jsonable_encoder + json) vs.
+FastJSONResponse, for a dashboard with long trend series and a filter result,
+plus the compressed sizes of each payload.
+
+Usage (from backend/):  python -m benchmarks.response_encoding --points 5000 --rows 1000
+"""
+import argparse
+import gzip
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schemas import AnalyticsResponse
+from services.compression import brotli
+from services.json_response import FastJSONResponse
+
+
+def dashboard_payload(points: int) -> dict:
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2020-01-01", periods=points, freq="D").strftime("%Y-%m-%d")
+    trend = [{"date": d, "sum_Sales": float(v)} for d, v in zip(dates, rng.normal(1000, 50, points).round(2))]
+    return {
+        "kpis": [{"title": f"KPI {i}", "value": float(rng.random())} for i in range(4)],
+        "trends": [{"title": f"Trend {i}", "chart_type": "line", "x": "date", "y": "sum_Sales", "data": trend} for i in range(3)],
+        "distributions": [{
+            "title": "By region", "chart_type": "bar", "x": "region", "y": "count",
+            "data": [{"region": f"R{i}", "count": int(c)} for i, c in enumerate(rng.integers(1, 1000, 10))]
+        }],
+    }
+
+
+def filter_payload(rows: int) -> AnalyticsResponse:
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({
+        "order_id": np.arange(rows),
+        "region": rng.choice(["North", "South", "East", "West"], rows),
+        "product": rng.choice([f"SKU-{i}" for i in range(500)], rows),
+        "units": rng.integers(1, 100, rows),
+        "price": rng.normal(50, 10, rows).round(2),
+        "discount": np.where(rng.random(rows) < 0.2, np.nan, 0.1),
+    })
+    return AnalyticsResponse(
+        intent="filter", answer="rows", explanation="rows", total_rows=rows,
+        chart_data=df.to_dict(orient="records")
+    )
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def default_path(payload) -> bytes:
+    # What FastAPI does for a route without a custom response class
+    content = jsonable_encoder(payload)
+    return JSONResponse(content).body
+
+
+def run(points: int, rows: int, repeat: int):
+    payloads = {
+        f"dashboard ({points} trend points x 3)": dashboard_payload(points),
+        f"filter ({rows} rows)": filter_payload(rows),
+    }
+    for name, payload in payloads.items():
+        body = FastJSONResponse(payload).body
+        print(f"\n{name}: {len(body) / 1e3:.0f} kB JSON")
+
+        cases = {"FastJSONResponse": lambda: FastJSONResponse(payload).body}
+        try:
+            default_path(payload)
+            cases["jsonable_encoder + json"] = lambda: default_path(payload)
+        except ValueError as e:
+            # Starlette's JSONResponse refuses NaN in plain dicts (Pydantic models turn it into null)
+            print(f"  jsonable_encoder + json      fails: {e}")
+        for case, fn in cases.items():
+            print(f"  {case:<28}{timed(fn, repeat) * 1e3:8.2f} ms")
+
+        sizes = {"gzip -6": lambda: gzip.compress(body, 6)}
+        if brotli is not None:
+            sizes["brotli q4"] = lambda: brotli.compress(body, quality=4)
+        for case, fn in sizes.items():
+            compressed = fn()
+            print(f"  {case:<28}{timed(fn, repeat) * 1e3:8.2f} ms  {len(compressed) / 1e3:6.0f} kB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--points", type=int, default=5000)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.points, args.rows, args.repeat)
@@ -14,7 +14,75 @@ DATA_DIR = PROJECT_ROOT / "data"
 UPLOAD_DIR = DATA_DIR / "original"
 PROCESSED_DIR = DATA_DIR / "processed"
 REPORTS_FILE = DATA_DIR / "reports.json"
+# Report storage: "sqlite" (DATA_DIR/reports.db, existing JSON reports are imported
+# on first use) or "json" (one file per report under DATA_DIR/<user>/reports)
+REPORT_STORE = os.getenv("REPORT_STORE", "sqlite")
 
 # Ensure directories exist
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(PROCESSED_DIR, exist_ok=True)
+
+# Background jobs (dashboard overview / data story generation)
+JOBS_DB_FILE = DATA_DIR / "jobs.db"
+JOB_MAX_CONCURRENCY = int(os.getenv("JOB_MAX_CONCURRENCY", "4"))
+JOB_PER_USER_LIMIT = int(os.getenv("JOB_PER_USER_LIMIT", "2"))
+# Finished jobs and their stored results are deleted this many hours after they finish
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "24"))
+
+# Data health: rows scanned per chunk, and optional approximate duplicate counting
+# (relative error of the HyperLogLog distinct-row estimate; the duplicate count is off
+# by up to about twice that times the distinct rows, and reads 0 within that margin;
+# 0 keeps counts exact)
+DATA_HEALTH_CHUNK_ROWS = int(os.getenv("DATA_HEALTH_CHUNK_ROWS", "500000"))
+DATA_HEALTH_APPROX_ERROR = float(os.getenv("DATA_HEALTH_APPROX_ERROR", "0"))
+
+# In-memory LRU cache of parsed datasets (cleaned datasets are derived from these lazily)
+DATASET_CACHE_MB = int(os.getenv("DATASET_CACHE_MB", "1024"))
+
+# Disk budget per user for materialized datasets and cached dashboards; the oldest
+# materialized versions are removed first (they can always be derived again)
+DATASET_STORAGE_MB = int(os.getenv("DATASET_STORAGE_MB", "2048"))
+
+# Threads used to profile dataset columns (null counts, modes, medians) in parallel
+PROFILE_WORKERS = int(os.getenv("PROFILE_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+# Rows of a result returned inline in a response; the rest of a filter result is paged or
+# exported, grouped and timeseries results are cut (and marked truncated)
+MAX_INLINE_ROWS = int(os.getenv("MAX_INLINE_ROWS", "1000"))
+
+# Responses at least this large are gzip/brotli compressed when the client accepts it
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+
+# Most buckets a timeseries query returns; the granularity is coarsened to fit
+TIMESERIES_MAX_POINTS = int(os.getenv("TIMESERIES_MAX_POINTS", "500"))
+
+# Approximate operations (approx_count_distinct, approx_median, approx_pNN) over fewer
+# rows than this are computed exactly; sketches only pay off on large datasets
+APPROX_MIN_ROWS = int(os.getenv("APPROX_MIN_ROWS", "1000000"))
+
+# Logging: level, "text" or "json" lines, and the fraction of per-request access lines
+# kept (failed and slow requests are always logged)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_SLOW_REQUEST_MS = float(os.getenv("LOG_SLOW_REQUEST_MS", "1000"))
+# Raw LLM responses that failed to parse, rotated at LLM_DEBUG_LOG_MB (3 backups kept)
+LLM_DEBUG_LOG = os.getenv("LLM_DEBUG_LOG", str(BACKEND_DIR / "llm_debug.log"))
+LLM_DEBUG_LOG_MB = int(os.getenv("LLM_DEBUG_LOG_MB", "10"))
+
+# Bearer token required by GET /metrics (unset: the endpoint is open, e.g. behind a private network)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Admin access (X-Admin-Token header): on-demand request profiles and their retrieval.
+# Unset disables both.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Request profiling: captured profiles are kept under PROFILE_DIR (newest PROFILE_MAX_COUNT).
+# Besides requests asking for it, a PROFILE_SAMPLE_RATE fraction of the requests under
+# PROFILE_SAMPLE_PATHS (comma-separated path prefixes) is profiled in PROFILE_MODE
+# ("sample": stack samples every PROFILE_SAMPLE_INTERVAL_MS, or "cprofile")
+PROFILE_DIR = DATA_DIR / "profiles"
+PROFILE_MAX_COUNT = int(os.getenv("PROFILE_MAX_COUNT", "50"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SAMPLE_PATHS = [p.strip() for p in os.getenv("PROFILE_SAMPLE_PATHS", "/api/").split(",") if p.strip()]
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sample").lower()
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
@@ -1,10 +1,16 @@
 import os
 import json
 import asyncio
-from typing import Dict, Any, List
+import logging
+from typing import Dict, Any, List, AsyncIterator
 from google import genai
+from services.metrics import LLM_FALLBACKS, LLM_RETRIES, LlmCall
 
-from .prompt_templates import DATA_CLEANING_PROMPT, ANALYTICS_PROMPT, ANALYTICS_INTENT_PROMPT, DASHBOARD_OVERVIEW_PROMPT, SMART_SUGGESTIONS_PROMPT, ANALYTICS_CHART_PROMPT, DATA_STORY_PROMPT
+from .prompt_templates import DATA_CLEANING_PROMPT, ANALYTICS_PROMPT, ANALYTICS_INTENT_PROMPT, DASHBOARD_OVERVIEW_PROMPT, SMART_SUGGESTIONS_PROMPT, ANALYTICS_CHART_PROMPT, DATA_STORY_PROMPT, DATA_STORY_STREAM_PROMPT, ANALYTICS_EXPLANATION_PROMPT
+
+logger = logging.getLogger(__name__)
+# Raw responses and errors, kept out of the main log (rotated, see logging_config)
+llm_debug = logging.getLogger("llm.debug")
 
 
 class GeminiClient:
@@ -13,6 +19,7 @@ class GeminiClient:
     - Configure a primary model via GEMINI_MODEL (default: gemini-1.5-flash-002)
     - Optionally add comma-separated GEMINI_MODEL_FALLBACKS for automatic failover
     """
+    provider = "gemini"
 
     def __init__(self):
         self.api_key = os.getenv("GEMINI_API_KEY")
@@ -39,6 +46,24 @@ class GeminiClient:
 
         self.client = genai.Client(api_key=self.api_key)
 
+    @property
+    def model(self) -> str:
+        """The preferred model (requests may fall back to the others on rate limits)."""
+        return self.model_candidates[0]
+
+    def _record_usage(self, call: LlmCall, usage_metadata):
+        if usage_metadata is not None:
+            call.usage(usage_metadata.prompt_token_count, usage_metadata.candidates_token_count)
+
+    def _next_model(self, model_index: int) -> int:
+        """Index of the model to retry on after a rate limit (the last one is kept)."""
+        if model_index + 1 < len(self.model_candidates):
+            LLM_FALLBACKS.labels(
+                self.provider, self.model_candidates[model_index], self.provider, self.model_candidates[model_index + 1]
+            ).inc()
+            return model_index + 1
+        return model_index
+
     def _clean_json_response(self, text: str) -> str:
         """Helper to strip markdown code blocks if present."""
         text = text.strip()
@@ -101,6 +126,54 @@ class GeminiClient:
         )
         return await self._generate_with_retry(prompt)
 
+    def stream_data_story(self, story_context: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream a plain-prose data story token by token."""
+        prompt = DATA_STORY_STREAM_PROMPT.format(
+            dataset_context=story_context.get("dataset_context", ""),
+            kpis_context=story_context.get("kpis_context", ""),
+            charts_context=story_context.get("charts_context", "")
+        )
+        return self._stream_with_retry(prompt)
+
+    def stream_analytics_explanation(self, user_query: str, explanation: str, result_preview: Any) -> AsyncIterator[str]:
+        """Stream a plain-prose explanation of an executed analytics plan."""
+        prompt = ANALYTICS_EXPLANATION_PROMPT.format(
+            user_query=user_query,
+            explanation=explanation,
+            result_preview=json.dumps(result_preview, indent=2, default=str)
+        )
+        return self._stream_with_retry(prompt)
+
+    async def _stream_with_retry(self, prompt: str, retries: int = 3) -> AsyncIterator[str]:
+        """
+        Yields text deltas as they arrive. Rate limits are retried on the next model
+        only while nothing has been emitted yet; once tokens are flowing, errors are raised.
+        """
+        model_index = 0
+
+        for attempt in range(retries):
+            model_name = self.model_candidates[min(model_index, len(self.model_candidates) - 1)]
+            emitted = False
+            try:
+                with LlmCall(self.provider, model_name, "stream") as call:
+                    stream = await self.client.aio.models.generate_content_stream(model=model_name, contents=prompt)
+                    async for chunk in stream:
+                        # Counts are cumulative; the last chunk has the totals
+                        self._record_usage(call, chunk.usage_metadata)
+                        if chunk.text:
+                            emitted = True
+                            yield chunk.text
+                return
+
+            except Exception as e:
+                if emitted or not self._is_rate_limit_error(e) or attempt == retries - 1:
+                    raise
+                wait_time = min((2**attempt) * 4, 60)
+                logger.warning("Rate limited on %s while streaming. Retrying in %ss...", model_name, wait_time)
+                LLM_RETRIES.labels(self.provider, model_name, "rate_limit").inc()
+                await asyncio.sleep(wait_time)
+                model_index = self._next_model(model_index)
+
     async def _generate_with_retry(self, prompt: str, retries: int = 5) -> Dict[str, Any]:
         """Handles content generation with retries/fallbacks for 429s and JSON parsing."""
         last_error = None
@@ -108,30 +181,36 @@ class GeminiClient:
 
         for attempt in range(retries):
             model_name = self.model_candidates[min(model_index, len(self.model_candidates) - 1)]
+            retrying = attempt + 1 < retries
             try:
-                response = await self.client.aio.models.generate_content(model=model_name, contents=prompt)
+                with LlmCall(self.provider, model_name) as call:
+                    response = await self.client.aio.models.generate_content(model=model_name, contents=prompt)
+                    self._record_usage(call, response.usage_metadata)
                 cleaned_text = self._clean_json_response(response.text)
                 return json.loads(cleaned_text)
 
             except json.JSONDecodeError as e:
                 raw_text = response.text if "response" in locals() else ""
-                with open("llm_debug.log", "a") as f:
-                    f.write(f"\n\nJSON ERROR (Attempt {attempt+1}, model={model_name}):\n{raw_text}\n")
+                llm_debug.warning("JSON ERROR (Attempt %d, model=%s):\n%s", attempt + 1, model_name, raw_text)
                 last_error = f"Failed to parse LLM response: {e}"
+                if retrying:
+                    LLM_RETRIES.labels(self.provider, model_name, "invalid_json").inc()
 
             except Exception as e:
                 error_msg = str(e)
                 if self._is_rate_limit_error(e):
                     wait_time = min((2**attempt) * 4, 60)  # 4, 8, 16, 32, 60...
-                    print(f"Rate limited on {model_name}. Retrying in {wait_time}s...")
+                    logger.warning("Rate limited on %s. Retrying in %ss...", model_name, wait_time)
                     last_error = f"Rate limit exceeded on {model_name}: {e}"
                     await asyncio.sleep(wait_time)
-                    # Try the next model if available
-                    if model_index + 1 < len(self.model_candidates):
-                        model_index += 1
+                    if retrying:
+                        LLM_RETRIES.labels(self.provider, model_name, "rate_limit").inc()
+                        # Try the next model if available
+                        model_index = self._next_model(model_index)
                 else:
-                    with open("llm_debug.log", "a") as f:
-                        f.write(f"\n\nGENERIC ERROR (Attempt {attempt+1}, model={model_name}):\n{error_msg}\n")
+                    llm_debug.warning("GENERIC ERROR (Attempt %d, model=%s):\n%s", attempt + 1, model_name, error_msg)
                     last_error = f"LLM Error on {model_name}: {e}"
+                    if retrying:
+                        LLM_RETRIES.labels(self.provider, model_name, "error").inc()
 
         return {"error": last_error or "Unknown error occurred"}
@@ -1,10 +1,16 @@
 import os
 import json
+import logging
 from openai import AsyncOpenAI
-from typing import Dict, Any, List
-from .prompt_templates import DATA_CLEANING_PROMPT, ANALYTICS_PROMPT, ANALYTICS_INTENT_PROMPT, DASHBOARD_OVERVIEW_PROMPT, ANALYTICS_CHART_PROMPT, DATA_STORY_PROMPT, SMART_SUGGESTIONS_PROMPT
+from typing import Dict, Any, List, AsyncIterator
+from services.metrics import LlmCall
+from .prompt_templates import DATA_CLEANING_PROMPT, ANALYTICS_PROMPT, ANALYTICS_INTENT_PROMPT, DASHBOARD_OVERVIEW_PROMPT, ANALYTICS_CHART_PROMPT, DATA_STORY_PROMPT, SMART_SUGGESTIONS_PROMPT, DATA_STORY_STREAM_PROMPT, ANALYTICS_EXPLANATION_PROMPT
+
+logger = logging.getLogger(__name__)
 
 class OpenAIClient:
+    provider = "openai"
+
     def __init__(self):
         self.api_key = os.getenv("OPENAI_API_KEY")
         if not self.api_key:
@@ -70,18 +76,61 @@ class OpenAIClient:
         )
         return await self._generate(prompt)
 
-    async def _generate(self, prompt: str) -> Dict[str, Any]:
-        try:
-            response = await self.client.chat.completions.create(
+    def stream_data_story(self, story_context: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream a plain-prose data story token by token."""
+        prompt = DATA_STORY_STREAM_PROMPT.format(
+            dataset_context=story_context.get("dataset_context", ""),
+            kpis_context=story_context.get("kpis_context", ""),
+            charts_context=story_context.get("charts_context", "")
+        )
+        return self._stream(prompt)
+
+    def stream_analytics_explanation(self, user_query: str, explanation: str, result_preview: Any) -> AsyncIterator[str]:
+        """Stream a plain-prose explanation of an executed analytics plan."""
+        prompt = ANALYTICS_EXPLANATION_PROMPT.format(
+            user_query=user_query,
+            explanation=explanation,
+            result_preview=json.dumps(result_preview, indent=2, default=str)
+        )
+        return self._stream(prompt)
+
+    async def _stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yields text deltas as they arrive. Errors are raised to the caller."""
+        with LlmCall(self.provider, self.model, "stream") as call:
+            stream = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
-                    {"role": "system", "content": "You are a helpful data analyst. Return only valid JSON."},
+                    {"role": "system", "content": "You are a helpful data analyst. Answer in plain prose."},
                     {"role": "user", "content": prompt}
                 ],
-                response_format={ "type": "json_object" } # Strict JSON mode
+                stream=True,
+                # Token counts arrive in a final chunk without choices
+                stream_options={"include_usage": True}
             )
+            async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    call.usage(chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+
+    async def _generate(self, prompt: str) -> Dict[str, Any]:
+        try:
+            with LlmCall(self.provider, self.model) as call:
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": "You are a helpful data analyst. Return only valid JSON."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    response_format={ "type": "json_object" } # Strict JSON mode
+                )
+                if response.usage:
+                    call.usage(response.usage.prompt_tokens, response.usage.completion_tokens)
             content = response.choices[0].message.content
             return json.loads(content)
         except Exception as e:
-            print(f"OpenAI Error: {e}")
+            logger.error("OpenAI Error: %s", e)
             return {"error": str(e)}
@@ -75,12 +75,15 @@ IMPORTANT:
 2. You must return ONLY valid JSON.
 3. You must use EXACT column names from the schema.
 4. You must generate a plan SPECIFICALLY for the detected intent.
+5. For "timeseries", put the date column first in "group_by". Set "granularity" only if the user asks for one; otherwise leave it null and it is chosen from the date range.
+6. Put every requested statistic in "metrics" (e.g. sum and avg of Sales are two metrics on the same column); they are computed together and returned as "<operation>_<column>". Percentiles are "p" followed by the percentile, e.g. "p90".
+7. For unique counts, medians and percentiles you may use the approximate operations ("approx_count_distinct", "approx_median", "approx_p<N>"): on large datasets they are answered from precomputed sketches, on smaller ones they are computed exactly. Use the exact operations if the user asks for exact figures.
 
 JSON DSL Format:
 {{
   "query_type": "{intent}",
   "metrics": [
-    {{ "column": "column_name", "operation": "count | sum | avg | min | max" }}
+    {{ "column": "column_name", "operation": "count | count_distinct | sum | avg | min | max | median | p25 | p75 | p90 | p95 | p99 | approx_count_distinct | approx_median | approx_p90" }}
   ],
   "group_by": ["column_name"],
   "filters": [
@@ -88,6 +91,7 @@ JSON DSL Format:
   ],
   "sort": {{ "column": "column_name", "order": "asc | desc" }},
   "limit": 10,
+  "granularity": "hour | day | week | month | quarter | year | null",
   "chart": {{ "type": "bar | line | pie | table | null", "x": "column_name", "y": "column_name" }},
   "explanation": "Plain English explanation for the user"
 }}
@@ -338,3 +342,47 @@ Example output style (DO NOT COPY THIS, generate based on actual data):
 }}
 """
 
+
+DATA_STORY_STREAM_PROMPT = """
+You are an expert Business Analyst writing an executive summary for a data dashboard.
+Your task is to generate a concise, insightful narrative that explains the key findings from the data.
+
+Dataset Context:
+{dataset_context}
+
+Available KPIs:
+{kpis_context}
+
+Available Charts:
+{charts_context}
+
+CRITICAL RULES:
+1. Output ONLY plain English prose, 1-3 short paragraphs. No JSON, no preamble.
+2. DO NOT use bullet points, numbered lists, or markdown formatting.
+3. DO NOT include any code or technical syntax.
+4. DO NOT invent or hallucinate any numbers not provided in the KPIs above.
+5. ONLY reference chart titles that appear in "Available Charts" above.
+6. Keep the tone professional, insightful, and business-friendly.
+7. Focus on trends, comparisons, and actionable patterns.
+8. If date/time trends exist, mention seasonal or temporal patterns.
+9. Avoid vague phrases like "significant impact" unless clearly supported by the KPIs or charts.
+10. Prefer concise sentences and avoid unnecessary adjectives.
+"""
+
+ANALYTICS_EXPLANATION_PROMPT = """
+You are an expert Data Analyst explaining the result of an analysis to a business user.
+
+User Query: "{user_query}"
+
+Analysis Performed:
+{explanation}
+
+Result Preview:
+{result_preview}
+
+Rules:
+1. Output ONLY plain English prose, 2-4 sentences. No JSON, no markdown, no preamble.
+2. Answer the user's question directly using the numbers in the result preview.
+3. DO NOT invent numbers that are not in the result preview.
+4. If the result is empty, say that no matching data was found and suggest how to broaden the query.
+"""
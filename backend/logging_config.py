@@ -0,0 +1,193 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config import LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATE, LOG_SLOW_REQUEST_MS, LLM_DEBUG_LOG, LLM_DEBUG_LOG_MB
+
+# Id of the request being handled ("-" outside requests); set by RequestLoggingMiddleware
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Raw LLM output and errors; written to LLM_DEBUG_LOG only
+LLM_DEBUG_LOGGER = "llm.debug"
+
+REQUEST_ID_HEADER = "x-request-id"
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# Attributes every LogRecord has; anything else was passed in `extra` and is a field
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "sampled"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records with the current request id (must run in the thread that logs)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a `rate` fraction of the records logged with extra={"sampled": True}
+    (per-request chatter such as access lines). Warnings and errors are always kept.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not getattr(record, "sampled", False):
+            return True
+        return self.rate >= 1 or random.random() < self.rate
+
+
+class _LoggerFilter(logging.Filter):
+    """Passes records of one logger (and its children), or everything else if exclude=True."""
+
+    def __init__(self, name: str, exclude: bool = False):
+        super().__init__()
+        self.prefix = name
+        self.exclude = exclude
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        matches = record.name == self.prefix or record.name.startswith(self.prefix + ".")
+        return matches != self.exclude
+
+
+def _fields(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS and not k.startswith("_")}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, request_id, message, extra fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines; extra fields are appended as key=value."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = "-"
+        line = super().format(record)
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+def setup_logging():
+    """
+    Routes all logging through a queue: callers only enqueue the record, and a
+    background thread formats and writes it (stderr, plus the rotating LLM debug
+    log for the "llm.debug" logger). Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else TextFormatter()
+    console = logging.StreamHandler()
+    console.setFormatter(formatter)
+    console.addFilter(_LoggerFilter(LLM_DEBUG_LOGGER, exclude=True))
+
+    llm_debug = logging.handlers.RotatingFileHandler(
+        LLM_DEBUG_LOG, maxBytes=LLM_DEBUG_LOG_MB * 1024 * 1024, backupCount=3, delay=True, encoding="utf-8"
+    )
+    llm_debug.setFormatter(formatter)
+    llm_debug.addFilter(_LoggerFilter(LLM_DEBUG_LOGGER))
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    # Filters on the queue handler run in the caller, where the request id is known
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+    # LLM debug output is kept whatever the level of the rest
+    logging.getLogger(LLM_DEBUG_LOGGER).setLevel(logging.DEBUG)
+
+    _listener = logging.handlers.QueueListener(records, console, llm_debug)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def _request_id(scope: Scope) -> str:
+    for name, value in scope.get("headers") or []:
+        if name == REQUEST_ID_HEADER.encode():
+            candidate = value.decode("latin-1")
+            if _VALID_REQUEST_ID.match(candidate):
+                return candidate
+    return uuid.uuid4().hex[:16]
+
+
+class RequestLoggingMiddleware:
+    """
+    Gives each HTTP request an id (the client's X-Request-ID if valid), available to
+    every log record of the request and echoed in the response, and logs one access
+    line with the status and duration. Access lines are sampled (LOG_SAMPLE_RATE)
+    unless the request failed or took longer than LOG_SLOW_REQUEST_MS.
+    """
+
+    def __init__(self, app: ASGIApp, slow_request_ms: float = LOG_SLOW_REQUEST_MS):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+        self.logger = logging.getLogger("app.access")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = _request_id(scope)
+        token = request_id_var.set(request_id)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_request_id(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append(REQUEST_ID_HEADER, request_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            duration_ms = round((time.perf_counter() - start) * 1000, 1)
+            level = logging.ERROR if status >= 500 else logging.INFO
+            self.logger.log(level, "%s %s", scope["method"], scope["path"], extra={
+                "status": status,
+                "duration_ms": duration_ms,
+                "sampled": status < 500 and duration_ms < self.slow_request_ms,
+            })
+            request_id_var.reset(token)
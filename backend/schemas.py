@@ -1,6 +1,12 @@
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 
+class SheetInfo(BaseModel):
+    name: str
+    file_id: str  # Dataset id to load this sheet
+    rows: int
+    columns: int
+
 class DatasetMetadata(BaseModel):
     file_id: str
     filename: str
@@ -9,6 +15,9 @@ class DatasetMetadata(BaseModel):
     column_names: List[str]
     dtypes: Dict[str, str]
     preview: List[Dict[str, Any]]
+    preview_offset: int = 0  # Row number of the first preview row
+    sheets: Optional[List[SheetInfo]] = None  # All sheets of the workbook (Excel uploads only)
+    sheet_name: Optional[str] = None
 
 class CleaningSuggestion(BaseModel):
     action: str
@@ -19,6 +28,30 @@ class CleaningSuggestion(BaseModel):
 class CleaningRequest(BaseModel):
     file_id: str
     selected_suggestions: List[CleaningSuggestion]
+    materialize: bool = False  # Also write the cleaned data as parquet (otherwise derived on load)
+
+class DatasetVersion(BaseModel):
+    file_id: str
+    parent: Optional[str] = None  # None for the uploaded dataset at the root of the lineage
+    operations: List[Dict[str, Any]] = []
+    created_at: Optional[str] = None
+    materialized: bool = False
+
+class DatasetVersionSummary(BaseModel):
+    file_id: str
+    rows: int
+    column_names: List[str]
+    duplicate_rows: int
+    null_counts: Dict[str, int]
+
+class DatasetComparison(BaseModel):
+    base: DatasetVersionSummary
+    other: DatasetVersionSummary
+    rows_removed: int
+    columns_added: List[str]
+    columns_removed: List[str]
+    null_changes: Dict[str, int]  # other - base, for columns present in both
+    operations: Optional[List[Dict[str, Any]]] = None  # Operations from base to other, if other descends from base
 
 class AnalyticsQuery(BaseModel):
     file_id: str
@@ -40,6 +73,17 @@ class AnalyticsResponse(BaseModel):
     chart_data: Optional[List[Dict[str, Any]]] = None
     chart: Optional[StructuredChart] = None  # Structured chart when charts addon is active
     explanation: str
+    # Filter results: chart_data holds the first page (at most MAX_INLINE_ROWS rows)
+    total_rows: Optional[int] = None
+    truncated: bool = False
+    next_page_token: Optional[str] = None  # For /api/v1/chat/query/rows and /export
+    plan: Optional[Dict[str, Any]] = None  # Executed DSL plan; store it in a tile's source to make the tile refreshable
+    warnings: Optional[List[str]] = None  # Plan metrics that were skipped (unknown column or operation)
+
+class ResultPage(BaseModel):
+    rows: List[Dict[str, Any]]
+    total_rows: int
+    next_page_token: Optional[str] = None
 
 class ErrorResponse(BaseModel):
     detail: str
@@ -51,7 +95,7 @@ class DashboardTile(BaseModel):
     data: Optional[Any] = None  # Accept dict (KPIs) or list (charts)
     chart_type: Optional[str] = None # bar, line, pie, etc.
     config: Optional[Dict[str, Any]] = None # layout config, axies, etc.
-    source: Optional[Dict[str, Any]] = None # file_id, query info
+    source: Optional[Dict[str, Any]] = None # file_id, query info; "plan" (DSL) makes the tile refreshable
 
 class Report(BaseModel):
     report_id: str
@@ -60,6 +104,15 @@ class Report(BaseModel):
     created_at: str
     tiles: List[DashboardTile] = []
     layout: Optional[Dict[str, Any]] = None # For future advanced layout config
+    version: int = 1 # Incremented by every write; sent as the ETag
+
+class ReportRefreshResponse(BaseModel):
+    report: Report
+    # Tile ids by outcome; static tiles have no stored plan
+    refreshed: List[str] = []
+    unchanged: List[str] = []
+    failed: List[str] = []
+    static: List[str] = []
 
 class SuggestionResponse(BaseModel):
     suggestions: List[str]
@@ -68,3 +121,18 @@ class SuggestionRequest(BaseModel):
     file_id: str
     chat_context: Optional[List[Dict[str, str]]] = None
     count: Optional[int] = 6
+
+class JobSubmitRequest(BaseModel):
+    kind: str  # dashboard_overview, data_story
+    file_id: str
+    params: Optional[Dict[str, Any]] = None
+
+class JobStatus(BaseModel):
+    job_id: str
+    kind: str
+    file_id: str
+    status: str  # queued, running, succeeded, failed, cancelled
+    error: Optional[str] = None
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
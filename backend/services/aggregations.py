@@ -0,0 +1,218 @@
+import re
+from typing import Any, Dict, Hashable, Iterable, List, NamedTuple, Optional
+import numpy as np
+import pandas as pd
+from services.sketches import HyperLogLog, TDigest, grouped_approx_distinct_counts
+
+# DSL operation -> pandas reduction (percentiles and approximate operations are handled separately).
+# "count" counts the column's non-null values, grouped or not
+_REDUCERS = {
+    "count": "count",
+    "count_distinct": "nunique",
+    "sum": "sum",
+    "avg": "mean",
+    "min": "min",
+    "max": "max",
+    "median": "median",
+}
+# Operations on numbers; text values are coerced (unparseable ones become NaN)
+_NUMERIC = {"sum", "avg", "median"}
+# Operations on any ordered values: numbers (and mostly numeric text), text, dates
+_ORDERED = {"min", "max"}
+_PERCENTILE = re.compile(r"^p([1-9][0-9]?(?:\.[0-9]+)?)$")
+# Approximate operations: answered from the dataset's persisted column sketches when
+# every row is aggregated; otherwise from the rows (exactly where that costs no more)
+APPROX_DISTINCT = "approx_count_distinct"
+_APPROX = "approx_"
+
+
+class MetricSpec(NamedTuple):
+    name: str         # output column, "{op}_{col}"
+    column: Hashable  # dataset column
+    op: str
+    source: str       # column of the value frame holding the (coerced) values
+
+
+def _value_kind(op: str) -> str:
+    """How an operation's column is prepared: "numeric" (coerced), "ordered" or "raw"."""
+    if op in _NUMERIC or quantile_of(op) is not None:
+        return "numeric"
+    return "ordered" if op in _ORDERED else "raw"
+
+
+def _ordered_values(series: pd.Series) -> pd.Series:
+    """
+    Values for min/max: numbers and dates as they are, text coerced to numbers when
+    most of it parses (so stray "n/a"s are skipped), other text compared as text.
+    """
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    numbers = pd.to_numeric(series, errors="coerce")
+    return numbers if numbers.count() * 2 > series.count() else series
+
+
+def _iso(val: Any) -> Any:
+    """Datetimes as ISO strings (NaT as None); other values unchanged."""
+    if isinstance(val, (pd.Timestamp, np.datetime64)):
+        return None if pd.isna(val) else pd.Timestamp(val).isoformat()
+    return val
+
+
+def percentile_of(op: str) -> Optional[float]:
+    """Quantile of a "pNN" operation (p90 -> 0.9), None for other operations."""
+    match = _PERCENTILE.match(op or "")
+    return float(match.group(1)) / 100 if match else None
+
+
+def quantile_of(op: str) -> Optional[float]:
+    """Quantile of a percentile or approximate quantile ("approx_median", "approx_p90") operation."""
+    if op == "approx_median":
+        return 0.5
+    if op and op.startswith(_APPROX):
+        return percentile_of(op[len(_APPROX):])
+    return percentile_of(op)
+
+
+def is_supported(op: str) -> bool:
+    return op in _REDUCERS or op == APPROX_DISTINCT or quantile_of(op) is not None
+
+
+def exact_operation(op: str) -> str:
+    """The exact operation an approximate one estimates ("approx_p90" -> "p90"); others unchanged."""
+    if op == APPROX_DISTINCT:
+        return "count_distinct"
+    if op and op.startswith(_APPROX) and quantile_of(op) is not None:
+        return op[len(_APPROX):]
+    return op
+
+
+def resolve_metrics(metrics: List[Dict[str, Any]], columns: Iterable[Hashable], exact: bool = False) -> List[MetricSpec]:
+    """
+    Specs for the plan metrics whose column exists and whose operation is supported.
+    Any number of operations may target the same column; a repeated (op, column)
+    pair is computed once. With exact=True approximate operations are computed
+    exactly (keeping their "approx_..." names).
+    """
+    columns = set(columns)
+    specs, names, sources = [], set(), {}
+    for metric in metrics:
+        col, op = metric.get("column"), metric.get("operation")
+        if col not in columns or not is_supported(op):
+            continue
+        name = f"{op}_{col}"
+        if name in names:
+            continue
+        names.add(name)
+        if exact:
+            op = exact_operation(op)
+        source = sources.setdefault((col, _value_kind(op)), f"__value_{len(sources)}__")
+        specs.append(MetricSpec(name, col, op, source))
+    return specs
+
+
+def unresolved_metrics(metrics: List[Dict[str, Any]], columns: Iterable[Hashable]) -> List[str]:
+    """Warnings naming the plan metrics resolve_metrics skips, and why."""
+    columns = set(columns)
+    warnings = []
+    for metric in metrics:
+        col, op = metric.get("column"), metric.get("operation")
+        if col not in columns:
+            warnings.append(f"Skipped metric {op}({col}): unknown column '{col}'")
+        elif not is_supported(op):
+            warnings.append(f"Skipped metric {op}({col}): unsupported operation '{op}'")
+    return warnings
+
+
+def value_frame(df: pd.DataFrame, specs: List[MetricSpec]) -> pd.DataFrame:
+    """The metric values of df, one column per source (numeric coercion done once per column)."""
+    values = {}
+    for spec in specs:
+        if spec.source in values:
+            continue
+        series = df[spec.column]
+        kind = _value_kind(spec.op)
+        if kind == "numeric":
+            series = pd.to_numeric(series, errors="coerce")
+        elif kind == "ordered":
+            series = _ordered_values(series)
+        values[spec.source] = series
+    return pd.DataFrame(values, index=df.index)
+
+
+def aggregate_grouped(grouped, specs: List[MetricSpec]) -> pd.DataFrame:
+    """
+    All metrics of a groupby over a value frame, columns in spec order. Plain
+    reductions share one named aggregation; percentiles of a column are computed
+    together in one sort per group; approximate distinct counts update one
+    HyperLogLog per group in a single pass.
+    """
+    named = {spec.name: (spec.source, _REDUCERS[spec.op]) for spec in specs if spec.op in _REDUCERS}
+    parts = [grouped.agg(**named)] if named else []
+
+    quantiles: Dict[str, List[MetricSpec]] = {}
+    distinct = [spec for spec in specs if spec.op == APPROX_DISTINCT]
+    for spec in specs:
+        if quantile_of(spec.op) is not None:
+            quantiles.setdefault(spec.source, []).append(spec)
+    for source, group in quantiles.items():
+        # Approximate quantiles too: a grouped sort is cheaper than building digests from the rows
+        qs = [quantile_of(spec.op) for spec in group]
+        table = grouped[source].quantile(qs).unstack(-1)
+        table.columns = [spec.name for spec in group]
+        parts.append(table)
+    if distinct:
+        sizes = grouped.size()
+        codes = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+        parts.append(pd.DataFrame({
+            spec.name: grouped_approx_distinct_counts(codes, grouped.obj[spec.source], len(sizes))
+            for spec in distinct
+        }, index=sizes.index))
+
+    result = parts[0] if len(parts) == 1 else pd.concat(parts, axis=1)
+    for spec in specs:
+        if spec.op in _ORDERED and pd.api.types.is_datetime64_any_dtype(result[spec.name]):
+            result[spec.name] = result[spec.name].map(_iso).astype(object)
+    return result[[spec.name for spec in specs]]
+
+
+def aggregate_scalar(
+    values: pd.DataFrame, specs: List[MetricSpec], sketches: Optional[Dict[Hashable, Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    Every metric over all rows of a value frame, as plain Python numbers. `sketches`
+    (column -> persisted sketches, see DatasetProfiler.get_sketches) may only be
+    passed when values holds the whole dataset; approximate operations then read
+    them instead of the rows.
+    """
+    sketches = sketches or {}
+    results = {}
+    quantiles: Dict[str, List[MetricSpec]] = {}
+    for spec in specs:
+        series = values[spec.source]
+        sketch = sketches.get(spec.column) or {}
+        if spec.op in _REDUCERS:
+            val = getattr(series, _REDUCERS[spec.op])()
+        elif spec.op == APPROX_DISTINCT:
+            # A scan counts distinct values exactly in the time it would take to sketch them
+            val = round(HyperLogLog.from_dict(sketch["hll"]).count()) if sketch.get("hll") else series.nunique()
+        elif spec.op.startswith(_APPROX) and sketch.get("tdigest"):
+            val = TDigest.from_dict(sketch["tdigest"]).quantile(quantile_of(spec.op))
+        else:
+            quantiles.setdefault(spec.source, []).append(spec)
+            continue
+        results[spec.name] = val
+    for source, group in quantiles.items():
+        # One partition of the column for all of its percentiles
+        points = values[source].quantile([quantile_of(spec.op) for spec in group])
+        for spec, val in zip(group, points.to_numpy()):
+            results[spec.name] = val
+
+    for name, val in results.items():
+        # Handle numpy types
+        if isinstance(val, np.floating):
+            results[name] = float(val)
+        elif isinstance(val, np.integer):
+            results[name] = int(val)
+        else:
+            results[name] = _iso(val)
+    return {spec.name: results[spec.name] for spec in specs}
@@ -1,19 +1,149 @@
+import logging
+import time
 import pandas as pd
-import numpy as np
 from typing import Dict, Any, List, Optional
 from services.data_ingestion import DataIngestionService
+from services.aggregations import aggregate_grouped, aggregate_scalar, resolve_metrics, unresolved_metrics, value_frame
+from services.profiler import DatasetProfiler
+from services.single_flight import stable_hash
+from services.page_tokens import encode_page_token, decode_page_token
+from services.timeseries import bucket, cached_datetimes, looks_temporal
+from services.metrics import PLAN_EXECUTION_SECONDS, plan_query_type
+from services.request_profiling import phase, profiled
+from config import APPROX_MIN_ROWS, MAX_INLINE_ROWS, TIMESERIES_MAX_POINTS
+
+logger = logging.getLogger(__name__)
+
+# Batched plans of these types with equal values for these keys share one pass (see execute_batch)
+_SHARED_QUERY_TYPES = ("aggregation", "timeseries")
+_SHARED_PLAN_KEYS = ("query_type", "group_by", "filters", "granularity", "max_points")
 
 class AnalyticsEngine:
     def __init__(self):
         self.ingestion = DataIngestionService()
+        self.profiler = DatasetProfiler(self.ingestion)
 
-    def execute_plan(self, file_id: str, plan: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+    @profiled("analytics.execute_plan")
+    def execute_plan(
+        self,
+        file_id: str,
+        plan: Dict[str, Any],
+        user_id: str,
+        offset: int = 0,
+        page_size: Optional[int] = None,
+        as_frame: bool = False
+    ) -> Dict[str, Any]:
         """
         Executes a safe Analytics DSL plan on the dataset.
         NO dynamic code execution (exec/eval) is permitted.
+
+        Filter results are paged: at most MAX_INLINE_ROWS rows from `offset` are
+        returned, with "total_rows" and a "next_page_token" while rows remain.
+        Grouped and timeseries results are cut to their first MAX_INLINE_ROWS rows,
+        with "total_rows" and "truncated". Tabular results are lists of records, or
+        DataFrames with as_frame=True (for columnar encodings). Metrics that can't be
+        computed (unknown column or operation) are skipped and named in "warnings".
         """
         try:
+            version = self.ingestion.get_dataset_version(file_id, user_id)
             df = self.ingestion.load_dataset(file_id, user_id)
+        except Exception as e:
+            logger.exception("Could not load dataset %s", file_id)
+            return {"error": str(e)}
+        result = self._execute(file_id, user_id, version, df, plan, offset, page_size, as_frame)
+        return self._with_warnings(result, plan, df.columns)
+
+    @profiled("analytics.execute_batch")
+    def execute_batch(self, file_id: str, plans: List[Dict[str, Any]], user_id: str) -> List[Dict[str, Any]]:
+        """
+        Executes several plans against a single load of the dataset, returning what
+        execute_plan would for each. Aggregation and timeseries plans that differ only
+        in metrics, sort and limit share one grouped pass over the rows.
+        """
+        try:
+            version = self.ingestion.get_dataset_version(file_id, user_id)
+            df = self.ingestion.load_dataset(file_id, user_id)
+        except Exception as e:
+            logger.exception("Could not load dataset %s", file_id)
+            return [{"error": str(e)} for _ in plans]
+
+        batches: Dict[str, List[int]] = {}
+        names: List[List[str]] = []
+        for i, plan in enumerate(plans):
+            # Metrics that would be computed for the plan alone (invalid ones are dropped)
+            names.append([spec.name for spec in resolve_metrics(plan.get("metrics") or [], df.columns)])
+            batches.setdefault(self._batch_key(plan, i, names[i]), []).append(i)
+
+        results: List[Dict[str, Any]] = [{} for _ in plans]
+        for members in batches.values():
+            first = plans[members[0]]
+            if first.get("query_type") not in _SHARED_QUERY_TYPES:
+                results[members[0]] = self._with_warnings(self._execute(file_id, user_id, version, df, first), first, df.columns)
+                continue
+            merged = self._shared_part(first)
+            merged["metrics"] = [m for i in members for m in plans[i].get("metrics") or []]
+            # Uncapped: each plan's own sort and limit pick its rows before the cap
+            shared = self._execute(file_id, user_id, version, df, merged, as_frame=True, capped=False)
+            merged_names = {f"{m.get('operation')}_{m.get('column')}" for m in merged["metrics"]}
+            for i in members:
+                results[i] = self._with_warnings(self._select(shared, plans[i], merged_names, names[i]), plans[i], df.columns)
+        return results
+
+    def _with_warnings(self, result: Dict[str, Any], plan: Dict[str, Any], columns) -> Dict[str, Any]:
+        if "error" in result or plan.get("query_type") not in _SHARED_QUERY_TYPES:
+            return result
+        warnings = unresolved_metrics(plan.get("metrics") or [], columns)
+        return {**result, "warnings": warnings} if warnings else result
+
+    def _shared_part(self, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """What decides the rows and groups of a plan (everything but metrics, sort and limit)."""
+        shared = {key: plan.get(key) for key in _SHARED_PLAN_KEYS}
+        # Timeseries plans may name their date column as the chart's x
+        shared["chart"] = {"x": (plan.get("chart") or {}).get("x")}
+        return shared
+
+    def _batch_key(self, plan: Dict[str, Any], position: int, names: List[str]) -> str:
+        if plan.get("query_type") not in _SHARED_QUERY_TYPES:
+            return f"plan:{position}"
+        # Without valid metrics the result is a row count per group (or, ungrouped, a count
+        # or an empty result), which the metrics of other plans would replace
+        return stable_hash([self._shared_part(plan), not plan.get("metrics"), not names])
+
+    def _select(self, shared: Dict[str, Any], plan: Dict[str, Any], merged_names: set, names: List[str]) -> Dict[str, Any]:
+        """
+        One plan's part of a shared result: its metric columns (`names`, as resolved for
+        the plan), then its own sort and limit.
+        """
+        if "error" in shared:
+            return shared
+        result = shared["result"]
+        if isinstance(result, pd.DataFrame):
+            selected = [name for name in dict.fromkeys(names) if name in result.columns]
+            if names and not selected:
+                return {"error": "None of the plan's metrics were computed"}
+            keys = [c for c in result.columns if c not in merged_names]
+            return {**shared, **self._inline(self._apply_sorting_and_limit(result[keys + selected], plan), as_frame=False)}
+        elif isinstance(result, dict) and "error" not in result and names:
+            result = {name: result[name] for name in dict.fromkeys(names) if name in result}
+            if not result:
+                return {"error": "None of the plan's metrics were computed"}
+        return {**shared, "result": result}
+
+    def _execute(
+        self,
+        file_id: str,
+        user_id: str,
+        version: str,
+        df: pd.DataFrame,
+        plan: Dict[str, Any],
+        offset: int = 0,
+        page_size: Optional[int] = None,
+        as_frame: bool = False,
+        capped: bool = True
+    ) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            base = df
             initial_count = len(df)
             
             # 1. Apply Filters
@@ -34,27 +164,118 @@ class AnalyticsEngine:
                 }
             
             elif query_type == "aggregation":
-                result_data = self._handle_aggregation(df, plan)
+                # Unfiltered approximate metrics read the persisted column sketches
+                sketches = self._column_sketches(file_id, user_id, df, plan) if df is base else None
+                result_data = self._handle_aggregation(df, plan, as_frame=True, sketches=sketches)
                 
             elif query_type == "timeseries":
-                # Treat as aggregation but ensure date grouping
-                result_data = self._handle_aggregation(df, plan)
+                hints = self.ingestion.get_dtype_hints(file_id, user_id)
+                date_column = self._find_date_column(base, plan, hints)
+                if date_column is None:
+                    # Nothing to bucket by: group by the raw values
+                    result_data = self._handle_aggregation(df, plan, as_frame=True)
+                else:
+                    iso = hints.get(date_column, {}).get("kind") == "datetime"
+                    with phase("analytics.parse_dates"):
+                        parsed = cached_datetimes(user_id, file_id, version, base, date_column, iso)
+                    result_df, granularity = self._handle_timeseries(df, base, parsed, plan, date_column)
+                    return {**self._inline(result_df, as_frame, capped), "granularity": granularity}
                 
             elif query_type == "filter":
-                # Just return raw data
-                result_data = self._apply_sorting_and_limit(df, plan)
-                result_data = result_data.to_dict(orient='records')
+                # Raw rows, one page at a time
+                result_df = self._apply_sorting_and_limit(df, plan)
+                page_size = max(1, min(int(page_size or MAX_INLINE_ROWS), MAX_INLINE_ROWS))
+                next_offset = offset + page_size
+                page = result_df.iloc[offset:next_offset]
+                return {
+                    "result": page if as_frame else page.to_dict(orient='records'),
+                    "total_rows": len(result_df),
+                    "next_page_token": encode_page_token(file_id, version, plan, next_offset)
+                        if next_offset < len(result_df) else None
+                }
             
             else:
                 result_data = {"error": f"Unknown query type: {query_type}"}
 
+            if isinstance(result_data, pd.DataFrame):
+                return self._inline(result_data, as_frame, capped)
             return {"result": result_data}
 
         except Exception as e:
-            import traceback
-            print(traceback.format_exc())
+            logger.exception("Plan execution failed")
             return {"error": str(e)}
+        finally:
+            PLAN_EXECUTION_SECONDS.labels(plan_query_type(plan)).observe(time.perf_counter() - start)
+
+    def _inline(self, result_df: pd.DataFrame, as_frame: bool, capped: bool = True) -> Dict[str, Any]:
+        """A grouped result as returned inline: at most MAX_INLINE_ROWS rows, with the full count."""
+        total_rows = len(result_df)
+        truncated = capped and total_rows > MAX_INLINE_ROWS
+        if truncated:
+            result_df = result_df.head(MAX_INLINE_ROWS)
+        return {
+            "result": result_df if as_frame else result_df.to_dict(orient='records'),
+            "total_rows": total_rows,
+            "truncated": truncated
+        }
 
+    def _find_date_column(self, df: pd.DataFrame, plan: Dict, hints: Dict[str, Dict[str, Any]]) -> Optional[Any]:
+        """The first group_by (or chart x) column holding dates."""
+        candidates = list(plan.get("group_by") or []) + [(plan.get("chart") or {}).get("x")]
+        for col in candidates:
+            if col in df.columns and (hints.get(col, {}).get("kind") == "datetime" or looks_temporal(df[col])):
+                return col
+        return None
+
+    @profiled("analytics.timeseries")
+    def _handle_timeseries(self, df: pd.DataFrame, base: pd.DataFrame, parsed: pd.Series, plan: Dict, date_column: Any) -> tuple:
+        """
+        Metrics per time bucket of date_column (granularity from the plan, or chosen
+        from the span so at most max_points buckets are returned). `parsed` is the
+        column of the unfiltered frame `base` as datetimes, parsed once per dataset
+        version (see services.timeseries) and reused across queries and filters.
+        """
+        if len(df) != len(base):
+            # Filtered: the parsed values of the remaining rows
+            parsed = parsed.take(base.index.get_indexer(df.index)).set_axis(df.index)
+
+        group_by = [g for g in plan.get("group_by") or [] if g in df.columns and g != date_column]
+        max_points = max(1, min(int(plan.get("max_points") or TIMESERIES_MAX_POINTS), TIMESERIES_MAX_POINTS))
+        result_df, granularity = bucket(
+            df, parsed, plan.get("metrics") or [], group_by, date_column,
+            granularity=plan.get("granularity"), max_points=max_points, exact=len(df) < APPROX_MIN_ROWS
+        )
+        if plan.get("sort") or plan.get("limit"):
+            result_df = self._apply_sorting_and_limit(result_df, plan)
+        return result_df, granularity
+
+    def execute_page(self, page_token: str, user_id: str, page_size: Optional[int] = None) -> Dict[str, Any]:
+        """Next page of a filter result. Raises ValueError for an invalid or outdated token."""
+        cursor = self._resolve_page_token(page_token, user_id)
+        return self.execute_plan(cursor["file_id"], cursor["plan"], user_id, offset=cursor["offset"], page_size=page_size)
+
+    def export_rows(self, page_token: str, user_id: str) -> pd.DataFrame:
+        """
+        Every row of the filter result a page token belongs to (from the first row),
+        for streaming exports. Raises ValueError for an invalid or outdated token.
+        """
+        cursor = self._resolve_page_token(page_token, user_id)
+        plan = cursor["plan"]
+        df = self.ingestion.load_dataset(cursor["file_id"], user_id)
+        if plan.get("filters"):
+            df = self._apply_filters(df, plan["filters"])
+        return self._apply_sorting_and_limit(df, plan)
+
+    def _resolve_page_token(self, page_token: str, user_id: str) -> Dict[str, Any]:
+        cursor = decode_page_token(page_token)
+        if cursor["plan"].get("query_type") != "filter":
+            raise ValueError("Only filter results are paged")
+        # Offsets are only meaningful on the data the first page was computed on
+        if self.ingestion.get_dataset_version(cursor["file_id"], user_id) != cursor["version"]:
+            raise ValueError("The dataset has changed since this page token was issued; run the query again")
+        return cursor
+
+    @profiled("analytics.filter")
     def _apply_filters(self, df: pd.DataFrame, filters: List[Dict]) -> pd.DataFrame:
         for f in filters:
             col = f.get("column")
@@ -82,11 +303,19 @@ class AnalyticsEngine:
                     df = df[temp_col.dt.year == int(val)]
             except Exception as e:
                 # Log error but continue/empty result?
-                print(f"Filter error on {col} {op} {val}: {e}")
+                logger.warning("Filter error on %s %s %s: %s", col, op, val, e)
                 
         return df
 
-    def _handle_aggregation(self, df: pd.DataFrame, plan: Dict) -> Any:
+    def _column_sketches(self, file_id: str, user_id: str, df: pd.DataFrame, plan: Dict) -> Optional[Dict[Any, Dict[str, Any]]]:
+        if plan.get("group_by") or len(df) < APPROX_MIN_ROWS:
+            return None
+        if not any(str(m.get("operation", "")).startswith("approx_") for m in plan.get("metrics", [])):
+            return None
+        return self.profiler.get_sketches(file_id, user_id)
+
+    @profiled("analytics.aggregate")
+    def _handle_aggregation(self, df: pd.DataFrame, plan: Dict, as_frame: bool = False, sketches: Optional[Dict] = None) -> Any:
         metrics = plan.get("metrics", [])
         group_by = plan.get("group_by", [])
         
@@ -94,6 +323,10 @@ class AnalyticsEngine:
              # Fallback to simple count
              return {"count": len(df)}
 
+        # Small inputs are scanned exactly, even for approximate operations
+        specs = resolve_metrics(metrics, df.columns, exact=len(df) < APPROX_MIN_ROWS)
+        values = value_frame(df, specs)
+
         # If grouping
         if group_by:
             # Validate columns exist
@@ -101,75 +334,34 @@ class AnalyticsEngine:
             if not valid_groups:
                 return {"error": "Invalid group by columns"}
             
-            # Build aggregation dictionary
-            agg_dict = {}
-            for m in metrics:
-                col = m["column"]
-                op = m["operation"]
-                if col in df.columns:
-                    # Map DSL op to pandas op
-                    pd_op = "count"
-                    if op == "sum": pd_op = "sum"
-                    elif op == "avg": pd_op = "mean"
-                    elif op == "min": pd_op = "min"
-                    elif op == "max": pd_op = "max"
-                    
-                    agg_dict[col] = pd_op
-            
-            if not agg_dict:
+            # One groupby pass for every metric, named {op}_{col} to match dashboard config
+            grouped = values.groupby([df[g] for g in valid_groups])
+            if not specs:
                 # If no metrics, just size()
-                result_df = df.groupby(valid_groups).size().reset_index(name='count')
+                result_df = grouped.size().reset_index(name='count')
             else:
-                result_df = df.groupby(valid_groups).agg(agg_dict).reset_index()
-                # Rename aggregated columns to {op}_{col} format to match dashboard config
-                rename_map = {}
-                for m in metrics:
-                    col = m.get("column")
-                    op = m.get("operation")
-                    if col and op and col in result_df.columns:
-                        rename_map[col] = f"{op}_{col}"
-                if rename_map:
-                    result_df = result_df.rename(columns=rename_map)
+                result_df = aggregate_grouped(grouped, specs).reset_index()
             
             # Sorting limit
             result_df = self._apply_sorting_and_limit(result_df, plan)
-            return result_df.to_dict(orient='records')
+            return result_df if as_frame else result_df.to_dict(orient='records')
             
         else:
             # scalar aggregation (no group by)
-            results = {}
-            for m in metrics:
-                col = m["column"]
-                op = m["operation"]
-                if col not in df.columns: continue
-                
-                # Coerce to numeric for math ops
-                series = df[col] 
-                if op in ["sum", "avg", "min", "max"]:
-                    series = pd.to_numeric(series, errors='coerce')
-                
-                val = 0
-                if op == "count": val = len(series)
-                elif op == "sum": val = series.sum()
-                elif op == "avg": val = series.mean()
-                elif op == "min": val = series.min()
-                elif op == "max": val = series.max()
-                
-                # Handle numpy types
-                if isinstance(val, (np.integer, np.floating)):
-                    val = float(val) if isinstance(val, np.floating) else int(val)
-                    
-                results[f"{op}_{col}"] = val
-                
-            return results
+            return aggregate_scalar(values, specs, sketches)
 
     def _apply_sorting_and_limit(self, df: pd.DataFrame, plan: Dict) -> pd.DataFrame:
         sort = plan.get("sort")
         limit = plan.get("limit")
         
-        if sort and sort.get("column") in df.columns:
+        column = sort.get("column") if sort else None
+        if column is not None and column not in df.columns:
+            # Plans often sort by a metric's column ("Sales" for sum_Sales): use its first metric
+            names = [f"{m.get('operation')}_{m.get('column')}" for m in plan.get("metrics", []) if m.get("column") == column]
+            column = next((name for name in names if name in df.columns), None)
+        if column is not None:
             ascending = sort.get("order") == "asc"
-            df = df.sort_values(by=sort["column"], ascending=ascending)
+            df = df.sort_values(by=column, ascending=ascending)
             
         if limit and isinstance(limit, int):
             df = df.head(limit)
@@ -0,0 +1,85 @@
+from typing import Any, Dict, List, Optional
+import logging
+import numpy as np
+import pandas as pd
+from services.data_health import row_fingerprints
+
+logger = logging.getLogger(__name__)
+
+# Operations understood by the pipeline (same vocabulary as the cleaning suggestions)
+DROP_NULLS = "DROP_NULLS"
+FILL_NULLS = "FILL_NULLS"
+DROP_DUPLICATES = "DROP_DUPLICATES"
+RENAME_COLUMN = "RENAME_COLUMN"
+
+SUPPORTED_ACTIONS = (DROP_NULLS, FILL_NULLS, DROP_DUPLICATES, RENAME_COLUMN)
+
+
+def apply_operations(base: pd.DataFrame, operations: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Applies recorded cleaning operations to `base` in one fused pass. `base` is never modified.
+
+    Row drops (DROP_NULLS, DROP_DUPLICATES) only narrow a boolean keep-mask, and fills
+    and renames replace columns on a shallow copy. The single full copy is the final
+    row selection, and it is skipped entirely when no rows are dropped. The result
+    always has a 0..n-1 index.
+
+    Statistics for FILL_NULLS (mean/median/mode) and duplicate detection see exactly
+    the rows the eager, step-by-step application would have seen.
+    """
+    df = base.copy(deep=False)
+    keep: Optional[np.ndarray] = None
+
+    for op in operations:
+        action = op.get("action")
+        column = op.get("column")
+        value = op.get("value")
+        try:
+            if action == DROP_NULLS:
+                mask = df[column].notna() if column else df.notna().all(axis=1)
+                keep = _narrow(keep, mask.to_numpy())
+
+            elif action == FILL_NULLS:
+                if column and value is not None:
+                    if isinstance(value, str) and value in ("mean", "median", "mode"):
+                        kept = df[column] if keep is None else df[column][keep]
+                        if value == "mean":
+                            value = kept.mean()
+                        elif value == "median":
+                            value = kept.median()
+                        else:
+                            value = kept.mode()[0]
+                    df[column] = df[column].fillna(value)
+
+            elif action == DROP_DUPLICATES:
+                keep = _drop_duplicate_rows(df, keep)
+
+            elif action == RENAME_COLUMN:
+                if column and value:
+                    df.columns = [value if c == column else c for c in df.columns]
+
+        except Exception as e:
+            logger.warning("Error applying cleaning operation %s: %s", op, e)
+
+    if keep is not None and not keep.all():
+        df = df[keep]
+        # Same fresh 0..n-1 index a reloaded cleaned file used to have
+        df.index = pd.RangeIndex(len(df))
+    return df
+
+
+def _narrow(keep: Optional[np.ndarray], mask: np.ndarray) -> np.ndarray:
+    return mask if keep is None else keep & mask
+
+
+def _drop_duplicate_rows(df: pd.DataFrame, keep: Optional[np.ndarray]) -> np.ndarray:
+    """Keep-mask without later repeats of a row among the rows still kept (keep='first')."""
+    fingerprints = row_fingerprints(df)
+    if keep is None:
+        return ~pd.Series(fingerprints).duplicated().to_numpy()
+
+    positions = np.flatnonzero(keep)
+    repeated = pd.Series(fingerprints[positions]).duplicated().to_numpy()
+    keep = keep.copy()
+    keep[positions[repeated]] = False
+    return keep
@@ -0,0 +1,164 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow is then never negotiated
+    pa = None
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+# Opt-in compact JSON: "Accept: application/json; format=columnar"
+COLUMNAR_JSON_MEDIA_TYPE = "application/json; format=columnar"
+
+# Response formats
+JSON = "json"
+COLUMNAR = "columnar"
+ARROW = "arrow"
+
+_SCALARS = (str, int, float, bool, type(None))
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """
+    Response format for an Accept header: ARROW for application/vnd.apache.arrow.stream,
+    COLUMNAR for application/json with format=columnar, JSON otherwise. The media
+    range with the highest q-value wins; ties go to the first listed.
+    """
+    choices = []
+    for position, media_range in enumerate((accept or "").split(",")):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        options = dict(param.split("=", 1) for param in params if "=" in param)
+        try:
+            quality = float(options.get("q", 1))
+        except ValueError:
+            quality = 1.0
+
+        media_type = media_type.lower()
+        if media_type == ARROW_STREAM_MEDIA_TYPE and pa is not None:
+            choices.append((quality, -position, ARROW))
+        elif media_type == "application/json" and options.get("format", "").lower() == COLUMNAR:
+            choices.append((quality, -position, COLUMNAR))
+        elif media_type in ("application/json", "*/*", "application/*"):
+            choices.append((quality, -position, JSON))
+
+    choices = [choice for choice in choices if choice[0] > 0]
+    return max(choices)[2] if choices else JSON
+
+
+def encode(document: Any, response_format: str, frames: Optional[Dict[str, pd.DataFrame]] = None) -> Tuple[bytes, str]:
+    """
+    Encodes a JSON-compatible document (e.g. jsonable_encoder output) as COLUMNAR
+    JSON or an ARROW stream; returns (body, media type).
+
+    Tables are the record lists in the document (non-empty lists of flat dicts,
+    such as chart data) plus `frames`, result DataFrames keyed by the JSON pointer
+    they belong at (e.g. {"/chart_data": df}), which are converted without going
+    through dicts.
+
+    COLUMNAR replaces each table with {"columns": [...], "data": [[column values], ...]}.
+    ARROW writes a sequence of Arrow IPC streams: the first has no columns and
+    carries the document, with the tables set to null, and the list of their
+    pointers in its schema metadata ("document", "tables"); each following stream
+    is one table, in that order. Tables Arrow cannot type (mixed-type columns)
+    stay inline in the document.
+    """
+    frames = frames or {}
+    if response_format == ARROW:
+        return _encode_arrow(document, frames), ARROW_STREAM_MEDIA_TYPE
+
+    for pointer, df in frames.items():
+        document = _set_pointer(document, pointer, _frame_columns(df))
+    document = _map_tables(document, "", lambda pointer, records: _record_columns(records))
+    return json.dumps(document, default=str).encode("utf-8"), COLUMNAR_JSON_MEDIA_TYPE
+
+
+def _encode_arrow(document: Any, frames: Dict[str, pd.DataFrame]) -> bytes:
+    tables: List[Tuple[str, "pa.Table"]] = []
+
+    for pointer, df in frames.items():
+        table = _arrow_table(lambda: pa.Table.from_pandas(df.rename(columns=str), preserve_index=False))
+        if table is not None:
+            tables.append((pointer, table))
+            document = _set_pointer(document, pointer, None)
+        else:
+            document = _set_pointer(document, pointer, df.to_dict(orient="records"))
+
+    def extract(pointer: str, records: List[Dict[str, Any]]) -> Any:
+        table = _arrow_table(lambda: pa.Table.from_pylist(records))
+        if table is None:
+            return records
+        tables.append((pointer, table))
+        return None
+
+    document = _map_tables(document, "", extract)
+
+    sink = pa.BufferOutputStream()
+    header = pa.schema([], metadata={
+        "document": json.dumps(document, default=str),
+        "tables": json.dumps([pointer for pointer, _ in tables])
+    })
+    with pa.ipc.new_stream(sink, header):
+        pass
+    for pointer, table in tables:
+        metadata = dict(table.schema.metadata or {})
+        metadata[b"pointer"] = pointer.encode("utf-8")
+        table = table.replace_schema_metadata(metadata)
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _arrow_table(build) -> Optional["pa.Table"]:
+    try:
+        return build()
+    except (pa.ArrowException, TypeError, ValueError):
+        return None
+
+
+def _is_record_list(value: Any) -> bool:
+    return (
+        isinstance(value, list) and len(value) > 0
+        and all(isinstance(row, dict) and all(isinstance(v, _SCALARS) for v in row.values()) for row in value)
+    )
+
+
+def _map_tables(value: Any, pointer: str, convert) -> Any:
+    """Copy of value with every record list replaced by convert(pointer, records)."""
+    if _is_record_list(value):
+        return convert(pointer, value)
+    if isinstance(value, dict):
+        return {key: _map_tables(item, f"{pointer}/{_escape(key)}", convert) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_map_tables(item, f"{pointer}/{index}", convert) for index, item in enumerate(value)]
+    return value
+
+
+def _escape(key: Any) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def _set_pointer(document: Any, pointer: str, value: Any) -> Any:
+    """Copy of document with the member at a JSON pointer ("/a/0/b") set to value."""
+    if not pointer:
+        return value
+    head, _, rest = pointer[1:].partition("/")
+    key = head.replace("~1", "/").replace("~0", "~")
+    if isinstance(document, list):
+        updated = list(document)
+        updated[int(key)] = _set_pointer(updated[int(key)], f"/{rest}" if rest else "", value)
+        return updated
+    updated = dict(document)
+    updated[key] = _set_pointer(updated.get(key), f"/{rest}" if rest else "", value)
+    return updated
+
+
+def _record_columns(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    columns = list(dict.fromkeys(key for row in records for key in row))
+    return {"columns": columns, "data": [[row.get(col) for row in records] for col in columns]}
+
+
+def _frame_columns(df: pd.DataFrame) -> Dict[str, Any]:
+    # Missing values become null, as in the records path
+    df = df.astype(object).where(pd.notnull(df), None)
+    return {"columns": [str(col) for col in df.columns], "data": [df.iloc[:, i].tolist() for i in range(df.shape[1])]}
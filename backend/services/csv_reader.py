@@ -0,0 +1,314 @@
+import codecs
+import csv
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # the C engine path below still works without pyarrow
+    pa = None
+    pa_csv = None
+
+logger = logging.getLogger(__name__)
+
+SNIFF_BYTES = 256 * 1024
+DELIMITERS = ",;\t|"
+
+# Same missing-value and boolean spellings as pandas' C parser, so both engines agree
+NA_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+]
+TRUE_VALUES = ["True", "TRUE", "true"]
+FALSE_VALUES = ["False", "FALSE", "false"]
+
+# Hint kinds; "datetime" and "category" columns are recorded for consumers and read as text
+NUMERIC_HINTS = ("int64", "float64", "bool")
+CATEGORY_MAX_RATIO = 0.5
+
+# Row index granularity: byte offset of every ROW_INDEX_STRIDE-th data row
+ROW_INDEX_STRIDE = 4096
+
+
+def sniff_csv(path: str, sample_bytes: int = SNIFF_BYTES) -> Dict[str, str]:
+    """Encoding and delimiter of a CSV file, from a prefix sample (no full read)."""
+    with open(path, "rb") as f:
+        sample = f.read(sample_bytes)
+
+    encoding = _sniff_encoding(sample)
+    text = sample.decode(encoding, errors="replace")
+    # Only complete lines, so a cut-off last row does not confuse the sniffer
+    if len(sample) == sample_bytes and "\n" in text:
+        text = text[:text.rindex("\n")]
+
+    try:
+        delimiter = csv.Sniffer().sniff(text, delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        delimiter = ","
+    return {"encoding": encoding, "delimiter": delimiter}
+
+
+def _sniff_encoding(sample: bytes) -> str:
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        # Incremental decode tolerates a multi-byte character cut off at the sample end
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    try:
+        sample.decode("cp1252")
+        return "cp1252"
+    except UnicodeDecodeError:
+        return "latin1"
+
+
+def read_csv(path: str, hints: Optional[Dict[str, Dict[str, Any]]] = None) -> Tuple[pd.DataFrame, Dict[str, Dict[str, Any]]]:
+    """
+    Parses a CSV file once and returns (frame, dtype hints).
+
+    Encoding and delimiter are sniffed from a prefix. The multithreaded pyarrow
+    parser is used when installed, with pandas' C engine as the fallback. `hints`
+    from an earlier parse of the same file skip type inference. The result matches
+    pd.read_csv: date-like columns stay text (as with the C engine), so hinted
+    "datetime" columns are only a marker for code that parses dates later.
+    """
+    dialect = sniff_csv(path)
+
+    df = None
+    if pa_csv is not None:
+        try:
+            df = _read_with_pyarrow(path, dialect, hints)
+        except (pa.ArrowException, UnicodeDecodeError, ValueError) as e:
+            logger.warning("pyarrow CSV parse failed for %s, using the C engine: %s", path, e)
+
+    if df is None:
+        df = _read_with_c_engine(path, dialect, hints)
+
+    return df, hints or infer_hints(df)
+
+
+def _read_with_pyarrow(path: str, dialect: Dict[str, str], hints: Optional[Dict[str, Dict[str, Any]]]) -> pd.DataFrame:
+    read_options = pa_csv.ReadOptions(encoding=dialect["encoding"].replace("utf-8-sig", "utf8"))
+    parse_options = pa_csv.ParseOptions(delimiter=dialect["delimiter"])
+
+    def convert_options(column_types):
+        return pa_csv.ConvertOptions(
+            column_types=column_types,
+            null_values=NA_VALUES,
+            true_values=TRUE_VALUES,
+            false_values=FALSE_VALUES,
+            strings_can_be_null=True,
+        )
+
+    column_types = _arrow_types(hints) if hints else {}
+    retry_latin1 = dialect["encoding"] != "latin1"
+    try:
+        table = pa_csv.read_csv(path, read_options, parse_options, convert_options(column_types))
+    except pa.ArrowInvalid as e:
+        if retry_latin1 and "UTF8" in str(e):
+            return _read_with_pyarrow(path, {**dialect, "encoding": "latin1"}, hints)
+        raise
+    names = table.column_names
+    if len(set(names)) != len(names) or "" in names:
+        # The C engine renames these ("a.1", "Unnamed: 0"); let it handle such headers
+        raise ValueError("duplicate or empty column names")
+
+    if retry_latin1 and any(pa.types.is_binary(field.type) for field in table.schema):
+        # Undecodable bytes after the sniffed prefix (hinted text columns raise instead):
+        # one more parse with a lossless codec
+        return _read_with_pyarrow(path, {**dialect, "encoding": "latin1"}, hints)
+
+    # pyarrow infers dates/timestamps, the C engine keeps their original text
+    temporal = [
+        field.name for field in table.schema
+        if pa.types.is_temporal(field.type) and field.name not in column_types
+    ]
+    if temporal:
+        text_options = convert_options({name: pa.string() for name in temporal})
+        text_options.include_columns = temporal
+        text_table = pa_csv.read_csv(path, read_options, parse_options, text_options)
+        for name in temporal:
+            table = table.set_column(table.schema.get_field_index(name), name, text_table.column(name))
+
+    # Columns without any value are all-NaN float64 in the C engine
+    for index, field in enumerate(table.schema):
+        if pa.types.is_null(field.type):
+            table = table.set_column(index, field.name, table.column(index).cast(pa.float64()))
+
+    return table.to_pandas()
+
+
+def _read_with_c_engine(path: str, dialect: Dict[str, str], hints: Optional[Dict[str, Dict[str, Any]]]) -> pd.DataFrame:
+    dtype = _c_engine_dtypes(hints, include_text=False)
+    try:
+        return pd.read_csv(path, encoding=dialect["encoding"], sep=dialect["delimiter"], dtype=dtype or None)
+    except UnicodeDecodeError:
+        # An undecodable byte after the sniffed prefix: one more parse with a lossless codec
+        return pd.read_csv(path, encoding="latin1", sep=dialect["delimiter"], dtype=dtype or None)
+
+
+def _c_engine_dtypes(hints: Optional[Dict[str, Dict[str, Any]]], include_text: bool) -> Dict[str, Any]:
+    dtype = {}
+    for col, hint in (hints or {}).items():
+        if hint.get("dtype") in NUMERIC_HINTS:
+            dtype[col] = hint["dtype"]
+        elif include_text and hint.get("dtype") == "str":
+            dtype[col] = str
+    return dtype
+
+
+def read_csv_rows(
+    path: str,
+    offset: int,
+    limit: int,
+    hints: Optional[Dict[str, Dict[str, Any]]] = None,
+    row_index: Optional[Dict[str, Any]] = None,
+    dialect: Optional[Dict[str, str]] = None
+) -> pd.DataFrame:
+    """
+    Data rows [offset, offset + limit) of a CSV without parsing the whole file.
+    With a row index (see CsvRowIndex) the read starts at the nearest indexed row,
+    so the cost does not grow with the offset. Hints keep the column types equal
+    to a full parse.
+    """
+    dialect = dialect or sniff_csv(path)
+    options = {"encoding": dialect["encoding"], "sep": dialect["delimiter"], "dtype": _c_engine_dtypes(hints, include_text=True) or None}
+    if offset == 0:
+        return pd.read_csv(path, nrows=limit, **options)
+
+    offsets = (row_index or {}).get("offsets") or []
+    stride = (row_index or {}).get("stride") or ROW_INDEX_STRIDE
+    block = min(offset // stride, len(offsets) - 1)
+    if block < 0:
+        return pd.read_csv(path, skiprows=range(1, offset + 1), nrows=limit, **options)
+
+    columns = pd.read_csv(path, nrows=0, encoding=dialect["encoding"], sep=dialect["delimiter"]).columns
+    skip = offset - block * stride
+    with open(path, "rb") as f:
+        f.seek(offsets[block])
+        rows = pd.read_csv(f, header=None, names=list(columns), nrows=skip + limit, **options)
+    return rows.iloc[skip:].reset_index(drop=True)
+
+
+class CsvRowIndex:
+    """
+    Counts the data rows of a CSV while its bytes stream through (e.g. during upload)
+    and records the byte offset of every `stride`-th row for random access.
+
+    Newlines inside double-quoted fields and blank lines are not counted, like
+    pd.read_csv. The quote state is tracked by parity, so a stray quote inside an
+    unquoted field can throw the count off; exact counts from a parsed frame win.
+    """
+
+    def __init__(self, stride: int = ROW_INDEX_STRIDE):
+        self.stride = stride
+        self.offsets: List[int] = []
+        self._records = 0          # complete non-blank records, header included
+        self._position = 0         # bytes fed so far
+        self._record_start = 0     # byte offset where the current record starts
+        self._pending = False      # the current record already has content
+        self._in_quotes = False
+
+    def feed(self, chunk: bytes):
+        if not chunk:
+            return
+        data = np.frombuffer(chunk, dtype=np.uint8)
+        newlines = np.flatnonzero(data == 10)
+        returns = np.flatnonzero(data == 13) if b"\r" in chunk else newlines[:0]
+        quotes = np.flatnonzero(data == 34) if b'"' in chunk else newlines[:0]
+        # A newline ends a record when an even number of quotes precede it
+        quotes_before = np.searchsorted(quotes, newlines, side="right") + self._in_quotes
+        ends = newlines[quotes_before % 2 == 0]
+
+        def content_before(positions):
+            # Bytes other than \r and \n in data[:position]
+            return positions - np.searchsorted(newlines, positions) - np.searchsorted(returns, positions)
+
+        if len(ends):
+            starts = np.concatenate(([0], ends[:-1] + 1))
+            non_blank = content_before(ends) > content_before(starts)
+            non_blank[0] |= self._pending
+
+            record_numbers = self._records + np.cumsum(non_blank) - 1
+            data_rows = record_numbers - 1  # record 0 is the header
+            indexed = non_blank & (data_rows >= 0) & (data_rows % self.stride == 0)
+            record_starts = self._position + starts
+            record_starts[0] = self._record_start
+            self.offsets.extend(int(offset) for offset in record_starts[indexed])
+
+            self._records += int(non_blank.sum())
+            self._record_start = self._position + int(ends[-1]) + 1
+            tail = content_before(np.array([len(data), ends[-1] + 1]))
+            self._pending = bool(tail[0] > tail[1])
+        else:
+            self._pending = self._pending or bool(content_before(np.array([len(data)]))[0] > 0)
+
+        self._in_quotes = bool((len(quotes) + self._in_quotes) % 2)
+        self._position += len(chunk)
+
+    def result(self) -> Dict[str, Any]:
+        offsets = list(self.offsets)
+        records = self._records
+        if self._pending:
+            # Last record without a trailing newline
+            if records >= 1 and (records - 1) % self.stride == 0:
+                offsets.append(self._record_start)
+            records += 1
+        return {"rows": max(records - 1, 0), "stride": self.stride, "offsets": offsets}
+
+
+def index_csv_rows(path: str, chunk_bytes: int = 4 * 1024 * 1024) -> Dict[str, Any]:
+    """Row count and row index of a CSV file on disk (one sequential read, no parsing)."""
+    index = CsvRowIndex()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_bytes)
+            if not chunk:
+                break
+            index.feed(chunk)
+    return index.result()
+
+
+def _arrow_types(hints: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    types = {"int64": pa.int64(), "float64": pa.float64(), "bool": pa.bool_()}
+    return {
+        col: types.get(hint.get("dtype"), pa.string())
+        for col, hint in hints.items()
+    }
+
+
+def infer_hints(df: pd.DataFrame) -> Dict[str, Dict[str, Any]]:
+    """Per-column type hints of a freshly parsed CSV, to speed up its next parse."""
+    hints = {}
+    for col, values in df.items():
+        if not isinstance(col, str):
+            continue
+        dtype = str(values.dtype)
+        if dtype in NUMERIC_HINTS:
+            hints[col] = {"dtype": dtype}
+        elif dtype in ("object", "str", "string"):
+            hints[col] = {"dtype": "str", "kind": _text_kind(values)}
+    return hints
+
+
+def _text_kind(values: pd.Series) -> str:
+    sample = values.dropna().iloc[:1000]
+    if sample.empty:
+        return "text"
+    try:
+        parsed = pd.to_datetime(sample, errors="coerce", format="ISO8601")
+        if parsed.notna().mean() >= 0.95:
+            return "datetime"
+    except (TypeError, ValueError):
+        pass
+    try:
+        if sample.nunique() <= CATEGORY_MAX_RATIO * len(sample):
+            return "category"
+    except TypeError:
+        pass
+    return "text"
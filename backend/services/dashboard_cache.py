@@ -0,0 +1,163 @@
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from config import DATA_DIR
+from services.metrics import record_cache_lookup
+
+# Plan hash used for dashboards built without an LLM plan
+FALLBACK_PLAN = "fallback"
+
+
+class VersionCache:
+    """
+    JSON entries derived from one version of a dataset, so work done on a version
+    (profiling, dtype inference, row indexing) is done once. Entries of old versions
+    are dropped with prune().
+
+    Layout: DATA_DIR/<user_id>/derived/<file_id>/<dataset_version>/
+        profile.json       column profile (see services.profiler)
+        sketches.json      mergeable per-column sketches computed with the profile (see services.sketches)
+        hints.json         dtype hints from the first parse of the file (see services.csv_reader)
+        rows.json          CSV row count and row offset index (see services.csv_reader.CsvRowIndex)
+
+    Entries written before under DATA_DIR/<user_id>/dashboards are still read,
+    counted and pruned; new entries always go to derived/.
+    """
+
+    def _user_dir(self, user_id: str) -> str:
+        return os.path.join(DATA_DIR, user_id, "derived")
+
+    def _user_dirs(self, user_id: str) -> List[str]:
+        # Current location first, then the original one (only dashboards were cached there)
+        return [self._user_dir(user_id), os.path.join(DATA_DIR, user_id, "dashboards")]
+
+    def _version_dir(self, user_id: str, file_id: str, version: str) -> str:
+        return os.path.join(self._user_dir(user_id), file_id, version)
+
+    def get_entry(self, user_id: str, file_id: str, version: str, name: str) -> Optional[Dict[str, Any]]:
+        for user_dir in self._user_dirs(user_id):
+            entry = self._read(os.path.join(user_dir, file_id, version, f"{name}.json"))
+            if entry is not None:
+                return entry
+        return None
+
+    def put_entry(self, user_id: str, file_id: str, version: str, name: str, data: Dict[str, Any]):
+        self._write(os.path.join(self._version_dir(user_id, file_id, version), f"{name}.json"), data)
+
+    def get_profile(self, user_id: str, file_id: str, version: str) -> Optional[Dict[str, Any]]:
+        return self.get_entry(user_id, file_id, version, "profile")
+
+    def put_profile(self, user_id: str, file_id: str, version: str, profile: Dict[str, Any]):
+        self.put_entry(user_id, file_id, version, "profile", profile)
+
+    def get_sketches(self, user_id: str, file_id: str, version: str) -> Optional[Dict[str, Any]]:
+        return self.get_entry(user_id, file_id, version, "sketches")
+
+    def put_sketches(self, user_id: str, file_id: str, version: str, sketches: Dict[str, Any]):
+        self.put_entry(user_id, file_id, version, "sketches", sketches)
+
+    def get_dtype_hints(self, user_id: str, file_id: str, version: str) -> Optional[Dict[str, Any]]:
+        return self.get_entry(user_id, file_id, version, "hints")
+
+    def put_dtype_hints(self, user_id: str, file_id: str, version: str, hints: Dict[str, Any]):
+        self.put_entry(user_id, file_id, version, "hints", hints)
+
+    def get_row_index(self, user_id: str, file_id: str, version: str) -> Optional[Dict[str, Any]]:
+        return self.get_entry(user_id, file_id, version, "rows")
+
+    def put_row_index(self, user_id: str, file_id: str, version: str, row_index: Dict[str, Any]):
+        self.put_entry(user_id, file_id, version, "rows", row_index)
+
+    def file_ids(self, user_id: str) -> List[str]:
+        file_ids = set()
+        for user_dir in self._user_dirs(user_id):
+            if os.path.isdir(user_dir):
+                file_ids.update(os.listdir(user_dir))
+        return sorted(file_ids)
+
+    def prune(self, user_id: str, file_id: str, keep_version: Optional[str] = None) -> int:
+        """Removes cached entries of file_id except `keep_version`; returns the bytes freed."""
+        freed = 0
+        for user_dir in self._user_dirs(user_id):
+            file_dir = os.path.join(user_dir, file_id)
+            if not os.path.isdir(file_dir):
+                continue
+            for version in os.listdir(file_dir):
+                if version == keep_version:
+                    continue
+                version_dir = os.path.join(file_dir, version)
+                freed += self._directory_size(version_dir)
+                shutil.rmtree(version_dir, ignore_errors=True)
+            if keep_version is None:
+                shutil.rmtree(file_dir, ignore_errors=True)
+        return freed
+
+    def size(self, user_id: str) -> int:
+        """Bytes used by the user's cached entries (dashboards included)."""
+        return sum(self._directory_size(user_dir) for user_dir in self._user_dirs(user_id))
+
+    def _directory_size(self, path: str) -> int:
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(path) for name in names
+        )
+
+    def _read(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write(self, path: str, data: Dict[str, Any]):
+        # Write to a temp file and rename so concurrent readers never see a partial entry
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, default=str)
+        os.replace(tmp_path, path)
+
+
+class DashboardCache(VersionCache):
+    """
+    Persists executed dashboards per (file_id, dataset version, plan hash), plus the
+    dataset context the data story needs, so a story request can reuse the overview
+    work instead of re-planning, re-executing and re-loading the dataset.
+
+    Stored next to the other entries of the version (see VersionCache):
+        <plan_hash>.json   executed dashboard for that plan
+        latest.json        the most recently stored dashboard for this version
+        context.json       precomputed dataset context for the data story
+    """
+
+    def get(self, user_id: str, file_id: str, version: str, plan_hash: str) -> Optional[Dict[str, Any]]:
+        entry = self.get_entry(user_id, file_id, version, plan_hash)
+        record_cache_lookup("dashboard", entry is not None)
+        return entry.get("dashboard") if entry else None
+
+    def get_latest(self, user_id: str, file_id: str, version: str) -> Optional[Dict[str, Any]]:
+        entry = self.get_entry(user_id, file_id, version, "latest")
+        return entry.get("dashboard") if entry else None
+
+    def put(self, user_id: str, file_id: str, version: str, plan_hash: str, dashboard: Dict[str, Any]):
+        if not dashboard or "error" in dashboard:
+            return
+        entry = {
+            "file_id": file_id,
+            "dataset_version": version,
+            "plan_hash": plan_hash,
+            "created_at": datetime.now().isoformat(),
+            "dashboard": dashboard
+        }
+        self.put_entry(user_id, file_id, version, plan_hash, entry)
+        self.put_entry(user_id, file_id, version, "latest", entry)
+
+    def get_dataset_context(self, user_id: str, file_id: str, version: str) -> Optional[str]:
+        entry = self.get_entry(user_id, file_id, version, "context")
+        return entry.get("dataset_context") if entry else None
+
+    def put_dataset_context(self, user_id: str, file_id: str, version: str, dataset_context: str):
+        self.put_entry(user_id, file_id, version, "context", {"dataset_context": dataset_context})
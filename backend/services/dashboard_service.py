@@ -1,17 +1,32 @@
-import traceback
+import logging
 from typing import Dict, Any, List
 from services.analytics_engine import AnalyticsEngine
 from services.data_ingestion import DataIngestionService
+from services.single_flight import SingleFlight, stable_hash
+from services.data_health import compute_data_health
+from services.request_profiling import profiled
+from config import DATA_HEALTH_CHUNK_ROWS, DATA_HEALTH_APPROX_ERROR
+
+logger = logging.getLogger(__name__)
+
+# Overview and data story requests often execute the same plan at the same time
+_dashboard_flight = SingleFlight()
 
 class DashboardService:
     def __init__(self):
         self.analytics = AnalyticsEngine()
         self.ingestion = DataIngestionService()
 
+    @profiled("dashboard.generate")
     def generate_dashboard_data(self, file_id: str, dashboard_plan: Dict[str, Any], user_id: str) -> Dict[str, Any]:
         """
         Executes the dashboard plan against the dataset using AnalyticsEngine.
+        Concurrent calls with the same plan for the same file share one execution.
         """
+        key = (user_id, file_id, stable_hash(dashboard_plan))
+        return _dashboard_flight.do(key, self._execute_dashboard_plan, file_id, dashboard_plan, user_id)
+
+    def _execute_dashboard_plan(self, file_id: str, dashboard_plan: Dict[str, Any], user_id: str) -> Dict[str, Any]:
         try:
             dashboard = dashboard_plan.get("dashboard", {})
             if not dashboard:
@@ -27,11 +42,13 @@ class DashboardService:
             
             # 1. KPIs
             for item in dashboard.get("kpis", []):
-                val = self._resolve_metric(file_id, item.get("metric"), item.get("title"), user_id)
+                metric = item.get("metric")
+                val = self._resolve_metric(file_id, metric, item.get("title"), user_id)
                 output["kpis"].append({
                     "title": item.get("title"),
                     "value": val,
-                    "description": item.get("description")
+                    "description": item.get("description"),
+                    "plan": self._metric_plan(metric) if metric else None
                 })
                 
             # 2. Trends
@@ -47,31 +64,36 @@ class DashboardService:
             return output
             
         except Exception as e:
-            print(f"Dashboard Generation Error: {traceback.format_exc()}")
+            logger.exception("Dashboard Generation Error")
             return {"error": str(e)}
 
-    def _resolve_metric(self, file_id: str, metric: Dict, title: str, user_id: str) -> Any:
-        if not metric: return "N/A"
-        
+    def _metric_plan(self, metric: Dict) -> Dict[str, Any]:
+        """The DSL plan computing a KPI metric (stored with the KPI so report tiles can refresh it)."""
         # Handle ROW_COUNT special case
         if metric.get("column") == "ROW_COUNT" or metric.get("column") == "__ROW_COUNT__":
-            plan = {
+            # Analytics engine metadata query returns row_count
+            return {
                 "query_type": "metadata", # or aggregation with no metrics
                 "metrics": [],
                 "group_by": []
             }
-            # Analytics engine metadata query returns row_count
-            res = self.analytics.execute_plan(file_id, plan, user_id)
-            return res.get("result", {}).get("row_count", 0)
 
         # Construct a mini-plan for AnalyticsEngine
-        plan = {
+        return {
             "query_type": "aggregation",
             "metrics": [metric],
             "group_by": [],
             "filters": [],
             "limit": None
         }
+
+    def _resolve_metric(self, file_id: str, metric: Dict, title: str, user_id: str) -> Any:
+        if not metric: return "N/A"
+        
+        plan = self._metric_plan(metric)
+        if plan["query_type"] == "metadata":
+            res = self.analytics.execute_plan(file_id, plan, user_id)
+            return res.get("result", {}).get("row_count", 0)
         
         try:
             result = self.analytics.execute_plan(file_id, plan, user_id)
@@ -111,7 +133,8 @@ class DashboardService:
                 metrics_payload = [] 
             
             plan = {
-                "query_type": "aggregation",
+                # Trends are bucketed by time (falls back to grouping by x if it holds no dates)
+                "query_type": "timeseries" if section == "trends" else "aggregation",
                 "metrics": metrics_payload,
                 "group_by": [x_col] if x_col else [],
                 "filters": [],
@@ -144,46 +167,61 @@ class DashboardService:
                 if metrics_payload:
                      y_key = f"{metrics_payload[0]['operation']}_{metrics_payload[0]['column']}"
 
+                config = {
+                    "x": x_col,
+                    "y": y_key
+                }
+                if res.get("granularity"):
+                    config["granularity"] = res["granularity"]
+
                 resolved.append({
                     "title": item.get("title"),
                     "chart_type": chart_type,
                     "data": data,
-                    "config": {
-                        "x": x_col,
-                        "y": y_key
-                    }
+                    "config": config,
+                    "plan": plan
                 })
             except Exception:
                 continue
                 
         return resolved
 
+    @profiled("dashboard.data_health")
     def _get_data_health(self, file_id: str, user_id: str) -> Dict[str, Any]:
         df = self.ingestion.load_dataset(file_id, user_id)
         
-        # Null analysis
-        null_counts = df.isnull().sum()
-        total_rows = len(df)
+        # Null counts and duplicate fingerprints in a single scan
+        health = compute_data_health(
+            df,
+            chunk_rows=DATA_HEALTH_CHUNK_ROWS,
+            approximate_error=DATA_HEALTH_APPROX_ERROR or None
+        )
+        total_rows = health["total_rows"]
         
         # High nulls
         null_analysis = []
-        for col, count in null_counts.items():
+        for col, count in health["null_counts"].items():
             if count > 0:
                 null_analysis.append({
                     "column": col,
-                    "null_count": int(count),
+                    "null_count": count,
                     "null_percentage": round((count / total_rows) * 100, 1)
                 })
         
         # Sort by null percentage
         null_analysis.sort(key=lambda x: x["null_percentage"], reverse=True)
         
-        return {
+        result = {
              "total_rows": total_rows,
-             "duplicate_rows": int(df.duplicated().sum()),
+             "duplicate_rows": health["duplicate_rows"],
              "null_analysis_top_5": null_analysis[:5]
         }
+        if health.get("duplicate_rows_approximate"):
+            result["duplicate_rows_approximate"] = True
+            result["duplicate_rows_margin"] = health["duplicate_rows_margin"]
+        return result
 
+    @profiled("dashboard.generate_fallback")
     def generate_fallback_dashboard(self, file_id: str, user_id: str) -> Dict[str, Any]:
         """
         Generates a basic dashboard when LLM is unavailable (e.g. rate limits).
@@ -208,28 +246,21 @@ class DashboardService:
             
             # Try to find a date column for a simple trend
             trends = []
-            date_cols = [c for c in df.columns if "date" in c.lower() or "time" in c.lower()]
+            date_cols = [c for c in df.columns if "date" in str(c).lower() or "time" in str(c).lower()]
             if date_cols:
                 # Pick first date column
                 dc = date_cols[0]
-                # Simple count by date
-                try:
-                    # Convert to datetime to be sure
-                    temp_df = df.copy()
-                    temp_df[dc] = pd.to_datetime(temp_df[dc], errors='coerce')
-                    # Group by date (floor to day)
-                    daily_counts = temp_df.groupby(temp_df[dc].dt.date).size().reset_index(name='count')
-                    # Sort
-                    daily_counts = daily_counts.sort_values(by=dc).tail(50) # Last 50 points
-                    
+                # Record count per time bucket (granularity chosen from the date span)
+                plan = {"query_type": "timeseries", "metrics": [], "group_by": [dc], "filters": []}
+                res = self.analytics.execute_plan(file_id, plan, user_id)
+                if res.get("granularity") and res.get("result"):
                     trends.append({
                         "title": f"Records over Time ({dc})",
                         "chart_type": "line",
-                        "data": daily_counts.to_dict(orient='records'),
-                        "config": {"x": dc, "y": "count"}
+                        "data": res["result"],
+                        "config": {"x": dc, "y": "count", "granularity": res["granularity"]},
+                        "plan": plan
                     })
-                except Exception:
-                    pass # Skip if fails
             
             return {
                 "kpis": kpis,
@@ -238,5 +269,5 @@ class DashboardService:
                 "data_health": health
             }
         except Exception as e:
-            print(f"Fallback Generation Error: {e}")
+            logger.error("Fallback Generation Error: %s", e)
             return {"kpis": [], "trends": [], "distributions": [], "data_health": {}}
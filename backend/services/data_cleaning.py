@@ -1,27 +1,35 @@
+import logging
 import pandas as pd
-import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from schemas import CleaningSuggestion
-from services.data_ingestion import DataIngestionService, PROCESSED_DIR
-import os
+from services.data_ingestion import DataIngestionService
+from services.dataset_versions import DatasetVersionService
+from services.data_health import compute_data_health
+from services.profiler import profile_dataset, null_counts
+from config import DATA_HEALTH_CHUNK_ROWS
+
+logger = logging.getLogger(__name__)
 
 class DataCleaningService:
     def __init__(self):
         self.ingestion = DataIngestionService()
+        self.versions = DatasetVersionService(self.ingestion)
 
-    def generate_summary(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Generates a summary for the LLM."""
+    def generate_summary(self, df: pd.DataFrame, profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Generates a summary for the LLM (pass the dataset's cached profile to avoid re-scanning it)."""
+        profile = profile or profile_dataset(df)
         return {
             "columns": df.columns.tolist(),
             "dtypes": {k: str(v) for k, v in df.dtypes.items()},
-            "missing_values": df.isnull().sum().to_dict(),
+            "missing_values": null_counts(profile),
             "sample_data": df.head(3).to_dict(orient='records'),
             "num_rows": len(df)
         }
 
-    def rule_based_suggestions(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+    def rule_based_suggestions(self, df: pd.DataFrame, profile: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """
         Lightweight fallback suggestions when the LLM is unavailable or returns bad JSON.
+        Null counts and modes come from the column profile (computed if not passed).
         """
         suggestions: List[Dict[str, Any]] = []
 
@@ -29,10 +37,11 @@ class DataCleaningService:
         if total_rows == 0:
             return suggestions
 
-        missing_counts = df.isnull().sum()
+        profile = profile or profile_dataset(df)
 
         # Suggest handling missing values
-        for col, missing in missing_counts.items():
+        for column in profile["columns"]:
+            col, missing = column["name"], column["null_count"]
             if missing == 0:
                 continue
 
@@ -45,12 +54,11 @@ class DataCleaningService:
                 })
             else:
                 # Choose a sensible fill strategy
-                if pd.api.types.is_numeric_dtype(df[col]):
+                if column["kind"] in ("numeric", "boolean"):
                     fill_value = "median"  # resolved at apply time
                     fill_desc = "median"
                 else:
-                    mode_series = df[col].mode(dropna=True)
-                    fill_value = mode_series.iloc[0] if not mode_series.empty else "Unknown"
+                    fill_value = column["mode"] if column["mode"] is not None else "Unknown"
                     fill_desc = "mode"
 
                 suggestions.append({
@@ -61,7 +69,7 @@ class DataCleaningService:
                 })
 
         # Suggest dropping duplicates if present
-        dup_count = df.duplicated().sum()
+        dup_count = compute_data_health(df, chunk_rows=DATA_HEALTH_CHUNK_ROWS)["duplicate_rows"]
         if dup_count > 0:
             suggestions.append({
                 "action": "DROP_DUPLICATES",
@@ -70,50 +78,28 @@ class DataCleaningService:
 
         return suggestions
 
-    def apply_cleaning(self, file_id: str, suggestions: List[CleaningSuggestion], user_id: str) -> str:
-        """Applies cleaning suggestions and saves a new version."""
-        df = self.ingestion.load_dataset(file_id, user_id)
-        
-        # Deep copy for safety
-        df_clean = df.copy()
+    def apply_cleaning(self, file_id: str, suggestions: List[CleaningSuggestion], user_id: str,
+                       materialize: bool = False) -> str:
+        """
+        Records the cleaning suggestions as a new version derived from file_id and
+        returns its id. Earlier versions are kept. The operations are applied lazily
+        when the new version is loaded; pass `materialize` to also store the result
+        as parquet right away.
+        """
+        operations = [
+            {"action": sug.action, "column": sug.column, "value": sug.value}
+            for sug in suggestions
+        ]
 
-        for sug in suggestions:
-            try:
-                if sug.action == "DROP_NULLS":
-                    if sug.column:
-                        df_clean.dropna(subset=[sug.column], inplace=True)
-                    else:
-                        df_clean.dropna(inplace=True)
-                
-                elif sug.action == "FILL_NULLS":
-                    if sug.column and sug.value is not None:
-                        # Handle type conversion if needed
-                        val = sug.value
-                        if val == "mean":
-                            val = df_clean[sug.column].mean()
-                        elif val == "median":
-                            val = df_clean[sug.column].median()
-                        elif val == "mode":
-                            val = df_clean[sug.column].mode()[0]
-                        
-                        df_clean[sug.column] = df_clean[sug.column].fillna(val)
-                
-                elif sug.action == "DROP_DUPLICATES":
-                    df_clean.drop_duplicates(inplace=True)
-                
-                elif sug.action == "RENAME_COLUMN":
-                    if sug.column and sug.value:
-                         df_clean.rename(columns={sug.column: sug.value}, inplace=True)
+        new_file_id = self.versions.create_version(file_id, operations, user_id)
 
-            except Exception as e:
-                print(f"Error applying suggestion {sug}: {e}")
+        try:
+            if materialize:
+                self.versions.materialize(new_file_id, user_id)
+            else:
+                self.versions.collect_garbage(user_id)
+        except Exception as e:
+            # The version is still usable: it is derived on load instead
+            logger.warning("Error storing cleaned version %s: %s", new_file_id, e)
 
-        # Save processed file to user directory
-        new_filename = f"{file_id}_cleaned.csv"
-        user_processed_dir = os.path.join(PROCESSED_DIR, user_id)
-        os.makedirs(user_processed_dir, exist_ok=True)
-        
-        save_path = os.path.join(user_processed_dir, new_filename)
-        df_clean.to_csv(save_path, index=False)
-        
-        return f"{file_id}_cleaned"
+        return new_file_id
@@ -0,0 +1,149 @@
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+from pandas.util import hash_array
+from services.sketches import HyperLogLog
+
+
+# Fixed hash for missing cells, so None/NaN/NaT compare equal (as in DataFrame.duplicated)
+_NA_HASH = np.uint64(0x9E3779B97F4A7C15)
+_MIX = np.uint64(0x100000001B3)
+
+
+_CARDINALITY_SAMPLE = 10_000
+
+# Approximate duplicate counts are reported within this many standard errors of the
+# distinct-row estimate (about 95%)
+_APPROX_MARGIN_ERRORS = 2
+
+
+def _is_text_like(values: pd.Series) -> bool:
+    return pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values) \
+        or isinstance(values.dtype, pd.CategoricalDtype)
+
+
+def _column_hashes(values: pd.Series) -> np.ndarray:
+    """Value-stable 64-bit hash per cell: the same value hashes the same in every chunk."""
+    if not _is_text_like(values):
+        hashes = pd.util.hash_pandas_object(values, index=False, categorize=False).to_numpy(dtype=np.uint64)
+        return np.where(values.isna().to_numpy(), _NA_HASH, hashes)
+
+    try:
+        sample = values.iloc[:_CARDINALITY_SAMPLE]
+        low_cardinality = sample.nunique(dropna=False) * 2 <= len(sample)
+    except TypeError:
+        # Unhashable cells (lists, dicts): hash their string form instead
+        values = values.where(values.isna(), values.astype(str))
+        low_cardinality = False
+
+    if low_cardinality:
+        # Hash each distinct value once and broadcast it through the factorized codes
+        codes, uniques = pd.factorize(values, use_na_sentinel=True)
+        unique_hashes = hash_array(np.asarray(uniques, dtype=object), categorize=False)
+        return np.where(codes >= 0, unique_hashes.take(np.maximum(codes, 0)), _NA_HASH)
+
+    hashes = hash_array(np.asarray(values, dtype=object), categorize=False)
+    return np.where(values.isna().to_numpy(), _NA_HASH, hashes)
+
+
+def row_fingerprints(df: pd.DataFrame) -> np.ndarray:
+    """
+    One 64-bit hash per row, built from per-column value hashes. Equal rows (with
+    NaN/None treated as equal, like DataFrame.duplicated) get equal fingerprints,
+    also across chunks of the same frame.
+    """
+    fingerprints = np.zeros(len(df), dtype=np.uint64)
+    for i in range(df.shape[1]):
+        fingerprints ^= _column_hashes(df.iloc[:, i])
+        fingerprints *= _MIX
+    return fingerprints
+
+
+class DataHealthAccumulator:
+    """
+    Single-pass data health over one frame or a stream of chunks.
+
+    Each chunk is scanned once for null counts and once for row fingerprints.
+    Duplicates are counted exactly from the collected fingerprints (8 bytes per row).
+    Passing `approximate_error` instead feeds them to a HyperLogLog sketch with that
+    relative error, so memory stays constant for arbitrarily large inputs. The error
+    applies to the distinct-row estimate, so the duplicate count (rows minus distinct
+    rows) is off by up to a multiple of error * distinct rows: it is reported with
+    that margin, and as 0 when it falls within it.
+    """
+
+    def __init__(self, approximate_error: Optional[float] = None):
+        self.total_rows = 0
+        self.null_counts: Optional[pd.Series] = None
+        self._sketch = HyperLogLog(error_rate=approximate_error) if approximate_error else None
+        self._fingerprints: List[np.ndarray] = []
+
+    def update(self, chunk: pd.DataFrame) -> "DataHealthAccumulator":
+        self.total_rows += len(chunk)
+
+        nulls = chunk.isna().sum()
+        self.null_counts = nulls if self.null_counts is None else self.null_counts.add(nulls, fill_value=0)
+
+        if len(chunk):
+            fingerprints = row_fingerprints(chunk)
+            if self._sketch is not None:
+                self._sketch.add_hashes(fingerprints)
+            else:
+                self._fingerprints.append(fingerprints)
+        return self
+
+    def duplicate_rows(self) -> int:
+        if self._sketch is not None:
+            return self._approximate_duplicates()[0]
+        if not self._fingerprints:
+            return 0
+        fingerprints = np.concatenate(self._fingerprints) if len(self._fingerprints) > 1 else self._fingerprints[0]
+        return int(len(fingerprints) - len(pd.unique(fingerprints)))
+
+    def _approximate_duplicates(self) -> Tuple[int, int]:
+        """(estimated duplicate rows, margin in rows) from the distinct-row sketch."""
+        distinct = min(self._sketch.count(), self.total_rows)
+        margin = _APPROX_MARGIN_ERRORS * self._sketch.error_rate * distinct
+        duplicates = self.total_rows - distinct
+        if duplicates <= margin:
+            # Indistinguishable from no duplicates at this error rate
+            duplicates = 0
+        return int(round(duplicates)), int(math.ceil(margin))
+
+    def result(self) -> Dict[str, Any]:
+        null_counts = self.null_counts if self.null_counts is not None else pd.Series(dtype="int64")
+        health = {
+            "total_rows": self.total_rows,
+            "duplicate_rows": self.duplicate_rows(),
+            "null_counts": {col: int(count) for col, count in null_counts.items()},
+        }
+        if self._sketch is not None:
+            health["duplicate_rows_approximate"] = True
+            health["duplicate_rows_error_rate"] = round(self._sketch.error_rate, 4)
+            health["duplicate_rows_margin"] = self._approximate_duplicates()[1]
+        return health
+
+
+def compute_data_health(
+    data: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+    chunk_rows: Optional[int] = None,
+    approximate_error: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Null counts and duplicate row count for a frame (split into `chunk_rows` slices)
+    or for an iterable of chunks, e.g. pd.read_csv(..., chunksize=n).
+    """
+    accumulator = DataHealthAccumulator(approximate_error=approximate_error)
+
+    if isinstance(data, pd.DataFrame):
+        if chunk_rows and len(data) > chunk_rows:
+            chunks = (data.iloc[start:start + chunk_rows] for start in range(0, len(data), chunk_rows))
+        else:
+            chunks = [data]
+    else:
+        chunks = data
+
+    for chunk in chunks:
+        accumulator.update(chunk)
+    return accumulator.result()
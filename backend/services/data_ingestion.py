@@ -1,11 +1,52 @@
 import os
-import shutil
+import json
+import hashlib
+import re
+import time
 import uuid
+from datetime import datetime
+import numpy as np
 import pandas as pd
 from fastapi import UploadFile, HTTPException
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from schemas import DatasetMetadata
-from config import UPLOAD_DIR, PROCESSED_DIR
+from config import UPLOAD_DIR, PROCESSED_DIR, DATASET_CACHE_MB
+from services.single_flight import SingleFlight
+from services.dataset_cache import DatasetCache
+from services.cleaning_pipeline import apply_operations
+from services.csv_reader import CsvRowIndex, index_csv_rows, read_csv, read_csv_rows, sniff_csv
+from services.excel_converter import EXCEL_EXTENSIONS, convert_workbook, load_catalog, write_parquet
+from services.dashboard_cache import VersionCache
+from services.request_profiling import profiled
+from services.metrics import DATASET_CACHE_BYTES, DATASET_LOAD_BYTES, DATASET_LOAD_SECONDS, record_cache_lookup
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # parquet previews then load the whole file
+    pq = None
+
+# Parquet first: converted Excel sheets live next to (and win over) the original workbook
+DATASET_EXTENSIONS = ('.parquet', '.csv', '.xlsx', '.xls')
+SHEET_ID_PATTERN = re.compile(r"^(.*)_sheet\d+$")
+# Derived (cleaned) datasets: <file_id>.ops.json records the parent and the operations,
+# <file_id>.parquet is an optional materialized copy of the result
+MANIFEST_SUFFIX = ".ops.json"
+MATERIALIZED_SUFFIX = ".parquet"
+
+# Shared by every DataIngestionService instance so concurrent loads of one file parse it once
+_load_flight = SingleFlight()
+_frame_cache = DatasetCache(max_bytes=DATASET_CACHE_MB * 1024 * 1024)
+DATASET_CACHE_BYTES.set_function(lambda: _frame_cache.total_bytes)
+# Per-version derived data on disk (dtype hints, CSV row index, profiles)
+_version_cache = VersionCache()
+
+# Metadata previews: default/maximum preview size, maximum page size, and the
+# number of leading CSV rows read for column names and dtypes
+PREVIEW_ROWS = 5
+MAX_PREVIEW_ROWS = 100
+MAX_PAGE_ROWS = 1000
+PREVIEW_SAMPLE_ROWS = 1000
+UPLOAD_CHUNK_BYTES = 1024 * 1024
 
 class DataIngestionService:
     def __init__(self):
@@ -21,56 +62,329 @@ class DataIngestionService:
         os.makedirs(user_upload_dir, exist_ok=True)
         
         file_path = os.path.join(user_upload_dir, f"{file_id}{extension}")
-        
+
+        # Count CSV rows while copying, so metadata never has to parse the file for them
+        row_index = CsvRowIndex() if extension == ".csv" else None
         with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
+            while True:
+                chunk = file.file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                buffer.write(chunk)
+                if row_index is not None:
+                    row_index.feed(chunk)
+
+        if row_index is not None:
+            version = self.get_dataset_version(file_id, user_id)
+            _version_cache.put_row_index(user_id, file_id, version, row_index.result())
+
         return file_id, file_path
 
+    @profiled("ingestion.load_dataset")
     def load_dataset(self, file_id: str, user_id: str) -> pd.DataFrame:
-        """Loads dataset from disk (checks processed first, then original)."""
+        """
+        Loads dataset from disk (checks processed first, then original).
+        Parsed frames are cached per dataset version and shared between callers, so they must not be mutated in place.
+        """
+        version = self.get_dataset_version(file_id, user_id)
+        df = _frame_cache.get(user_id, file_id, version)
+        record_cache_lookup("dataset", df is not None)
+        if df is None:
+            df = _load_flight.do((user_id, file_id, version), self._read_and_cache, file_id, user_id, version)
+        return df
+
+    def _read_and_cache(self, file_id: str, user_id: str, version: str) -> pd.DataFrame:
+        start = time.perf_counter()
+        df, data_format, size = self._read_dataset(file_id, user_id, version)
+        DATASET_LOAD_SECONDS.labels(data_format).observe(time.perf_counter() - start)
+        DATASET_LOAD_BYTES.labels(data_format).inc(size)
+        _frame_cache.put(user_id, file_id, version, df)
+        return df
+
+    @profiled("ingestion.read")
+    def _read_dataset(self, file_id: str, user_id: str, version: str) -> Tuple[pd.DataFrame, str, int]:
+        """The parsed frame, the format it was read from and the bytes read from disk."""
+        manifest = self.get_manifest(file_id, user_id)
+        if manifest is not None:
+            materialized_path = self._user_processed_path(file_id, user_id, MATERIALIZED_SUFFIX)
+            if os.path.exists(materialized_path):
+                return pd.read_parquet(materialized_path), "parquet", os.path.getsize(materialized_path)
+            # Derived dataset: replay the recorded operations over the (cached) parent frame
+            parent = self.load_dataset(manifest["parent"], user_id)
+            return apply_operations(parent, manifest["operations"]), "derived", 0
+
+        path = self.resolve_path(file_id, user_id)
+        size = os.path.getsize(path)
+        if path.endswith('.parquet'):
+            return pd.read_parquet(path), "parquet", size
+        if path.endswith(EXCEL_EXTENSIONS):
+            # Workbook uploaded before sheets were converted at upload: convert it once now
+            self.convert_workbook(file_id, user_id)
+            return pd.read_parquet(self._user_processed_path(file_id, user_id, ".parquet")), "excel", size
+        if path.endswith('.csv'):
+            hints = _version_cache.get_dtype_hints(user_id, file_id, version)
+            df, inferred_hints = read_csv(path, hints)
+            if hints is None:
+                _version_cache.put_dtype_hints(user_id, file_id, version, inferred_hints)
+            return df, "csv", size
+        raise FileNotFoundError(f"File ID {file_id} has an unsupported format.")
+
+    def convert_workbook(self, file_id: str, user_id: str) -> List[Dict[str, Any]]:
+        """
+        Converts every sheet of an uploaded workbook to parquet (first sheet under
+        file_id, the others under "<file_id>_sheet<n>"), so the workbook is never
+        parsed again. Returns the sheet catalog.
+        """
+        path = os.path.join(UPLOAD_DIR, user_id)
+        for extension in EXCEL_EXTENSIONS:
+            workbook_path = os.path.join(path, f"{file_id}{extension}")
+            if os.path.exists(workbook_path):
+                return convert_workbook(workbook_path, file_id, os.path.join(PROCESSED_DIR, user_id))
+        raise FileNotFoundError(f"File ID {file_id} is not an uploaded workbook.")
+
+    def get_sheets(self, file_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Sheet catalog of the workbook file_id (or one of its sheets or cleaned versions) belongs to."""
+        root_id = self.get_root_id(file_id, user_id)
+        match = SHEET_ID_PATTERN.match(root_id)
+        for workbook_id in [root_id] + ([match.group(1)] if match else []):
+            catalog = load_catalog(os.path.join(PROCESSED_DIR, user_id), workbook_id)
+            if catalog is not None:
+                return catalog
+        return None
+
+    def get_dtype_hints(self, file_id: str, user_id: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Column type hints recorded when the dataset's CSV was first parsed, e.g.
+        {"order_date": {"dtype": "str", "kind": "datetime"}}. Empty if none were recorded.
+        """
+        version = self.get_dataset_version(file_id, user_id)
+        return _version_cache.get_dtype_hints(user_id, file_id, version) or {}
+
+    def resolve_path(self, file_id: str, user_id: str) -> str:
+        """Finds the file backing a dataset id (checks processed first, then original)."""
         
         # Search in user specific directories
         user_processed_dir = os.path.join(PROCESSED_DIR, user_id)
         user_upload_dir = os.path.join(UPLOAD_DIR, user_id)
         
         for dir_path in [user_processed_dir, user_upload_dir]:
-            if not os.path.exists(dir_path):
-                continue
-                
-            for filename in os.listdir(dir_path):
-                if filename.startswith(file_id):
-                    path = os.path.join(dir_path, filename)
-                    if filename.endswith('.csv'):
-                        try:
-                            return pd.read_csv(path, encoding='utf-8')
-                        except UnicodeDecodeError:
-                            try:
-                                return pd.read_csv(path, encoding='latin1')
-                            except Exception:
-                                return pd.read_csv(path, encoding='cp1252')
-                    elif filename.endswith(('.xlsx', '.xls')):
-                        return pd.read_excel(path)
+            # Exact name match: "<id>_cleaned.csv" must not shadow the dataset "<id>"
+            for extension in DATASET_EXTENSIONS:
+                path = os.path.join(dir_path, f"{file_id}{extension}")
+                if os.path.exists(path):
+                    return path
         
         raise FileNotFoundError(f"File ID {file_id} not found for user.")
 
-    def get_metadata(self, file_id: str, user_id: str, preview_rows: int = 5) -> DatasetMetadata:
+    def _user_processed_path(self, file_id: str, user_id: str, suffix: str) -> str:
+        return os.path.join(PROCESSED_DIR, user_id, f"{file_id}{suffix}")
+
+    def get_manifest(self, file_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._user_processed_path(file_id, user_id, MANIFEST_SUFFIX), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save_derived_dataset(self, file_id: str, parent_id: str, operations: List[Dict[str, Any]], user_id: str):
+        """
+        Records file_id as parent_id with `operations` applied. Nothing is rewritten:
+        the data is derived on load, or read from parquet once materialize() is called.
+        Derived datasets are immutable, so FileExistsError is raised if file_id is taken.
+        """
+        if parent_id == file_id:
+            raise ValueError("A dataset cannot be derived from itself")
+
+        user_processed_dir = os.path.join(PROCESSED_DIR, user_id)
+        os.makedirs(user_processed_dir, exist_ok=True)
+
+        manifest = {
+            "file_id": file_id,
+            "parent": parent_id,
+            "root": self.get_root_id(parent_id, user_id),
+            "operations": operations,
+            "created_at": datetime.now().isoformat()
+        }
+        manifest_path = self._user_processed_path(file_id, user_id, MANIFEST_SUFFIX)
+        tmp_path = f"{manifest_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, default=str)
+        try:
+            # Hard link instead of rename: fails rather than replacing an existing version
+            os.link(tmp_path, manifest_path)
+        finally:
+            os.remove(tmp_path)
+
+    def is_materialized(self, file_id: str, user_id: str) -> bool:
+        return os.path.exists(self._user_processed_path(file_id, user_id, MATERIALIZED_SUFFIX))
+
+    def list_derived_datasets(self, user_id: str) -> List[Dict[str, Any]]:
+        """Manifests of every derived dataset of the user."""
+        user_processed_dir = os.path.join(PROCESSED_DIR, user_id)
+        if not os.path.isdir(user_processed_dir):
+            return []
+        manifests = []
+        for filename in os.listdir(user_processed_dir):
+            if filename.endswith(MANIFEST_SUFFIX):
+                manifest = self.get_manifest(filename[:-len(MANIFEST_SUFFIX)], user_id)
+                if manifest is not None:
+                    manifests.append(manifest)
+        return manifests
+
+    def list_materialized(self, user_id: str) -> List[Tuple[str, float, int]]:
+        """(path, mtime, size) of every materialized derived dataset of the user."""
+        user_processed_dir = os.path.join(PROCESSED_DIR, user_id)
+        if not os.path.isdir(user_processed_dir):
+            return []
+        files = []
+        for filename in os.listdir(user_processed_dir):
+            file_id = filename[:-len(MATERIALIZED_SUFFIX)]
+            # Only copies of derived datasets; converted Excel sheets are the data itself
+            if filename.endswith(MATERIALIZED_SUFFIX) and \
+                    os.path.exists(self._user_processed_path(file_id, user_id, MANIFEST_SUFFIX)):
+                path = os.path.join(user_processed_dir, filename)
+                stat = os.stat(path)
+                files.append((path, stat.st_mtime, stat.st_size))
+        return files
+
+    def get_root_id(self, file_id: str, user_id: str) -> str:
+        """The uploaded dataset a (possibly derived) dataset descends from."""
+        manifest = self.get_manifest(file_id, user_id)
+        if manifest is None:
+            return file_id
+        return manifest.get("root") or self.get_root_id(manifest["parent"], user_id)
+
+    def materialize(self, file_id: str, user_id: str) -> str:
+        """Writes a derived dataset to parquet so later loads skip replaying its operations."""
+        if self.get_manifest(file_id, user_id) is None:
+            raise FileNotFoundError(f"File ID {file_id} is not a derived dataset.")
+
         df = self.load_dataset(file_id, user_id)
-        preview_rows = max(1, min(int(preview_rows or 5), 100))
-        
-        import numpy as np
-        preview_df = df.head(preview_rows).copy()
+        path = self._user_processed_path(file_id, user_id, MATERIALIZED_SUFFIX)
+        write_parquet(df, path)
+        return path
+
+    def get_dataset_version(self, file_id: str, user_id: str) -> str:
+        """
+        Cheap fingerprint of the data currently behind file_id (no parsing).
+        Changes whenever the backing file is replaced, so derived caches can key on it.
+        For derived datasets it combines the parent's version with the manifest.
+        """
+        manifest_path = self._user_processed_path(file_id, user_id, MANIFEST_SUFFIX)
+        if os.path.exists(manifest_path):
+            manifest = self.get_manifest(file_id, user_id)
+            parent_version = self.get_dataset_version(manifest["parent"], user_id)
+            stat = os.stat(manifest_path)
+            key = f"{parent_version}:{stat.st_mtime_ns:x}-{stat.st_size:x}"
+            return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+        stat = os.stat(self.resolve_path(file_id, user_id))
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+    def get_metadata(
+        self,
+        file_id: str,
+        user_id: str,
+        preview_rows: int = PREVIEW_ROWS,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> DatasetMetadata:
+        """
+        Shape, dtypes and a page of rows (`limit` rows from `offset`, or the first
+        `preview_rows`) without loading the whole dataset: parquet files are read from
+        their footer and the overlapping row groups, CSV files from a bounded prefix and
+        the row index recorded at upload. Frames that are already cached, and derived
+        datasets that are not materialized, are served from the loaded frame.
+        """
+        if limit:
+            limit = max(1, min(int(limit), MAX_PAGE_ROWS))
+        else:
+            limit = max(1, min(int(preview_rows or PREVIEW_ROWS), MAX_PREVIEW_ROWS))
+        offset = max(0, int(offset or 0))
+
+        version = self.get_dataset_version(file_id, user_id)
+        df = _frame_cache.get(user_id, file_id, version)
+        path = None
+        if df is None:
+            if self.get_manifest(file_id, user_id) is None:
+                path = self.resolve_path(file_id, user_id)
+            elif self.is_materialized(file_id, user_id):
+                path = self._user_processed_path(file_id, user_id, MATERIALIZED_SUFFIX)
+
+        if path is not None and path.endswith('.parquet') and pq is not None:
+            rows, dtypes, page = self._parquet_page(path, offset, limit)
+        elif path is not None and path.endswith('.csv'):
+            rows, dtypes, page = self._csv_page(path, file_id, user_id, version, offset, limit)
+        else:
+            if df is None:
+                df = self.load_dataset(file_id, user_id)
+            rows, dtypes, page = len(df), df.dtypes, df.iloc[offset:offset + limit]
+
+        preview_df = page.copy()
         preview_df.replace([np.inf, -np.inf], np.nan, inplace=True)
         preview_df = preview_df.where(pd.notnull(preview_df), None)
         
         preview = preview_df.to_dict(orient='records')
         
+        catalog = self.get_sheets(file_id, user_id)
+        sheets = catalog["sheets"] if catalog else None
+        root_id = self.get_root_id(file_id, user_id)
+        sheet_name = next((sheet["name"] for sheet in sheets or [] if sheet["file_id"] == root_id), None)
+
         return DatasetMetadata(
             file_id=file_id,
             filename=file_id, 
-            rows=len(df),
-            columns=len(df.columns),
-            column_names=df.columns.tolist(),
-            dtypes={k: str(v) for k, v in df.dtypes.items()},
-            preview=preview
+            rows=rows,
+            columns=len(dtypes),
+            column_names=dtypes.index.tolist(),
+            dtypes={k: str(v) for k, v in dtypes.items()},
+            preview=preview,
+            preview_offset=offset,
+            sheets=sheets,
+            sheet_name=sheet_name
         )
+
+    def _parquet_page(self, path: str, offset: int, limit: int) -> Tuple[int, pd.Series, pd.DataFrame]:
+        parquet_file = pq.ParquetFile(path)
+        rows = parquet_file.metadata.num_rows
+        dtypes = parquet_file.schema_arrow.empty_table().to_pandas().dtypes
+
+        # Only the row groups overlapping [offset, offset + limit)
+        groups, first_row, start = [], None, 0
+        for index in range(parquet_file.num_row_groups):
+            end = start + parquet_file.metadata.row_group(index).num_rows
+            if end > offset and start < offset + limit:
+                groups.append(index)
+                first_row = start if first_row is None else first_row
+            start = end
+
+        if not groups:
+            return rows, dtypes, parquet_file.schema_arrow.empty_table().to_pandas()
+        page = parquet_file.read_row_groups(groups).to_pandas()
+        skip = offset - first_row
+        return rows, dtypes, page.iloc[skip:skip + limit]
+
+    def _csv_page(
+        self, path: str, file_id: str, user_id: str, version: str, offset: int, limit: int
+    ) -> Tuple[int, pd.Series, pd.DataFrame]:
+        dialect = sniff_csv(path)
+        # Recorded by the first full parse; until then dtypes come from the leading rows
+        hints = _version_cache.get_dtype_hints(user_id, file_id, version)
+        head = read_csv_rows(path, 0, PREVIEW_SAMPLE_ROWS, hints, dialect=dialect)
+        if len(head) < PREVIEW_SAMPLE_ROWS:
+            # The whole file fit in the sample
+            return len(head), head.dtypes, head.iloc[offset:offset + limit]
+
+        row_index = _version_cache.get_row_index(user_id, file_id, version)
+        if row_index is None:
+            # Uploaded before rows were counted at upload: one sequential scan, no parsing
+            row_index = index_csv_rows(path)
+            _version_cache.put_row_index(user_id, file_id, version, row_index)
+        profile = _version_cache.get_profile(user_id, file_id, version)
+        rows = profile["num_rows"] if profile else row_index["rows"]
+
+        if offset + limit <= len(head):
+            page = head.iloc[offset:offset + limit]
+        else:
+            page = read_csv_rows(path, offset, limit, hints, row_index=row_index, dialect=dialect)
+        return rows, head.dtypes, page
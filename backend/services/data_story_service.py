@@ -1,8 +1,12 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, AsyncIterator, Tuple
+from starlette.concurrency import run_in_threadpool
 from services.data_ingestion import DataIngestionService
 from services.dashboard_service import DashboardService
+from services.dashboard_cache import DashboardCache
 from datetime import datetime
 
+NOT_ENOUGH_INSIGHTS_STORY = "There are not enough insights available to generate a meaningful data story."
+
 
 class DataStoryService:
     """
@@ -13,12 +17,16 @@ class DataStoryService:
     2. Gather existing KPIs and chart information
     3. Build safe, high-level LLM context (no raw data rows)
     4. Return a structured narrative story
+
+    Dashboards and dataset contexts persisted by the overview are reused, so a
+    story for an already-viewed dashboard costs one LLM call and no dataset scans.
     """
 
     def __init__(self, llm_client):
         self.llm_client = llm_client
         self.ingestion = DataIngestionService()
         self.dashboard = DashboardService()
+        self.cache = DashboardCache()
 
     async def generate_story(
         self,
@@ -27,30 +35,16 @@ class DataStoryService:
         dashboard_data: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         try:
-            dataset_context = self._build_dataset_context(file_id, user_id)
-
-            if dashboard_data is None:
-                dashboard_data = self.dashboard.generate_fallback_dashboard(file_id, user_id)
-
-            kpis_context = self._build_kpis_context(dashboard_data.get("kpis", []))
-            charts_context = self._build_charts_context(
-                dashboard_data.get("trends", []),
-                dashboard_data.get("distributions", [])
-            )
+            # Loads the dataset or builds a fallback dashboard on a cache miss: keep it off the event loop
+            story_context = await run_in_threadpool(self._build_story_context, file_id, user_id, dashboard_data)
 
             # Hard stop: nothing meaningful to explain
-            if kpis_context == "No KPIs available." and charts_context == "No charts available.":
+            if story_context is None:
                 return {
-                    "story": "There are not enough insights available to generate a meaningful data story.",
+                    "story": NOT_ENOUGH_INSIGHTS_STORY,
                     "generated_at": self._get_timestamp()
                 }
 
-            story_context = {
-                "dataset_context": dataset_context,
-                "kpis_context": kpis_context,
-                "charts_context": charts_context
-            }
-
             result = await self.llm_client.get_data_story(story_context)
 
             if not isinstance(result, dict) or "error" in result:
@@ -64,43 +58,119 @@ class DataStoryService:
         except Exception as e:
             return {"error": f"Failed to generate data story: {str(e)}"}
 
-    def _build_dataset_context(self, file_id: str, user_id: str) -> str:
+    async def stream_story(
+        self,
+        file_id: str,
+        user_id: str,
+        dashboard_data: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streaming variant of generate_story.
+
+        Yields (event, payload) tuples: a "progress" event once the LLM context is
+        ready, one "token" event per text delta, then a final "done" event carrying
+        the full story. LLM errors are raised so the caller can fall back or report.
+        """
+        story_context = await run_in_threadpool(self._build_story_context, file_id, user_id, dashboard_data)
+        yield "progress", {"stage": "context_ready"}
+
+        if story_context is None:
+            yield "done", {"story": NOT_ENOUGH_INSIGHTS_STORY, "generated_at": self._get_timestamp()}
+            return
+
+        parts = []
+        async for text in self.llm_client.stream_data_story(story_context):
+            parts.append(text)
+            yield "token", {"text": text}
+
+        story = "".join(parts).strip() or "Unable to generate story."
+        yield "done", {"story": story, "generated_at": self._get_timestamp()}
+
+    def _build_story_context(
+        self,
+        file_id: str,
+        user_id: str,
+        dashboard_data: Optional[Dict[str, Any]]
+    ) -> Optional[Dict[str, str]]:
+        """Returns the LLM story context, or None when there is nothing meaningful to explain."""
+        dataset_context = self._build_dataset_context(file_id, user_id)
+
+        if dashboard_data is None:
+            dashboard_data = self.get_cached_dashboard(file_id, user_id)
+        if dashboard_data is None:
+            dashboard_data = self.dashboard.generate_fallback_dashboard(file_id, user_id)
+
+        kpis_context = self._build_kpis_context(dashboard_data.get("kpis", []))
+        charts_context = self._build_charts_context(
+            dashboard_data.get("trends", []),
+            dashboard_data.get("distributions", [])
+        )
+
+        if kpis_context == "No KPIs available." and charts_context == "No charts available.":
+            return None
+
+        return {
+            "dataset_context": dataset_context,
+            "kpis_context": kpis_context,
+            "charts_context": charts_context
+        }
+
+    def get_cached_dashboard(self, file_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """The dashboard most recently built by the overview for the current dataset version."""
+        version = self.ingestion.get_dataset_version(file_id, user_id)
+        return self.cache.get_latest(user_id, file_id, version)
+
+    def warm_dataset_context(self, file_id: str, user_id: str, df) -> None:
+        """Precomputes and persists the dataset context from an already loaded frame."""
+        self._build_dataset_context(file_id, user_id, df)
+
+    def _build_dataset_context(self, file_id: str, user_id: str, df=None) -> str:
         try:
-            df = self.ingestion.load_dataset(file_id, user_id)
-
-            row_count = len(df)
-            col_count = len(df.columns)
-            columns = list(df.columns)
-
-            numeric_cols = df.select_dtypes(include=["number"]).columns.tolist()
-            categorical_cols = df.select_dtypes(include=["object", "category"]).columns.tolist()
-
-            date_cols = [c for c in df.columns if "date" in c.lower() or "time" in c.lower()]
-            date_range_str = ""
-
-            if date_cols:
-                try:
-                    import pandas as pd
-                    dates = pd.to_datetime(df[date_cols[0]], errors="coerce")
-                    if dates.notna().any():
-                        date_range_str = (
-                            f" The data spans from {dates.min().date()} to {dates.max().date()}."
-                        )
-                except Exception:
-                    pass
-
-            return (
-                f"The dataset contains {row_count:,} rows and {col_count} columns. "
-                f"Key columns include {', '.join(columns[:8])}"
-                f"{' and others' if len(columns) > 8 else ''}. "
-                f"Numeric fields include {', '.join(numeric_cols[:5]) or 'none'}, "
-                f"while categorical fields include {', '.join(categorical_cols[:5]) or 'none'}."
-                f"{date_range_str}"
-            )
+            version = self.ingestion.get_dataset_version(file_id, user_id)
+            cached = self.cache.get_dataset_context(user_id, file_id, version)
+            if cached is not None:
+                return cached
+
+            if df is None:
+                df = self.ingestion.load_dataset(file_id, user_id)
+            dataset_context = self._describe_dataset(df)
+            self.cache.put_dataset_context(user_id, file_id, version, dataset_context)
+            return dataset_context
 
         except Exception as e:
             return f"Dataset summary unavailable due to an error: {str(e)}."
 
+    def _describe_dataset(self, df) -> str:
+        row_count = len(df)
+        col_count = len(df.columns)
+        columns = list(df.columns)
+
+        numeric_cols = df.select_dtypes(include=["number"]).columns.tolist()
+        categorical_cols = df.select_dtypes(include=["object", "category"]).columns.tolist()
+
+        date_cols = [c for c in df.columns if "date" in c.lower() or "time" in c.lower()]
+        date_range_str = ""
+
+        if date_cols:
+            try:
+                import pandas as pd
+                dates = pd.to_datetime(df[date_cols[0]], errors="coerce")
+                if dates.notna().any():
+                    date_range_str = (
+                        f" The data spans from {dates.min().date()} to {dates.max().date()}."
+                    )
+            except Exception:
+                pass
+
+        return (
+            f"The dataset contains {row_count:,} rows and {col_count} columns. "
+            f"Key columns include {', '.join(columns[:8])}"
+            f"{' and others' if len(columns) > 8 else ''}. "
+            f"Numeric fields include {', '.join(numeric_cols[:5]) or 'none'}, "
+            f"while categorical fields include {', '.join(categorical_cols[:5]) or 'none'}."
+            f"{date_range_str}"
+        )
+
     def _build_kpis_context(self, kpis: list) -> str:
         if not kpis:
             return "No KPIs available."
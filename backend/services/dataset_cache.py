@@ -0,0 +1,62 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+import pandas as pd
+
+
+class DatasetCache:
+    """
+    Thread-safe LRU cache of parsed DataFrames keyed by (user_id, file_id, version).
+
+    Storing a new version of a dataset drops the older ones. Entries are evicted
+    least-recently-used first once the estimated in-memory size exceeds `max_bytes`.
+    Cached frames are shared between requests and must not be mutated in place.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, pd.DataFrame, int]]" = OrderedDict()
+        self._total_bytes = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def get(self, user_id: str, file_id: str, version: str) -> Optional[pd.DataFrame]:
+        key = (user_id, file_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, user_id: str, file_id: str, version: str, df: pd.DataFrame):
+        size = self._estimate_bytes(df)
+        if size > self.max_bytes:
+            return
+
+        key = (user_id, file_id)
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (version, df, size)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes and self._entries:
+                self._pop(next(iter(self._entries)))
+
+    def invalidate(self, user_id: str, file_id: str):
+        with self._lock:
+            self._pop((user_id, file_id))
+
+    def _pop(self, key: Tuple[str, str]):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[2]
+
+    def _estimate_bytes(self, df: pd.DataFrame) -> int:
+        # Shallow size plus a flat per-cell allowance for Python objects (strings);
+        # deep=True would walk every string and cost as much as the load itself.
+        shallow = int(df.memory_usage(index=True, deep=False).sum())
+        object_cells = sum(len(df) for dtype in df.dtypes if dtype == object)
+        return shallow + object_cells * 50
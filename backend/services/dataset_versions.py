@@ -0,0 +1,141 @@
+import os
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import pandas as pd
+from schemas import DatasetVersion, DatasetVersionSummary, DatasetComparison
+from services.data_ingestion import DataIngestionService
+from services.dashboard_cache import DashboardCache
+from services.data_health import compute_data_health
+from config import DATASET_STORAGE_MB, DATA_HEALTH_CHUNK_ROWS
+
+
+class DatasetVersionService:
+    """
+    Lineage of cleaned datasets. Every cleaning run creates an immutable version
+    "<root>_v<n>" that records its parent and operations (see DataIngestionService),
+    so earlier versions stay loadable and cheap: only the operation list is stored.
+    """
+
+    def __init__(self, ingestion: Optional[DataIngestionService] = None):
+        self.ingestion = ingestion or DataIngestionService()
+        self.dashboards = DashboardCache()
+
+    def create_version(self, parent_id: str, operations: List[Dict[str, Any]], user_id: str) -> str:
+        """Records a new version of parent_id's lineage and returns its file_id."""
+        root_id = self.ingestion.get_root_id(parent_id, user_id)
+        number = self._latest_version_number(root_id, user_id) + 1
+        while True:
+            file_id = f"{root_id}_v{number}"
+            try:
+                self.ingestion.save_derived_dataset(file_id, parent_id, operations, user_id)
+                return file_id
+            except FileExistsError:
+                # Another cleaning run took this number first
+                number += 1
+
+    def materialize(self, file_id: str, user_id: str):
+        self.ingestion.materialize(file_id, user_id)
+        self.collect_garbage(user_id)
+
+    def list_versions(self, file_id: str, user_id: str) -> List[DatasetVersion]:
+        """All versions in file_id's lineage, oldest first, starting with the uploaded dataset."""
+        root_id = self.ingestion.get_root_id(file_id, user_id)
+        root_path = self.ingestion.resolve_path(root_id, user_id)
+        versions = [DatasetVersion(
+            file_id=root_id,
+            created_at=datetime.fromtimestamp(os.path.getmtime(root_path)).isoformat()
+        )]
+
+        derived = [
+            manifest for manifest in self.ingestion.list_derived_datasets(user_id)
+            if (manifest.get("root") or self.ingestion.get_root_id(manifest["file_id"], user_id)) == root_id
+        ]
+        for manifest in sorted(derived, key=lambda m: m.get("created_at") or ""):
+            versions.append(DatasetVersion(
+                file_id=manifest["file_id"],
+                parent=manifest["parent"],
+                operations=manifest.get("operations", []),
+                created_at=manifest.get("created_at"),
+                materialized=self.ingestion.is_materialized(manifest["file_id"], user_id)
+            ))
+        return versions
+
+    def compare(self, base_id: str, other_id: str, user_id: str) -> DatasetComparison:
+        """Before/after view of two versions (typically a dataset and one of its cleaned versions)."""
+        base = self._summarize(base_id, self.ingestion.load_dataset(base_id, user_id))
+        other = self._summarize(other_id, self.ingestion.load_dataset(other_id, user_id))
+
+        return DatasetComparison(
+            base=base,
+            other=other,
+            rows_removed=base.rows - other.rows,
+            columns_added=[c for c in other.column_names if c not in base.column_names],
+            columns_removed=[c for c in base.column_names if c not in other.column_names],
+            null_changes={
+                col: other.null_counts[col] - base.null_counts[col]
+                for col in other.column_names if col in base.null_counts
+            },
+            operations=self._operations_between(base_id, other_id, user_id)
+        )
+
+    def collect_garbage(self, user_id: str) -> int:
+        """
+        Keeps a user's derived data within DATASET_STORAGE_MB and returns the bytes freed.
+
+        Cached dashboards of dataset versions that are no longer current are always
+        removed. Materialized versions are then removed oldest first until usage fits
+        the budget; their manifests stay, so they are derived on load again.
+        """
+        freed = 0
+        for file_id in self.dashboards.file_ids(user_id):
+            try:
+                current_version = self.ingestion.get_dataset_version(file_id, user_id)
+            except FileNotFoundError:
+                current_version = None
+            freed += self.dashboards.prune(user_id, file_id, keep_version=current_version)
+
+        materialized = self.ingestion.list_materialized(user_id)
+        usage = sum(size for _, _, size in materialized) + self.dashboards.size(user_id)
+        budget = DATASET_STORAGE_MB * 1024 * 1024
+        for path, _, size in sorted(materialized, key=lambda entry: entry[1]):
+            if usage <= budget:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            usage -= size
+            freed += size
+        return freed
+
+    def _latest_version_number(self, root_id: str, user_id: str) -> int:
+        pattern = re.compile(rf"^{re.escape(root_id)}_v(\d+)$")
+        numbers = [
+            int(match.group(1))
+            for manifest in self.ingestion.list_derived_datasets(user_id)
+            for match in [pattern.match(manifest.get("file_id", ""))] if match
+        ]
+        return max(numbers, default=0)
+
+    def _operations_between(self, base_id: str, other_id: str, user_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Operations turning base_id into other_id, or None if other_id does not descend from base_id."""
+        chain = []
+        file_id = other_id
+        while file_id != base_id:
+            manifest = self.ingestion.get_manifest(file_id, user_id)
+            if manifest is None:
+                return None
+            chain.append(manifest.get("operations", []))
+            file_id = manifest["parent"]
+        return [op for operations in reversed(chain) for op in operations]
+
+    def _summarize(self, file_id: str, df: pd.DataFrame) -> DatasetVersionSummary:
+        health = compute_data_health(df, chunk_rows=DATA_HEALTH_CHUNK_ROWS)
+        return DatasetVersionSummary(
+            file_id=file_id,
+            rows=health["total_rows"],
+            column_names=[str(c) for c in df.columns],
+            duplicate_rows=health["duplicate_rows"],
+            null_counts={str(col): count for col, count in health["null_counts"].items()}
+        )
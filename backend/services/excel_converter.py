@@ -0,0 +1,87 @@
+import json
+import os
+import uuid
+from typing import Any, Dict, List, Optional
+import pandas as pd
+
+try:
+    from pyarrow import ArrowException
+except ImportError:
+    ArrowException = ValueError
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xls')
+# Small row groups let previews read a page without decoding the whole file
+PARQUET_ROW_GROUP_ROWS = 65536
+CATALOG_SUFFIX = ".sheets.json"
+
+
+def sheet_file_id(workbook_id: str, index: int) -> str:
+    """Dataset id of a sheet: the first sheet keeps the upload's id, the others get "_sheet<n>"."""
+    return workbook_id if index == 0 else f"{workbook_id}_sheet{index + 1}"
+
+
+def convert_workbook(path: str, workbook_id: str, out_dir: str) -> List[Dict[str, Any]]:
+    """
+    Converts every sheet of a workbook to <sheet_file_id>.parquet in out_dir, opening
+    the workbook once (pandas' openpyxl reader streams .xlsx in read-only mode), and
+    writes the sheet catalog next to them. Returns the catalog.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    sheets = []
+    with pd.ExcelFile(path) as workbook:
+        for index, name in enumerate(workbook.sheet_names):
+            # One sheet in memory at a time
+            df = workbook.parse(name)
+            sheet_id = sheet_file_id(workbook_id, index)
+            write_parquet(df, os.path.join(out_dir, f"{sheet_id}.parquet"))
+            sheets.append({
+                "name": str(name),
+                "file_id": sheet_id,
+                "rows": len(df),
+                "columns": len(df.columns)
+            })
+
+    _write_json(os.path.join(out_dir, f"{workbook_id}{CATALOG_SUFFIX}"), {"workbook_id": workbook_id, "sheets": sheets})
+    return sheets
+
+
+def load_catalog(out_dir: str, workbook_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(out_dir, f"{workbook_id}{CATALOG_SUFFIX}"), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_parquet(df: pd.DataFrame, path: str):
+    """Atomically writes df as parquet (column names become strings, as parquet requires)."""
+    df = df.rename(columns=str) if not all(isinstance(c, str) for c in df.columns) else df
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        try:
+            df.to_parquet(tmp_path, index=False, row_group_size=PARQUET_ROW_GROUP_ROWS)
+        except (ArrowException, TypeError, ValueError):
+            # Columns mixing numbers and text (common in spreadsheets) have no parquet type
+            df = df.copy(deep=False)
+            for col in _mixed_object_columns(df):
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+            df.to_parquet(tmp_path, index=False, row_group_size=PARQUET_ROW_GROUP_ROWS)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _mixed_object_columns(df: pd.DataFrame) -> List[str]:
+    columns = []
+    for col, values in df.items():
+        if values.dtype == object and values.dropna().map(type).nunique() > 1:
+            columns.append(col)
+    return columns
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,281 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# A handler receives (file_id, user_id, params) and returns a JSON-serialisable result.
+JobHandler = Callable[[str, str, Dict[str, Any]], Awaitable[Any]]
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs (user_id, file_id, kind, status);
+CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at);
+"""
+
+
+class JobQueue:
+    """
+    In-process asyncio job runner with a persistent SQLite job table.
+
+    - Identical in-flight jobs (same user, file_id and kind) are deduplicated:
+      submitting again returns the queued/running job instead of starting new work.
+    - At most `max_concurrency` jobs run at once, and at most `per_user_limit` per user;
+      the rest wait in FIFO order.
+    - Results are stored in the job row so later polls never recompute them.
+    - Jobs left queued or running by a previous process are re-queued on start().
+    - Finished jobs (and their results) are deleted `retention_seconds` after they
+      finish; expired rows are purged on start() and on each submit().
+    """
+
+    def __init__(self, db_path: str, max_concurrency: int = 4, per_user_limit: int = 2,
+                 retention_seconds: float = 24 * 3600):
+        self.db_path = str(db_path)
+        self.max_concurrency = max(1, max_concurrency)
+        self.per_user_limit = max(1, per_user_limit)
+        self.retention_seconds = retention_seconds
+
+        self._handlers: Dict[str, JobHandler] = {}
+        self._pending: Deque[str] = deque()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._running_by_user: Dict[str, int] = {}
+        self._db_lock = threading.Lock()
+        self._started = False
+
+        with self._db_lock, self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def register(self, kind: str, handler: JobHandler):
+        self._handlers[kind] = handler
+
+    @property
+    def kinds(self) -> List[str]:
+        return list(self._handlers)
+
+    async def start(self):
+        """Re-queues unfinished jobs from a previous run and starts dispatching."""
+        if self._started:
+            return
+        self._started = True
+
+        self.purge_expired()
+        with self._db_lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT job_id FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                ACTIVE_STATUSES
+            ).fetchall()
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?",
+                (QUEUED, RUNNING)
+            )
+        self._pending.extend(row["job_id"] for row in rows)
+        self._dispatch()
+
+    async def stop(self):
+        """Cancels running tasks. Their rows stay active so the next start() picks them up."""
+        self._started = False
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._running_by_user.clear()
+
+    async def submit(self, user_id: str, kind: str, file_id: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        self.purge_expired()
+        with self._db_lock, self._connect() as conn:
+            existing = conn.execute(
+                "SELECT * FROM jobs WHERE user_id = ? AND file_id = ? AND kind = ? AND status IN (?, ?) "
+                "ORDER BY created_at DESC LIMIT 1",
+                (user_id, file_id, kind, *ACTIVE_STATUSES)
+            ).fetchone()
+            if existing:
+                return self._row_to_job(existing)
+
+            job_id = str(uuid.uuid4())
+            conn.execute(
+                "INSERT INTO jobs (job_id, user_id, kind, file_id, params, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, user_id, kind, file_id, json.dumps(params or {}), QUEUED, self._now())
+            )
+
+        self._pending.append(job_id)
+        self._dispatch()
+        return self.get(job_id, user_id)
+
+    def get(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        row = self._fetch(job_id, user_id)
+        return self._row_to_job(row) if row else None
+
+    def get_result(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the job including its decoded result, or None if the job does not exist."""
+        row = self._fetch(job_id, user_id)
+        if not row:
+            return None
+        job = self._row_to_job(row)
+        job["result"] = json.loads(row["result"]) if row["result"] is not None else None
+        return job
+
+    async def cancel(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Cancels a queued or running job. Finished jobs are returned unchanged."""
+        row = self._fetch(job_id, user_id)
+        if not row:
+            return None
+
+        if row["status"] in ACTIVE_STATUSES:
+            try:
+                self._pending.remove(job_id)
+            except ValueError:
+                pass
+
+            task = self._tasks.get(job_id)
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+            # The job may have finished while we were cancelling it
+            current = self._fetch(job_id)
+            if current and current["status"] in ACTIVE_STATUSES:
+                self._finish(job_id, CANCELLED, error="Cancelled by user")
+
+        return self.get(job_id, user_id)
+
+    def purge_expired(self) -> int:
+        """Deletes jobs that finished more than `retention_seconds` ago. Returns how many."""
+        cutoff = (datetime.now() - timedelta(seconds=self.retention_seconds)).isoformat()
+        with self._db_lock, self._connect() as conn:
+            deleted = conn.execute(
+                "DELETE FROM jobs WHERE finished_at < ? AND status IN (?, ?, ?)",
+                (cutoff, *FINISHED_STATUSES)
+            ).rowcount
+        if deleted:
+            logger.info("Purged %d expired jobs", deleted)
+        return deleted
+
+    # -- scheduling ---------------------------------------------------------
+
+    def _dispatch(self):
+        """Starts as many pending jobs as the global and per-user limits allow."""
+        if not self._started:
+            return
+
+        deferred: Deque[str] = deque()
+        while self._pending and len(self._tasks) < self.max_concurrency:
+            job_id = self._pending.popleft()
+            row = self._fetch(job_id)
+            if not row or row["status"] != QUEUED:
+                continue
+
+            user_id = row["user_id"]
+            if self._running_by_user.get(user_id, 0) >= self.per_user_limit:
+                deferred.append(job_id)
+                continue
+
+            self._running_by_user[user_id] = self._running_by_user.get(user_id, 0) + 1
+            self._update(job_id, status=RUNNING, started_at=self._now())
+            self._tasks[job_id] = asyncio.create_task(self._run(job_id, row))
+
+        # Keep FIFO order for jobs that were skipped because their user was at the limit
+        self._pending.extendleft(reversed(deferred))
+
+    async def _run(self, job_id: str, row: sqlite3.Row):
+        user_id = row["user_id"]
+        try:
+            handler = self._handlers[row["kind"]]
+            result = await handler(row["file_id"], user_id, json.loads(row["params"]))
+            self._finish(job_id, SUCCEEDED, result=result)
+        except asyncio.CancelledError:
+            # cancel() records the terminal state; stop() leaves the row for re-queueing
+            pass
+        except Exception as e:
+            logger.exception("Job %s (%s) failed: %s", job_id, row["kind"], e)
+            self._finish(job_id, FAILED, error=str(e))
+        finally:
+            self._tasks.pop(job_id, None)
+            remaining = self._running_by_user.get(user_id, 1) - 1
+            if remaining > 0:
+                self._running_by_user[user_id] = remaining
+            else:
+                self._running_by_user.pop(user_id, None)
+            self._dispatch()
+
+    # -- persistence --------------------------------------------------------
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """A connection whose statements commit together, closed when the block exits."""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _fetch(self, job_id: str, user_id: Optional[str] = None) -> Optional[sqlite3.Row]:
+        with self._db_lock, self._connect() as conn:
+            if user_id is None:
+                return conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            return conn.execute(
+                "SELECT * FROM jobs WHERE job_id = ? AND user_id = ?", (job_id, user_id)
+            ).fetchone()
+
+    def _update(self, job_id: str, **fields):
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        with self._db_lock, self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None):
+        self._update(
+            job_id,
+            status=status,
+            result=json.dumps(result, default=str) if result is not None else None,
+            error=error,
+            finished_at=self._now()
+        )
+
+    def _row_to_job(self, row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "job_id": row["job_id"],
+            "kind": row["kind"],
+            "file_id": row["file_id"],
+            "status": row["status"],
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+
+    def _now(self) -> str:
+        return datetime.now().isoformat()
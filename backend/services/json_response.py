@@ -0,0 +1,76 @@
+import json
+import math
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from services.request_profiling import phase
+
+try:
+    import orjson
+except ImportError:  # stdlib json through FastAPI's encoder
+    orjson = None
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    """Types orjson does not encode natively."""
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, (pd.Timestamp, datetime, date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, pd.DataFrame):
+        return value.to_dict(orient="records")
+    if isinstance(value, (pd.Series, pd.Index)):
+        return value.tolist()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    JSON bytes of content. NaN and infinity become null (JSON has no such numbers),
+    NumPy arrays and scalars, pandas timestamps and Pydantic models are encoded
+    directly, without a jsonable_encoder pass.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+    return json.dumps(to_jsonable(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def to_jsonable(content: Any) -> Any:
+    """content as plain JSON types (dicts, lists, str, numbers, None)."""
+    if orjson is not None:
+        return orjson.loads(dumps(content))
+    return _finite(jsonable_encoder(content, custom_encoder={np.generic: lambda v: v.item()}))
+
+
+def _finite(value: Any) -> Any:
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_finite(item) for item in value]
+    return value
+
+
+class FastJSONResponse(JSONResponse):
+    """Default response class of the API: see dumps()."""
+
+    def render(self, content: Any) -> bytes:
+        with phase("response.encode_json"):
+            return dumps(content)
@@ -0,0 +1,144 @@
+import asyncio
+import time
+from typing import Optional
+from prometheus_client import Counter, Gauge, Histogram
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Metrics are registered in prometheus_client's default registry, served by GET /metrics
+
+# Seconds; fine at the low end for cache hits and small frames, up to a minute for large loads and LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LLM_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+
+# Methods labelled as themselves; anything else a client sends is "other"
+HTTP_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+
+# --- HTTP ---
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being handled")
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request duration (until the response body is sent)",
+    ["method", "route", "status"], buckets=DEFAULT_BUCKETS
+)
+
+# --- Ingestion ---
+DATASET_LOAD_SECONDS = Histogram(
+    "dataset_load_seconds", "Time to read and parse a dataset on a cache miss", ["format"], buckets=DEFAULT_BUCKETS
+)
+DATASET_LOAD_BYTES = Counter(
+    "dataset_load_bytes_total", "Bytes read from disk by dataset loads", ["format"]
+)
+DATASET_CACHE_BYTES = Gauge("dataset_cache_bytes", "Estimated size of the parsed datasets kept in memory")
+
+# --- Analytics ---
+PLAN_EXECUTION_SECONDS = Histogram(
+    "analytics_plan_execution_seconds", "Time to execute an analytics plan over a loaded dataset", ["query_type"],
+    buckets=DEFAULT_BUCKETS
+)
+PLAN_QUERY_TYPES = ("metadata", "aggregation", "timeseries", "filter")
+
+# --- Caches (hit ratio = hits / all lookups) ---
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Cache lookups by cache and result (hit or miss)", ["cache", "result"])
+
+# --- LLM ---
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_seconds", "LLM request latency (streams: until the last token)",
+    ["provider", "model", "call", "outcome"], buckets=LLM_BUCKETS
+)
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens used by LLM requests, as reported by the provider", ["provider", "model", "kind"])
+LLM_RETRIES = Counter("llm_retries_total", "LLM requests retried after a failed attempt", ["provider", "model", "reason"])
+LLM_FALLBACKS = Counter(
+    "llm_fallbacks_total", "Requests moved to another model or provider after a failure",
+    ["provider", "model", "fallback_provider", "fallback_model"]
+)
+
+# --- Reports ---
+REPORT_STORE_SECONDS = Histogram(
+    "report_store_seconds", "Report store operation latency", ["store", "operation"], buckets=DEFAULT_BUCKETS
+)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def plan_query_type(plan: dict) -> str:
+    """query_type label of a plan; unknown types share one label so clients can't add series."""
+    query_type = plan.get("query_type", "metadata")
+    return query_type if query_type in PLAN_QUERY_TYPES else "unknown"
+
+
+class LlmCall:
+    """
+    Times one LLM request (use as a context manager around the provider call).
+    Token counts passed to usage() are recorded when the block exits; the outcome
+    is "ok", "error" if the block raised, or "cancelled" if the caller went away.
+    """
+
+    def __init__(self, provider: str, model: str, call: str = "generate"):
+        self.provider = provider
+        self.model = model
+        self.call = call
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+
+    def usage(self, prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            outcome = "ok"
+        elif issubclass(exc_type, (GeneratorExit, asyncio.CancelledError)):
+            outcome = "cancelled"
+        else:
+            outcome = "error"
+        LLM_REQUEST_SECONDS.labels(self.provider, self.model, self.call, outcome).observe(time.perf_counter() - self._start)
+        for kind, tokens in (("prompt", self.prompt_tokens), ("completion", self.completion_tokens)):
+            if tokens:
+                LLM_TOKENS.labels(self.provider, self.model, kind).inc(tokens)
+        return False
+
+
+def _method(scope: Scope) -> str:
+    # Clients choose the method: unknown ones share a label so they can't add series
+    method = scope["method"]
+    return method if method in HTTP_METHODS else "other"
+
+
+def _route(scope: Scope) -> str:
+    # Set by the router on the (shared) scope; the template keeps ids out of the labels
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Counts requests in flight and times each request by method, route template and status."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            HTTP_REQUEST_SECONDS.labels(_method(scope), _route(scope), status).observe(time.perf_counter() - start)
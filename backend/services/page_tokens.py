@@ -0,0 +1,31 @@
+import base64
+import binascii
+import json
+import zlib
+from typing import Any, Dict
+
+
+def encode_page_token(file_id: str, version: str, plan: Dict[str, Any], offset: int) -> str:
+    """
+    Opaque cursor for the next page of a query result: the plan, the row offset and
+    the dataset version it was computed on, compressed into a URL-safe string.
+    """
+    payload = json.dumps(
+        {"file_id": file_id, "version": version, "plan": plan, "offset": offset},
+        separators=(",", ":"), default=str
+    )
+    return base64.urlsafe_b64encode(zlib.compress(payload.encode("utf-8"))).decode("ascii").rstrip("=")
+
+
+def decode_page_token(token: str) -> Dict[str, Any]:
+    """Inverse of encode_page_token. Raises ValueError for a malformed token."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(zlib.decompress(base64.urlsafe_b64decode(padded.encode("ascii"))))
+    except (binascii.Error, zlib.error, UnicodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid page token: {e}")
+
+    if not isinstance(data, dict) or not {"file_id", "version", "plan", "offset"} <= data.keys() \
+            or not isinstance(data["plan"], dict) or not isinstance(data["offset"], int) or data["offset"] < 0:
+        raise ValueError("Invalid page token")
+    return data
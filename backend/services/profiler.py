@@ -0,0 +1,161 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Any, Dict, Hashable, Optional
+import numpy as np
+import pandas as pd
+from services.data_ingestion import DataIngestionService
+from services.dashboard_cache import VersionCache
+from services.single_flight import SingleFlight
+from services.metrics import record_cache_lookup
+from services.sketches import HLL_PRECISION, HyperLogLog, TDigest
+from config import PROFILE_WORKERS
+
+TOP_K = 5
+
+# Frames smaller than this are profiled serially; thread start-up would dominate
+_PARALLEL_MIN_CELLS = 200_000
+
+_profile_flight = SingleFlight()
+
+
+def _to_python(value: Any) -> Any:
+    """JSON-friendly scalar, so fresh and cached profiles look the same."""
+    if isinstance(value, (pd.Timestamp, datetime, date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _column_kind(values: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(values):
+        return "boolean"
+    if pd.api.types.is_numeric_dtype(values):
+        return "numeric"
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return "datetime"
+    return "text"
+
+
+def _smallest(values: pd.Index) -> Any:
+    # Series.mode() returns its modes sorted, so ties resolve to the smallest value
+    try:
+        return min(values)
+    except TypeError:
+        return values[0]
+
+
+def column_sketches(kind: str, values: pd.Series, counts: pd.Series) -> Dict[str, Any]:
+    """
+    Mergeable sketches of a column: a HyperLogLog of its distinct values (from the
+    value counts, so each is hashed once) and, for numbers, a t-digest.
+    """
+    digest = None
+    if kind == "numeric" and len(counts):
+        digest = TDigest().add(values.to_numpy(dtype=np.float64, na_value=np.nan)).to_dict()
+    return {
+        "hll": HyperLogLog(precision=HLL_PRECISION).add(pd.Series(counts.index)).to_dict(),
+        "tdigest": digest,
+    }
+
+
+def profile_column(name: Hashable, values: pd.Series, top_k: int = TOP_K, sketches: bool = False) -> Dict[str, Any]:
+    """
+    Null count, dtype kind, distinct count, mode, top-k values and (numeric) median
+    of one column. A single value_counts() hash pass serves mode, top-k and distinct count,
+    and the column's sketches with sketches=True.
+    """
+    kind = _column_kind(values)
+    null_count = int(values.isna().sum())
+    profile = {
+        "name": _to_python(name),
+        "dtype": str(values.dtype),
+        "kind": kind,
+        "null_count": null_count,
+        "distinct_count": 0,
+        "mode": None,
+        "top_values": [],
+        "median": None,
+    }
+
+    try:
+        counts = values.value_counts(dropna=True)
+    except TypeError:
+        # Unhashable cells (lists, dicts): count their string form instead
+        counts = values.dropna().astype(str).value_counts()
+
+    if len(counts):
+        tied = counts.index[counts.to_numpy() == counts.iloc[0]]
+        profile["distinct_count"] = int(len(counts))
+        profile["mode"] = _to_python(_smallest(tied))
+        profile["top_values"] = [
+            {"value": _to_python(value), "count": int(count)}
+            for value, count in counts.head(top_k).items()
+        ]
+
+    if kind == "numeric" and null_count < len(values):
+        profile["median"] = _to_python(values.median())
+
+    if sketches:
+        profile["sketches"] = column_sketches(kind, values, counts)
+
+    return profile
+
+
+def profile_dataset(df: pd.DataFrame, max_workers: Optional[int] = None, sketches: bool = False) -> Dict[str, Any]:
+    """Profiles every column of df (with its sketches if asked), spreading the columns over a thread pool."""
+    max_workers = max_workers or PROFILE_WORKERS
+    items = list(df.items())
+
+    if max_workers > 1 and len(items) > 1 and df.size >= _PARALLEL_MIN_CELLS:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+            columns = list(pool.map(lambda item: profile_column(*item, sketches=sketches), items))
+    else:
+        columns = [profile_column(name, values, sketches=sketches) for name, values in items]
+
+    return {"num_rows": len(df), "columns": columns}
+
+
+class DatasetProfiler:
+    """
+    Column profiles per dataset version. Profiles are persisted with the other
+    derived entries of that version (see VersionCache), so they are computed once per
+    version and dropped together with its other derived data. The column sketches
+    computed in the same pass are stored beside the profile.
+    """
+
+    def __init__(self, ingestion: Optional[DataIngestionService] = None):
+        self.ingestion = ingestion or DataIngestionService()
+        self.cache = VersionCache()
+
+    def get_profile(self, file_id: str, user_id: str, df: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+        """Cached profile of file_id; pass the already loaded frame to skip a load on a miss."""
+        version = self.ingestion.get_dataset_version(file_id, user_id)
+        profile = self.cache.get_profile(user_id, file_id, version)
+        record_cache_lookup("profile", profile is not None)
+        if profile is None:
+            profile = _profile_flight.do(
+                (user_id, file_id, version), self._compute, file_id, user_id, version, df
+            )
+        return profile
+
+    def get_sketches(self, file_id: str, user_id: str) -> Optional[Dict[Hashable, Dict[str, Any]]]:
+        """Column name -> persisted sketches of the current version; None until it is profiled."""
+        version = self.ingestion.get_dataset_version(file_id, user_id)
+        entry = self.cache.get_sketches(user_id, file_id, version)
+        return {column["name"]: column for column in entry["columns"]} if entry else None
+
+    def _compute(self, file_id: str, user_id: str, version: str, df: Optional[pd.DataFrame]) -> Dict[str, Any]:
+        if df is None:
+            df = self.ingestion.load_dataset(file_id, user_id)
+        profile = profile_dataset(df, sketches=True)
+        # Sketches live in their own file; the profile stays small for its many readers
+        sketches = [{"name": column["name"], **column.pop("sketches")} for column in profile["columns"]]
+        self.cache.put_sketches(user_id, file_id, version, {"columns": sketches})
+        self.cache.put_profile(user_id, file_id, version, profile)
+        return profile
+
+
+def null_counts(profile: Dict[str, Any]) -> Dict[Any, int]:
+    return {column["name"]: column["null_count"] for column in profile["columns"]}
+
@@ -0,0 +1,138 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from services.analytics_engine import AnalyticsEngine
+from services.report_service import ReportService
+from services.report_store import ReportVersionConflict
+from services.single_flight import stable_hash
+
+logger = logging.getLogger(__name__)
+
+
+def _tile_data(tile: Dict[str, Any], plan: Dict[str, Any], execution: Dict[str, Any]) -> Optional[Any]:
+    """New data for a tile from its plan's execution, in the tile's shape; None on errors."""
+    if "error" in execution:
+        return None
+    result = execution.get("result")
+    if isinstance(result, dict) and "error" in result:
+        return None
+
+    if tile.get("type") == "kpi":
+        if not isinstance(result, dict):
+            return None
+        if plan.get("query_type") == "metadata":
+            value = result.get("row_count")
+        else:
+            # Same as DashboardService._resolve_metric: the first metric's value
+            value = next(iter(result.values()), 0)
+        data = tile.get("data") if isinstance(tile.get("data"), dict) else {"title": tile.get("title")}
+        return {**data, "value": value}
+    return result
+
+
+class ReportRefresher:
+    """
+    Re-executes the analytics DSL plans stored in report tiles (source.plan) against
+    the current version of their dataset. The stale tiles of each dataset run as one
+    batch (see AnalyticsEngine.execute_batch). A tile whose dataset version and plan
+    match its last refresh (source.input_hash) is left untouched.
+
+    Plans run without holding the report; the refreshed tiles are saved against the
+    version that was read, and merged into the newer report if it changed meanwhile.
+    """
+
+    SAVE_ATTEMPTS = 3
+
+    def __init__(self, reports: ReportService, analytics: Optional[AnalyticsEngine] = None):
+        self.reports = reports
+        self.analytics = analytics or AnalyticsEngine()
+
+    def refresh(
+        self, report_id: str, user_id: str, force: bool = False, expected_version: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Refreshes the report's tiles; force=True re-executes unchanged tiles too.
+        Returns {"report", "refreshed", "unchanged", "failed", "static"} (tile ids;
+        static tiles have no stored plan), or None if the report does not exist.
+        With expected_version, raises ReportVersionConflict if the report is (or
+        becomes, before the refreshed tiles are saved) at another version.
+        """
+        report = self.reports.get_report(report_id, user_id)
+        if report is None:
+            return None
+        if expected_version is not None and report.version != expected_version:
+            raise ReportVersionConflict(report.version)
+
+        tiles = [tile.model_dump() for tile in report.tiles]
+        outcome: Dict[str, List[str]] = {"refreshed": [], "unchanged": [], "failed": [], "static": []}
+        by_file: Dict[str, List[int]] = {}
+        for i, tile in enumerate(tiles):
+            source = tile.get("source") or {}
+            if not isinstance(source.get("plan"), dict):
+                outcome["static"].append(tile["tile_id"])
+                continue
+            by_file.setdefault(source.get("file_id") or report.file_id, []).append(i)
+
+        for file_id, members in by_file.items():
+            try:
+                version = self.analytics.ingestion.get_dataset_version(file_id, user_id)
+            except (FileNotFoundError, ValueError) as e:
+                logger.warning("Report refresh: dataset %s unavailable: %s", file_id, e)
+                outcome["failed"].extend(tiles[i]["tile_id"] for i in members)
+                continue
+
+            stale = []
+            for i in members:
+                source = tiles[i]["source"]
+                input_hash = stable_hash([file_id, version, source["plan"]])
+                if not force and source.get("input_hash") == input_hash:
+                    outcome["unchanged"].append(tiles[i]["tile_id"])
+                else:
+                    stale.append((i, input_hash))
+            if not stale:
+                continue
+
+            plans = [tiles[i]["source"]["plan"] for i, _ in stale]
+            executions = self.analytics.execute_batch(file_id, plans, user_id)
+            refreshed_at = datetime.now().isoformat()
+            for (i, input_hash), plan, execution in zip(stale, plans, executions):
+                tile = tiles[i]
+                data = _tile_data(tile, plan, execution)
+                if data is None:
+                    outcome["failed"].append(tile["tile_id"])
+                    continue
+                tile["data"] = data
+                if execution.get("granularity") and isinstance(tile.get("config"), dict):
+                    tile["config"]["granularity"] = execution["granularity"]
+                tile["source"] = {
+                    **tile["source"],
+                    "dataset_version": version,
+                    "input_hash": input_hash,
+                    "refreshed_at": refreshed_at
+                }
+                outcome["refreshed"].append(tile["tile_id"])
+
+        if outcome["refreshed"]:
+            refreshed = {tile["tile_id"]: tile for tile in tiles if tile["tile_id"] in outcome["refreshed"]}
+            report = self._save(report, refreshed, user_id, retry=expected_version is None)
+        return {"report": report, **outcome}
+
+    def _save(self, report, refreshed: Dict[str, Dict[str, Any]], user_id: str, retry: bool = True):
+        """
+        Writes the refreshed tiles into the report without losing concurrent tile
+        edits; retry=False raises ReportVersionConflict instead of merging them.
+        """
+        for _ in range(self.SAVE_ATTEMPTS):
+            # Tiles removed meanwhile stay removed; tiles added meanwhile are kept
+            tiles = [refreshed.get(tile.tile_id) or tile.model_dump() for tile in report.tiles]
+            try:
+                return self.reports.update_report(report.report_id, {"tiles": tiles}, user_id, report.version) or report
+            except ReportVersionConflict:
+                if not retry:
+                    raise
+                current = self.reports.get_report(report.report_id, user_id)
+                if current is None:
+                    return report
+                report = current
+        logger.warning("Report refresh: report %s kept changing, refreshed tiles not saved", report.report_id)
+        return report
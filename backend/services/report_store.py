@@ -0,0 +1,437 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Report fields that can be changed after creation
+UPDATABLE_FIELDS = ("title", "layout", "tiles")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    report_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    layout TEXT,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_reports_listing ON reports (user_id, file_id, created_at);
+CREATE TABLE IF NOT EXISTS tiles (
+    report_id TEXT NOT NULL,
+    tile_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    body TEXT NOT NULL,
+    PRIMARY KEY (report_id, tile_id)
+);
+CREATE TABLE IF NOT EXISTS migrated_users (
+    user_id TEXT PRIMARY KEY
+);
+"""
+
+
+class ReportVersionConflict(Exception):
+    """A write expected a report version that is no longer current."""
+
+    def __init__(self, current_version: int):
+        super().__init__(f"Report was modified (current version {current_version})")
+        self.current_version = current_version
+
+
+class ReportStore(ABC):
+    """
+    Persistence behind ReportService. Reports are dicts shaped like schemas.Report
+    (plus user_id) and are always scoped to their owner: operations on another
+    user's report behave as if it did not exist.
+
+    Every write is atomic and increments the report's version. Writes given an
+    expected_version only apply if it is still the current one (compare-and-swap),
+    and raise ReportVersionConflict otherwise; without one they always apply, which
+    is safe for adding and removing single tiles.
+    """
+    # Label of the store in metrics
+    kind = ""
+
+    @abstractmethod
+    def insert(self, report: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    def get(self, report_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def list(self, file_id: Optional[str], user_id: str) -> List[Dict[str, Any]]:
+        """The user's reports (of one dataset if file_id is given), newest first."""
+
+    @abstractmethod
+    def add_tile(self, report_id: str, tile: Dict[str, Any], user_id: str, expected_version: Optional[int] = None) -> bool:
+        ...
+
+    @abstractmethod
+    def remove_tile(self, report_id: str, tile_id: str, user_id: str, expected_version: Optional[int] = None) -> bool:
+        ...
+
+    @abstractmethod
+    def update(self, report_id: str, fields: Dict[str, Any], user_id: str, expected_version: Optional[int] = None) -> bool:
+        """Sets UPDATABLE_FIELDS; "tiles" replaces the whole tile list in the given order."""
+
+    @abstractmethod
+    def delete(self, report_id: str, user_id: str, expected_version: Optional[int] = None) -> bool:
+        ...
+
+
+class JsonReportStore(ReportStore):
+    """
+    One JSON file per report under DATA_DIR/<user>/reports (the original layout).
+    Files are replaced atomically (write to a temporary file, then rename), and the
+    read-modify-write of each report runs under a lock, so concurrent writes in this
+    process never lose an update. Separate processes need the SQLite store.
+    """
+    kind = "json"
+
+    _LOCK_STRIPES = 64
+
+    def __init__(self, data_dir: str):
+        self.data_dir = str(data_dir)
+        self._locks = [threading.Lock() for _ in range(self._LOCK_STRIPES)]
+
+    @contextmanager
+    def _locked(self, report_id: str, user_id: str) -> Iterator[None]:
+        with self._locks[hash((user_id, report_id)) % self._LOCK_STRIPES]:
+            yield
+
+    def _reports_dir(self, user_id: str) -> str:
+        return os.path.join(self.data_dir, user_id, "reports")
+
+    def _path(self, report_id: str, user_id: str) -> str:
+        return os.path.join(self._reports_dir(user_id), f"{report_id}.json")
+
+    def _save(self, report: Dict[str, Any]):
+        path = self._path(report["report_id"], report["user_id"])
+        # Created on the first write; reads of a missing directory find no reports
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = os.path.join(os.path.dirname(path), f".{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(report, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _modify(
+        self, report_id: str, user_id: str, expected_version: Optional[int], change: Callable[[Dict[str, Any]], None]
+    ) -> bool:
+        with self._locked(report_id, user_id):
+            report = self.get(report_id, user_id)
+            if report is None:
+                return False
+            version = report.get("version", 1)
+            if expected_version is not None and expected_version != version:
+                raise ReportVersionConflict(version)
+            change(report)
+            report["version"] = version + 1
+            self._save(report)
+            return True
+
+    def insert(self, report: Dict[str, Any]):
+        with self._locked(report["report_id"], report["user_id"]):
+            self._save(report)
+
+    def get(self, report_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(report_id, user_id), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def list(self, file_id: Optional[str], user_id: str) -> List[Dict[str, Any]]:
+        reports = []
+        for report in read_json_reports(self._reports_dir(user_id)):
+            if file_id is None or report.get("file_id") == file_id:
+                reports.append(report)
+        reports.sort(key=lambda r: r.get("created_at", ""), reverse=True)
+        return reports
+
+    def add_tile(self, report_id: str, tile: Dict[str, Any], user_id: str, expected_version: Optional[int] = None) -> bool:
+        def change(report):
+            ids = [t.get("tile_id") for t in report["tiles"]]
+            if tile["tile_id"] in ids:
+                report["tiles"][ids.index(tile["tile_id"])] = tile
+            else:
+                report["tiles"].append(tile)
+        return self._modify(report_id, user_id, expected_version, change)
+
+    def remove_tile(self, report_id: str, tile_id: str, user_id: str, expected_version: Optional[int] = None) -> bool:
+        def change(report):
+            report["tiles"] = [t for t in report["tiles"] if t.get("tile_id") != tile_id]
+        return self._modify(report_id, user_id, expected_version, change)
+
+    def update(self, report_id: str, fields: Dict[str, Any], user_id: str, expected_version: Optional[int] = None) -> bool:
+        def change(report):
+            report.update({k: v for k, v in fields.items() if k in UPDATABLE_FIELDS})
+        return self._modify(report_id, user_id, expected_version, change)
+
+    def delete(self, report_id: str, user_id: str, expected_version: Optional[int] = None) -> bool:
+        with self._locked(report_id, user_id):
+            report = self.get(report_id, user_id)
+            if report is None:
+                return False
+            if expected_version is not None and expected_version != report.get("version", 1):
+                raise ReportVersionConflict(report.get("version", 1))
+            os.remove(self._path(report_id, user_id))
+            return True
+
+
+class SqliteReportStore(ReportStore):
+    """
+    Reports in SQLite, indexed on (user_id, file_id, created_at) so listings never
+    read other reports. Each tile is a row (its JSON plus a position), so adding or
+    removing a tile is a single statement instead of rewriting the report.
+
+    A user's existing JSON reports (DATA_DIR/<user>/reports, see JsonReportStore)
+    are imported the first time the store touches that user; the files are left in
+    place, and a report deleted afterwards is not imported again.
+
+    Each write is one transaction that starts by incrementing the report's version,
+    which takes SQLite's write lock: concurrent writers (threads or processes)
+    queue up instead of overwriting each other.
+    """
+    kind = "sqlite"
+
+    def __init__(self, db_path: str, legacy_dir: Optional[str] = None):
+        self.db_path = str(db_path)
+        self.legacy_dir = str(legacy_dir) if legacy_dir else None
+        self._migrated = set()
+        self._migrate_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(reports)")}
+            if "version" not in columns:
+                conn.execute("ALTER TABLE reports ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """A connection whose statements commit together (or roll back on error)."""
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # -- migration ------------------------------------------------------------
+
+    def _ensure_migrated(self, user_id: str):
+        if self.legacy_dir is None or user_id in self._migrated:
+            return
+        with self._migrate_lock:
+            if user_id not in self._migrated:
+                self.migrate_user(user_id)
+                self._migrated.add(user_id)
+
+    def migrate_user(self, user_id: str) -> int:
+        """Imports the user's JSON report files once; returns how many reports were added."""
+        reports_dir = os.path.join(self.legacy_dir or "", user_id, "reports")
+        with self._connect() as conn:
+            if conn.execute("SELECT 1 FROM migrated_users WHERE user_id = ?", (user_id,)).fetchone():
+                return 0
+            imported = 0
+            for report in read_json_reports(reports_dir):
+                report["user_id"] = user_id
+                if self._insert(conn, report, replace=False):
+                    imported += 1
+            conn.execute("INSERT INTO migrated_users (user_id) VALUES (?)", (user_id,))
+        if imported:
+            logger.info("Migrated %d JSON reports of user %s to SQLite", imported, user_id)
+        return imported
+
+    # -- rows -----------------------------------------------------------------
+
+    def _insert(self, conn: sqlite3.Connection, report: Dict[str, Any], replace: bool = True) -> bool:
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        cursor = conn.execute(
+            f"{verb} INTO reports (report_id, user_id, file_id, title, created_at, layout, version) "
+            f"VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                report["report_id"],
+                report["user_id"],
+                report.get("file_id") or "",
+                report.get("title") or "",
+                report.get("created_at") or "",
+                _dumps(report.get("layout")),
+                report.get("version", 1)
+            )
+        )
+        if cursor.rowcount == 0:
+            return False
+        self._replace_tiles(conn, report["report_id"], report.get("tiles") or [])
+        return True
+
+    def _replace_tiles(self, conn: sqlite3.Connection, report_id: str, tiles: List[Dict[str, Any]]):
+        conn.execute("DELETE FROM tiles WHERE report_id = ?", (report_id,))
+        # A repeated tile_id keeps its last version, as with add_tile
+        conn.executemany(
+            "INSERT OR REPLACE INTO tiles (report_id, tile_id, position, body) VALUES (?, ?, ?, ?)",
+            [(report_id, tile["tile_id"], i, _dumps(tile)) for i, tile in enumerate(tiles)]
+        )
+
+    def _bump(self, conn: sqlite3.Connection, report_id: str, user_id: str, expected_version: Optional[int]) -> bool:
+        """Increments the report's version (compare-and-swap when expected_version is given); False if it does not exist."""
+        sql, params = "UPDATE reports SET version = version + 1 WHERE report_id = ? AND user_id = ?", [report_id, user_id]
+        if expected_version is not None:
+            sql, params = sql + " AND version = ?", params + [expected_version]
+        if conn.execute(sql, params).rowcount:
+            return True
+        if expected_version is not None:
+            row = conn.execute(
+                "SELECT version FROM reports WHERE report_id = ? AND user_id = ?", (report_id, user_id)
+            ).fetchone()
+            if row is not None:
+                raise ReportVersionConflict(row["version"])
+        return False
+
+    def _to_report(self, row: sqlite3.Row, tiles: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "report_id": row["report_id"],
+            "file_id": row["file_id"],
+            "user_id": row["user_id"],
+            "title": row["title"],
+            "created_at": row["created_at"],
+            "tiles": tiles,
+            "layout": json.loads(row["layout"]) if row["layout"] else None,
+            "version": row["version"]
+        }
+
+    # -- ReportStore ----------------------------------------------------------
+
+    def insert(self, report: Dict[str, Any]):
+        self._ensure_migrated(report["user_id"])
+        with self._connect() as conn:
+            self._insert(conn, report)
+
+    def get(self, report_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        self._ensure_migrated(user_id)
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM reports WHERE report_id = ? AND user_id = ?", (report_id, user_id)
+            ).fetchone()
+            if row is None:
+                return None
+            tiles = conn.execute(
+                "SELECT body FROM tiles WHERE report_id = ? ORDER BY position", (report_id,)
+            ).fetchall()
+        return self._to_report(row, [json.loads(t["body"]) for t in tiles])
+
+    def list(self, file_id: Optional[str], user_id: str) -> List[Dict[str, Any]]:
+        self._ensure_migrated(user_id)
+        where, params = "r.user_id = ?", [user_id]
+        if file_id is not None:
+            where, params = where + " AND r.file_id = ?", params + [file_id]
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM reports r WHERE {where} ORDER BY r.created_at DESC", params
+            ).fetchall()
+            tiles = conn.execute(
+                f"SELECT t.report_id, t.body FROM tiles t JOIN reports r ON r.report_id = t.report_id "
+                f"WHERE {where} ORDER BY t.position",
+                params
+            ).fetchall()
+        by_report: Dict[str, List[Dict[str, Any]]] = {}
+        for tile in tiles:
+            by_report.setdefault(tile["report_id"], []).append(json.loads(tile["body"]))
+        return [self._to_report(row, by_report.get(row["report_id"], [])) for row in rows]
+
+    def add_tile(self, report_id: str, tile: Dict[str, Any], user_id: str, expected_version: Optional[int] = None) -> bool:
+        self._ensure_migrated(user_id)
+        with self._connect() as conn:
+            if not self._bump(conn, report_id, user_id, expected_version):
+                return False
+            # Appends after the last tile; re-adding a tile id replaces it in place
+            conn.execute(
+                """
+                INSERT INTO tiles (report_id, tile_id, position, body)
+                VALUES (?, ?, (SELECT COALESCE(MAX(position) + 1, 0) FROM tiles WHERE report_id = ?), ?)
+                ON CONFLICT (report_id, tile_id) DO UPDATE SET body = excluded.body
+                """,
+                (report_id, tile["tile_id"], report_id, _dumps(tile))
+            )
+            return True
+
+    def remove_tile(self, report_id: str, tile_id: str, user_id: str, expected_version: Optional[int] = None) -> bool:
+        self._ensure_migrated(user_id)
+        with self._connect() as conn:
+            if not self._bump(conn, report_id, user_id, expected_version):
+                return False
+            conn.execute("DELETE FROM tiles WHERE report_id = ? AND tile_id = ?", (report_id, tile_id))
+            return True
+
+    def update(self, report_id: str, fields: Dict[str, Any], user_id: str, expected_version: Optional[int] = None) -> bool:
+        self._ensure_migrated(user_id)
+        with self._connect() as conn:
+            if not self._bump(conn, report_id, user_id, expected_version):
+                return False
+            if "title" in fields:
+                conn.execute("UPDATE reports SET title = ? WHERE report_id = ?", (fields["title"], report_id))
+            if "layout" in fields:
+                conn.execute("UPDATE reports SET layout = ? WHERE report_id = ?", (_dumps(fields["layout"]), report_id))
+            if "tiles" in fields:
+                self._replace_tiles(conn, report_id, fields["tiles"] or [])
+            return True
+
+    def delete(self, report_id: str, user_id: str, expected_version: Optional[int] = None) -> bool:
+        self._ensure_migrated(user_id)
+        with self._connect() as conn:
+            if not self._bump(conn, report_id, user_id, expected_version):
+                return False
+            conn.execute("DELETE FROM tiles WHERE report_id = ?", (report_id,))
+            conn.execute("DELETE FROM reports WHERE report_id = ?", (report_id,))
+            return True
+
+
+def _dumps(value: Any) -> Optional[str]:
+    return json.dumps(value, separators=(",", ":"), default=str) if value is not None else None
+
+
+def read_json_reports(reports_dir: str) -> List[Dict[str, Any]]:
+    """Every readable report file in a JSON reports directory (unreadable files are skipped)."""
+    reports = []
+    if not os.path.isdir(reports_dir):
+        return reports
+    for filename in os.listdir(reports_dir):
+        if not filename.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(reports_dir, filename), "r") as f:
+                report = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        if isinstance(report, dict) and report.get("report_id"):
+            report.setdefault("tiles", [])
+            reports.append(report)
+    return reports
+
+
+def create_report_store(kind: str, data_dir: str) -> ReportStore:
+    """The store selected by REPORT_STORE: "sqlite" (DATA_DIR/reports.db) or "json"."""
+    kind = (kind or "sqlite").lower()
+    if kind == "json":
+        return JsonReportStore(data_dir)
+    if kind == "sqlite":
+        return SqliteReportStore(os.path.join(str(data_dir), "reports.db"), legacy_dir=data_dir)
+    raise ValueError(f"Unknown REPORT_STORE '{kind}' (expected 'sqlite' or 'json')")
@@ -0,0 +1,409 @@
+import cProfile
+import functools
+import hmac
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from logging_config import request_id_var
+from config import (
+    ADMIN_TOKEN, PROFILE_DIR, PROFILE_MAX_COUNT, PROFILE_MODE, PROFILE_SAMPLE_INTERVAL_MS,
+    PROFILE_SAMPLE_PATHS, PROFILE_SAMPLE_RATE
+)
+
+# "sample": wall-clock stack samples (folded stacks, for flamegraph.pl or speedscope)
+# "cprofile": deterministic cProfile stats (a .prof file, for pstats or snakeviz)
+PROFILE_MODES = ("sample", "cprofile")
+
+# A request is profiled when it sends X-Profile (a mode, or any value for the default
+# one) together with a valid X-Admin-Token, or when it matches the sampling rule
+PROFILE_HEADER = "x-profile"
+ADMIN_TOKEN_HEADER = "x-admin-token"
+PROFILE_ID_HEADER = "x-profile-id"
+
+TOP_ENTRIES = 30
+_VALID_PROFILE_ID = re.compile(r"^[0-9]{8}T[0-9]{12}-[0-9a-f]{6}$")
+
+# Since Python 3.12 only one cProfile can be enabled in the process (a second one
+# raises ValueError), so a single phase at a time holds it; phases that find it
+# taken are stack-sampled instead
+_cprofile_lock = threading.Lock()
+
+# Session of the request being profiled; copied into threadpool calls with the rest of the context
+_session: ContextVar[Optional["ProfileSession"]] = ContextVar("profile_session", default=None)
+
+
+def is_admin(headers: Headers, admin_token: Optional[str] = ADMIN_TOKEN) -> bool:
+    """Whether the request carries the admin token (never true when no token is configured)."""
+    supplied = headers.get(ADMIN_TOKEN_HEADER)
+    return bool(admin_token and supplied) and hmac.compare_digest(supplied.encode(), admin_token.encode())
+
+
+class ProfileSession:
+    """
+    Profile of one request. Work is measured inside phases (see phase()): each
+    phase's calls and wall time are recorded, and the threads running a phase are
+    the ones profiled - stack-sampled, or under cProfile from the outermost phase
+    of the thread (stack-sampled when cProfile is already in use elsewhere). Code
+    outside any phase (e.g. awaiting the LLM) is not profiled.
+    """
+
+    def __init__(self, profile_id: str, mode: str, interval_seconds: float = PROFILE_SAMPLE_INTERVAL_MS / 1000):
+        self.profile_id = profile_id
+        self.mode = mode
+        self.interval_seconds = interval_seconds
+        self.phases: Dict[str, List[float]] = {}
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.active = False
+        # Set when a cprofile session had to stack-sample some phases (see enter())
+        self.sampled_fallback = False
+        self._threads: Dict[int, int] = {}
+        self._cprofiled: set = set()
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def start(self):
+        self.active = True
+        if self.mode == "sample":
+            self._sampler = threading.Thread(target=self._sample, name=f"profiler-{self.profile_id}", daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        self.active = False
+        with self._lock:
+            self._stop.set()
+            sampler = self._sampler
+        if sampler is not None:
+            sampler.join()
+
+    def enter(self) -> Optional[cProfile.Profile]:
+        thread_id = threading.get_ident()
+        with self._lock:
+            depth = self._threads.get(thread_id, 0)
+            self._threads[thread_id] = depth + 1
+        if depth or self.mode != "cprofile":
+            return None
+        profiler = _enable_cprofile()
+        if profiler is None:
+            # cProfile is busy with another thread or tool: stack-sample this thread instead
+            self._start_fallback_sampler()
+            return None
+        with self._lock:
+            self._cprofiled.add(thread_id)
+        return profiler
+
+    def exit(self, name: str, seconds: float, profiler: Optional[cProfile.Profile]):
+        if profiler is not None:
+            _disable_cprofile(profiler)
+        thread_id = threading.get_ident()
+        with self._lock:
+            depth = self._threads.pop(thread_id) - 1
+            if depth:
+                self._threads[thread_id] = depth
+            entry = self.phases.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            if profiler is not None:
+                self._cprofiled.discard(thread_id)
+                self._profiles.append(profiler)
+
+    def _start_fallback_sampler(self):
+        with self._lock:
+            if self._sampler is not None or self._stop.is_set():
+                return
+            self.sampled_fallback = True
+            self._sampler = threading.Thread(target=self._sample, name=f"profiler-{self.profile_id}", daemon=True)
+            self._sampler.start()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval_seconds):
+            with self._lock:
+                thread_ids = [t for t in self._threads if t not in self._cprofiled]
+            if not thread_ids:
+                continue
+            frames = sys._current_frames()
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.stacks[_folded(frame)] += 1
+                    self.samples += 1
+
+    def phase_summary(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            phases = sorted(self.phases.items(), key=lambda item: -item[1][1])
+        return [{"name": name, "calls": int(calls), "total_ms": round(seconds * 1000, 2)} for name, (calls, seconds) in phases]
+
+    def stats(self) -> Optional[pstats.Stats]:
+        """Merged cProfile stats of every profiled phase (cprofile mode)."""
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profiler in profiles[1:]:
+            stats.add(profiler)
+        return stats
+
+    def top(self) -> List[Dict[str, Any]]:
+        """Where the time went: the costliest functions (cprofile) or leaf frames (sample)."""
+        stats = self.stats() if self.mode == "cprofile" else None
+        if stats is not None:
+            rows = sorted(stats.stats.items(), key=lambda item: -item[1][3])[:TOP_ENTRIES]
+            return [{
+                "function": function, "file": filename, "line": line, "calls": calls,
+                "self_ms": round(own * 1000, 2), "cumulative_ms": round(cumulative * 1000, 2)
+            } for (filename, line, function), (_, calls, own, cumulative, _) in rows]
+
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return [
+            {"frame": frame, "samples": count, "percent": round(100 * count / self.samples, 1)}
+            for frame, count in leaves.most_common(TOP_ENTRIES)
+        ]
+
+
+def _enable_cprofile() -> Optional[cProfile.Profile]:
+    """A running profiler holding the process-wide cProfile slot, or None if it is taken."""
+    if not _cprofile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiling tool (e.g. a debugger or coverage) owns the hooks
+        _cprofile_lock.release()
+        return None
+    return profiler
+
+
+def _disable_cprofile(profiler: cProfile.Profile):
+    try:
+        profiler.disable()
+    finally:
+        _cprofile_lock.release()
+
+
+def _folded(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class phase:
+    """
+    Times a block of the current request's profile (a no-op outside profiled requests):
+
+        with phase("analytics.aggregate"):
+            ...
+    """
+    __slots__ = ("name", "_session", "_profiler", "_start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        session = _session.get()
+        self._session = session if session is not None and session.active else None
+        if self._session is not None:
+            self._profiler = self._session.enter()
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._session is not None:
+            self._session.exit(self.name, time.perf_counter() - self._start, self._profiler)
+        return False
+
+
+def profiled(name: str) -> Callable:
+    """Decorator form of phase(); costs one context variable lookup when not profiling."""
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _session.get() is None:
+                return function(*args, **kwargs)
+            with phase(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class ProfileStore:
+    """
+    Captured profiles under a directory: <id>.json (request, phase timings and the
+    top entries) plus the raw profile, <id>.prof or <id>.folded. Only the newest
+    max_profiles are kept. Ids start with the UTC capture time, so they sort by age.
+    """
+
+    def __init__(self, directory: str = str(PROFILE_DIR), max_profiles: int = PROFILE_MAX_COUNT):
+        self.directory = directory
+        self.max_profiles = max(1, max_profiles)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_id() -> str:
+        return f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:6]}"
+
+    def _path(self, profile_id: str, suffix: str) -> Optional[str]:
+        if not _VALID_PROFILE_ID.match(profile_id):
+            return None
+        return os.path.join(self.directory, profile_id + suffix)
+
+    def save(self, session: ProfileSession, summary: Dict[str, Any]):
+        os.makedirs(self.directory, exist_ok=True)
+        stats = session.stats() if session.mode == "cprofile" else None
+        if stats is not None:
+            stats.dump_stats(self._path(session.profile_id, ".prof"))
+            summary["raw"] = f"{session.profile_id}.prof"
+        elif session.stacks:
+            with open(self._path(session.profile_id, ".folded"), "w") as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in session.stacks.items())
+            summary["raw"] = f"{session.profile_id}.folded"
+        path = self._path(session.profile_id, ".json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(summary, f, default=str)
+        os.replace(tmp_path, path)
+        self._prune()
+
+    def _prune(self):
+        with self._lock:
+            ids = self.ids()
+            for profile_id in ids[:-self.max_profiles]:
+                for suffix in (".json", ".prof", ".folded"):
+                    try:
+                        os.remove(self._path(profile_id, suffix))
+                    except FileNotFoundError:
+                        pass
+
+    def ids(self) -> List[str]:
+        """Stored profile ids, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name[:-5] for name in os.listdir(self.directory)
+            if name.endswith(".json") and _VALID_PROFILE_ID.match(name[:-5])
+        )
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Summaries of the stored profiles (without their top entries), newest first."""
+        summaries = []
+        for profile_id in reversed(self.ids()):
+            summary = self.get(profile_id)
+            if summary is not None:
+                summary.pop("top", None)
+                summaries.append(summary)
+        return summaries
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        path = self._path(profile_id, ".json")
+        if path is None:
+            return None
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def raw_path(self, profile_id: str) -> Optional[str]:
+        summary = self.get(profile_id)
+        if not summary or not summary.get("raw"):
+            return None
+        return os.path.join(self.directory, summary["raw"])
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests that ask for it (X-Profile plus a valid X-Admin-Token) and a
+    sample_rate fraction of the requests whose path starts with one of sample_paths,
+    in default_mode. The profile id is returned in X-Profile-Id, and the profile is
+    stored in `store` once the response has been sent.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        store: Optional[ProfileStore] = None,
+        admin_token: Optional[str] = ADMIN_TOKEN,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        sample_paths: Sequence[str] = PROFILE_SAMPLE_PATHS,
+        default_mode: str = PROFILE_MODE,
+    ):
+        self.app = app
+        self.store = store or ProfileStore()
+        self.admin_token = admin_token
+        self.sample_rate = sample_rate
+        self.sample_paths = tuple(sample_paths)
+        self.default_mode = default_mode if default_mode in PROFILE_MODES else "sample"
+
+    def _mode(self, scope: Scope) -> Optional[str]:
+        headers = Headers(scope=scope)
+        requested = headers.get(PROFILE_HEADER)
+        if requested is not None and is_admin(headers, self.admin_token):
+            return requested if requested in PROFILE_MODES else self.default_mode
+        if self.sample_rate > 0 and scope["path"].startswith(self.sample_paths) and random.random() < self.sample_rate:
+            return self.default_mode
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        mode = self._mode(scope) if scope["type"] == "http" else None
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        session = ProfileSession(ProfileStore.new_id(), mode)
+        status = 500
+
+        async def send_with_profile_id(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append(PROFILE_ID_HEADER, session.profile_id)
+            await send(message)
+
+        started_at = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+        start = time.perf_counter()
+        token = _session.set(session)
+        session.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            session.stop()
+            _session.reset(token)
+            duration_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        summary = {
+            "profile_id": session.profile_id,
+            "request_id": request_id_var.get(),
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status,
+            "mode": mode,
+            "started_at": started_at,
+            "duration_ms": duration_ms,
+            "phases": session.phase_summary(),
+            "samples": session.samples if mode == "sample" or session.sampled_fallback else None,
+            "sampled_fallback": session.sampled_fallback,
+            "top": session.top(),
+            "raw": None,
+        }
+        await run_in_threadpool(self.store.save, session, summary)
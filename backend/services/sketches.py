@@ -0,0 +1,206 @@
+import base64
+import math
+import zlib
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+# Sizes of the sketches persisted per column with the dataset profile
+HLL_PRECISION = 12  # about 1.6% standard error in 4 KiB of registers
+TDIGEST_COMPRESSION = 200  # at most about 100 centroids
+# Register budget of per-group distinct counts; many groups get a lower precision
+GROUPED_HLL_BYTES = 64 * 1024 * 1024
+
+
+def hash_values(values) -> np.ndarray:
+    """64-bit hashes of a Series/DataFrame (row-wise, index ignored) as a uint64 array."""
+    return pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64, copy=False)
+
+
+def _leading_zeros(values: np.ndarray) -> np.ndarray:
+    """Exact count of leading zero bits of uint64 values (values must be non-zero)."""
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    # Each half fits in a float64 mantissa, so log2 is exact here
+    with np.errstate(divide="ignore"):
+        high_bits = np.floor(np.log2(high))
+        low_bits = np.floor(np.log2(low))
+    return np.where(high > 0, 31 - high_bits, 63 - low_bits).astype(np.uint8)
+
+
+class HyperLogLog:
+    """
+    Mergeable distinct-count sketch over 64-bit hashes.
+
+    The standard error is about 1.04 / sqrt(2**precision); pass `error_rate` to pick
+    the smallest precision that meets it. Updates are vectorised over hash arrays.
+    """
+
+    MIN_PRECISION = 4
+    MAX_PRECISION = 18
+
+    def __init__(self, error_rate: Optional[float] = None, precision: Optional[int] = None):
+        if precision is None:
+            error_rate = error_rate or 0.01
+            precision = math.ceil(math.log2((1.04 / error_rate) ** 2))
+        self.precision = int(min(max(precision, self.MIN_PRECISION), self.MAX_PRECISION))
+        self.registers = np.zeros(1 << self.precision, dtype=np.uint8)
+
+    @property
+    def error_rate(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add_hashes(self, hashes: np.ndarray) -> "HyperLogLog":
+        if len(hashes) == 0:
+            return self
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.intp)
+        # The guard bit bounds rho at 64 - p + 1 when the remaining bits are all zero
+        remaining = (hashes << p) | (np.uint64(1) << (p - np.uint64(1)))
+        rho = _leading_zeros(remaining) + 1
+        np.maximum.at(self.registers, index, rho)
+        return self
+
+    def add(self, values) -> "HyperLogLog":
+        """Adds a Series (values) or DataFrame (rows)."""
+        return self.add_hashes(hash_values(values))
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> float:
+        return float(_estimate(self.registers))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"precision": self.precision, "registers": base64.b64encode(zlib.compress(self.registers.tobytes())).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HyperLogLog":
+        sketch = cls(precision=data["precision"])
+        registers = np.frombuffer(zlib.decompress(base64.b64decode(data["registers"])), dtype=np.uint8)
+        if len(registers) != len(sketch.registers):
+            raise ValueError("HyperLogLog registers do not match the precision")
+        sketch.registers = registers.copy()
+        return sketch
+
+
+def _estimate(registers: np.ndarray) -> np.ndarray:
+    """Distinct-count estimate per row of registers (the last axis holds one sketch)."""
+    m = registers.shape[-1]
+    alpha = 0.7213 / (1 + 1.079 / m) if m >= 128 else {16: 0.673, 32: 0.697, 64: 0.709}[m]
+    estimate = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)), axis=-1)
+    zeros = np.count_nonzero(registers == 0, axis=-1)
+    # Small-range correction (linear counting)
+    with np.errstate(divide="ignore"):
+        linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((estimate <= 2.5 * m) & (zeros > 0), linear, estimate)
+
+
+def grouped_approx_distinct_counts(codes: np.ndarray, values: pd.Series, n_groups: int) -> np.ndarray:
+    """
+    Distinct-count estimate of values per group code (0..n_groups-1, -1 to skip the row),
+    with one HyperLogLog per group updated in a single vectorised pass. Values are
+    factorized first, so only their integer codes are hashed.
+    """
+    precision = min(HLL_PRECISION, int(math.log2(max(GROUPED_HLL_BYTES // max(n_groups, 1), 1))))
+    precision = max(precision, HyperLogLog.MIN_PRECISION)
+    value_codes, _ = pd.factorize(values)
+    valid = (codes >= 0) & (value_codes >= 0)
+    hashes = hash_values(pd.Series(value_codes[valid]))
+    m = 1 << precision
+
+    p = np.uint64(precision)
+    index = codes[valid].astype(np.intp) * m + (hashes >> (np.uint64(64) - p)).astype(np.intp)
+    remaining = (hashes << p) | (np.uint64(1) << (p - np.uint64(1)))
+    registers = np.zeros((n_groups, m), dtype=np.uint8)
+    np.maximum.at(registers.reshape(-1), index, _leading_zeros(remaining) + 1)
+    counts = np.rint(_estimate(registers)).astype(np.int64)
+    # Groups without values
+    counts[~registers.any(axis=1)] = 0
+    return counts
+
+
+class TDigest:
+    """
+    Mergeable quantile sketch: a merging t-digest with the k1 scale function.
+
+    Centroids are kept sorted by mean. Adding values or merging another digest
+    re-clusters everything in one vectorised pass into at most about compression / 2
+    centroids, smallest at the tails where quantiles need the most precision.
+    """
+
+    def __init__(self, compression: int = TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def add(self, values, weights=None) -> "TDigest":
+        """Adds numbers (NaN is skipped), each with weight 1 unless `weights` is given."""
+        values = np.asarray(values, dtype=np.float64)
+        valid = ~np.isnan(values)
+        if weights is None:
+            values = np.sort(values[valid])
+            weights = np.ones(len(values))
+        else:
+            values, weights = values[valid], np.asarray(weights, dtype=np.float64)[valid]
+            order = np.argsort(values, kind="stable")
+            values, weights = values[order], weights[order]
+        # Compress the batch on its own, then merge its few centroids
+        return self._merge(*_compress(values, weights, self.compression))
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        return self._merge(other.means, other.weights)
+
+    def _merge(self, means: np.ndarray, weights: np.ndarray) -> "TDigest":
+        if len(means) == 0:
+            return self
+        means = np.concatenate([self.means, means])
+        weights = np.concatenate([self.weights, weights])
+        order = np.argsort(means, kind="stable")
+        self.means, self.weights = _compress(means[order], weights[order], self.compression)
+        return self
+
+    def quantile(self, q: float) -> float:
+        """
+        Value at quantile q (0..1), interpolated between centroid centres (exact linear
+        interpolation while every centroid holds a single value); NaN when empty.
+        """
+        if len(self.means) == 0:
+            return float("nan")
+        centres = np.cumsum(self.weights) - self.weights / 2
+        target = min(max(q * (self.count - 1) + 0.5, centres[0]), centres[-1])
+        return float(np.interp(target, centres, self.means))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"compression": self.compression, "means": self.means.tolist(), "weights": self.weights.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TDigest":
+        digest = cls(compression=data["compression"])
+        digest.means = np.asarray(data["means"], dtype=np.float64)
+        digest.weights = np.asarray(data["weights"], dtype=np.float64)
+        return digest
+
+
+def _compress(means: np.ndarray, weights: np.ndarray, compression: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Clusters weighted points sorted by mean into t-digest centroids: points whose
+    mid-quantile falls in the same unit of k1(q) = compression / (2 pi) * asin(2q - 1)
+    are merged.
+    """
+    if len(means) == 0:
+        return means, weights
+    before = np.cumsum(weights) - weights
+    q = (before + weights / 2) / (before[-1] + weights[-1])
+    k = np.floor(compression / (2 * np.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1)))
+    bounds = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+    merged = np.add.reduceat(weights, bounds)
+    return np.add.reduceat(means * weights, bounds) / merged, merged
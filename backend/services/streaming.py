@@ -0,0 +1,50 @@
+import json
+from typing import Any, Dict, Iterator
+import pandas as pd
+
+# Rows encoded per chunk of a streamed export
+EXPORT_CHUNK_ROWS = 10000
+
+# Media types of the export formats
+EXPORT_MEDIA_TYPES: Dict[str, str] = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Headers that keep proxies (nginx, Next.js rewrites) from buffering the event stream
+SSE_HEADERS: Dict[str, str] = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_sse(event: str, data: Any) -> str:
+    """
+    Formats one server-sent event frame.
+
+    The payload is always JSON so clients can parse every event the same way:
+        event: token
+        data: {"text": "..."}
+    """
+    payload = json.dumps(data, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+def iter_export(df: pd.DataFrame, export_format: str, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[str]:
+    """
+    Encodes df as NDJSON (one JSON object per row) or CSV, chunk_rows rows at a
+    time, so a large result is never held in memory as text or as dicts.
+    """
+    if export_format not in EXPORT_MEDIA_TYPES:
+        raise ValueError(f"Unknown export format: {export_format}")
+
+    if export_format == "csv":
+        yield df.iloc[:0].to_csv(index=False)
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        if export_format == "csv":
+            yield chunk.to_csv(index=False, header=False)
+        else:
+            text = chunk.to_json(orient="records", lines=True, date_format="iso")
+            yield text if text.endswith("\n") else text + "\n"
@@ -0,0 +1,142 @@
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from services.aggregations import aggregate_grouped, resolve_metrics, value_frame
+from services.dataset_cache import DatasetCache
+from services.single_flight import SingleFlight
+from config import DATASET_CACHE_MB
+
+# Bucket sizes, finest first, with their pandas frequency and approximate length
+GRANULARITIES: List[Tuple[str, str, pd.Timedelta]] = [
+    ("minute", "min", pd.Timedelta(minutes=1)),
+    ("hour", "h", pd.Timedelta(hours=1)),
+    ("day", "D", pd.Timedelta(days=1)),
+    ("week", "W-MON", pd.Timedelta(days=7)),
+    ("month", "MS", pd.Timedelta(days=30.44)),
+    ("quarter", "QS", pd.Timedelta(days=91.31)),
+    ("year", "YS", pd.Timedelta(days=365.25)),
+]
+_FREQUENCIES = {name: freq for name, freq, _ in GRANULARITIES}
+# Buckets labelled by date only
+_DATE_LABELS = ("day", "week", "month", "quarter", "year")
+
+# Parsed datetime columns of cached dataset versions, sharing a slice of the dataset cache budget
+_parsed_columns = DatasetCache(max_bytes=DATASET_CACHE_MB * 1024 * 1024 // 4)
+_parse_flight = SingleFlight()
+
+
+def choose_granularity(start: pd.Timestamp, end: pd.Timestamp, max_points: int) -> str:
+    """Finest granularity that covers start..end in at most max_points buckets."""
+    span = end - start
+    for name, _, length in GRANULARITIES:
+        if span / length + 1 <= max_points:
+            return name
+    return "year"
+
+
+def parse_datetimes(values: pd.Series, iso: bool = False) -> pd.Series:
+    """
+    values as datetime64 (unparseable values become NaT). The format is inferred
+    once from the data (ISO 8601 when the dataset's hints say so); mixed formats
+    fall back to per-value parsing.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    try:
+        parsed = pd.to_datetime(values, errors="coerce", format="ISO8601" if iso else None)
+    except (ValueError, TypeError):
+        # Mixed UTC offsets
+        parsed = pd.to_datetime(values, errors="coerce", utc=True, format="ISO8601" if iso else None)
+    present = int(values.notna().sum())
+    if present and parsed.notna().sum() < 0.8 * present:
+        parsed = pd.to_datetime(values, errors="coerce", format="mixed", utc=True)
+    return parsed
+
+
+def looks_temporal(values: pd.Series, sample_size: int = 1000) -> bool:
+    """Whether a column holds dates: datetime dtype, or text that mostly parses as dates."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return True
+    if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+        return False
+    sample = values.dropna().iloc[:sample_size]
+    if sample.empty:
+        return False
+    try:
+        parsed = pd.to_datetime(sample.astype(str), errors="coerce", format="mixed")
+    except (ValueError, TypeError):
+        return False
+    return parsed.notna().mean() >= 0.8
+
+
+def cached_datetimes(
+    user_id: str, file_id: str, version: str, base: pd.DataFrame, column: Hashable, iso: bool = False
+) -> pd.Series:
+    """Parsed datetimes of base[column], parsed once per dataset version and column."""
+    parsed = _parsed_columns.get(user_id, file_id, version)
+    if parsed is not None and column in parsed.columns:
+        return parsed[column]
+    return _parse_flight.do(
+        (user_id, file_id, version, column), _parse_and_cache, user_id, file_id, version, base, column, iso
+    )
+
+
+def _parse_and_cache(user_id: str, file_id: str, version: str, base: pd.DataFrame, column: Hashable, iso: bool) -> pd.Series:
+    values = parse_datetimes(base[column], iso)
+    parsed = _parsed_columns.get(user_id, file_id, version)
+    parsed = pd.DataFrame(index=base.index) if parsed is None else parsed.copy(deep=False)
+    parsed[column] = values
+    _parsed_columns.put(user_id, file_id, version, parsed)
+    return values
+
+
+def bucket(
+    df: pd.DataFrame,
+    dates: pd.Series,
+    metrics: List[Dict[str, Any]],
+    group_by: List[Hashable],
+    date_column: Hashable,
+    granularity: Optional[str] = None,
+    max_points: int = 500,
+    exact: bool = False
+) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Aggregates df per time bucket of `dates` (aligned with df) and any extra group_by
+    columns. Metrics are named "{op}_{col}" ("count" without metrics), buckets are
+    labelled in date_column. The granularity is chosen from the span and max_points
+    unless given; a given one that would exceed max_points buckets is coarsened.
+    Returns (result, granularity used), granularity None when no date parses.
+    exact=True computes approximate operations exactly (see resolve_metrics).
+    """
+    valid = dates.notna().to_numpy()
+    if not valid.any():
+        return pd.DataFrame(columns=[date_column]), None
+    dates = dates[valid]
+    start, end = dates.min(), dates.max()
+
+    auto = choose_granularity(start, end, max_points)
+    names = [name for name, _, _ in GRANULARITIES]
+    if granularity not in _FREQUENCIES or names.index(granularity) < names.index(auto):
+        granularity = auto
+
+    # The Series keeps time zones (to_numpy would give Timestamp objects)
+    columns = {"__bucket__": dates.reset_index(drop=True)}
+    for col in group_by:
+        columns[col] = df[col].to_numpy()[valid]
+    specs = resolve_metrics(metrics, df.columns, exact=exact)
+    values = value_frame(df, specs)
+    for source in values.columns:
+        columns[source] = values[source].to_numpy()[valid]
+
+    frame = pd.DataFrame(columns)
+    # Buckets are labelled by their start (weeks start on Monday)
+    keys = [pd.Grouper(key="__bucket__", freq=_FREQUENCIES[granularity], closed="left", label="left")] + list(group_by)
+    grouped = frame.groupby(keys, sort=True)
+    result = aggregate_grouped(grouped, specs) if specs else grouped.size().to_frame("count")
+    result = result.reset_index()
+
+    buckets = pd.DatetimeIndex(result["__bucket__"])
+    labels = buckets.strftime("%Y-%m-%d" if granularity in _DATE_LABELS else "%Y-%m-%dT%H:%M:%S")
+    result = result.drop(columns="__bucket__")
+    result.insert(0, date_column, np.asarray(labels, dtype=object))
+    return result, granularity
@@ -0,0 +1,121 @@
+import os
+import sys
+import unittest
+import numpy as np
+import pandas as pd
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.analytics_engine import AnalyticsEngine
+from services.aggregations import percentile_of, resolve_metrics, unresolved_metrics
+
+
+class TestAggregations(unittest.TestCase):
+    def setUp(self):
+        self.engine = AnalyticsEngine()
+        self.df = pd.DataFrame({
+            "Region": ["East", "West", "East", "West", "East"],
+            "Sales": [10.0, 20.0, 30.0, "n/a", 50.0],
+            "Customer": ["a", "b", "a", "c", "d"],
+        })
+
+    def test_resolve_metrics(self):
+        specs = resolve_metrics([
+            {"column": "Sales", "operation": "sum"},
+            {"column": "Sales", "operation": "avg"},
+            {"column": "Sales", "operation": "sum"},
+            {"column": "Sales", "operation": "count"},
+            {"column": "Sales", "operation": "variance"},
+            {"column": "Missing", "operation": "sum"},
+        ], self.df.columns)
+        self.assertEqual([spec.name for spec in specs], ["sum_Sales", "avg_Sales", "count_Sales"])
+        # Numeric operations on a column share one coerced copy
+        self.assertEqual(specs[0].source, specs[1].source)
+        self.assertNotEqual(specs[0].source, specs[2].source)
+        self.assertEqual(percentile_of("p95"), 0.95)
+        self.assertIsNone(percentile_of("p100"))
+
+    def test_skipped_metrics_are_named(self):
+        metrics = [
+            {"column": "Sales", "operation": "sum"},
+            {"column": "Sales", "operation": "variance"},
+            {"column": "Missing", "operation": "sum"},
+        ]
+        self.assertEqual(unresolved_metrics(metrics, self.df.columns), [
+            "Skipped metric variance(Sales): unsupported operation 'variance'",
+            "Skipped metric sum(Missing): unknown column 'Missing'",
+        ])
+
+    def test_grouped_metrics_on_one_column(self):
+        plan = {
+            "metrics": [
+                {"column": "Sales", "operation": op} for op in ("sum", "avg", "median", "p90", "count")
+            ] + [{"column": "Customer", "operation": "count_distinct"}],
+            "group_by": ["Region"],
+            "sort": {"column": "Sales", "order": "desc"},
+        }
+        rows = self.engine._handle_aggregation(self.df, plan)
+        self.assertEqual(list(rows[0]), [
+            "Region", "sum_Sales", "avg_Sales", "median_Sales", "p90_Sales", "count_Sales", "count_distinct_Customer"
+        ])
+        # Sorted by the first metric on Sales
+        east, west = rows
+        self.assertEqual(east["Region"], "East")
+        self.assertEqual((east["sum_Sales"], east["avg_Sales"], east["median_Sales"]), (90.0, 30.0, 30.0))
+        self.assertAlmostEqual(east["p90_Sales"], 46.0)
+        self.assertEqual(east["count_distinct_Customer"], 2)
+        # "n/a" is not a number but is still a row
+        self.assertEqual((west["sum_Sales"], west["count_Sales"]), (20.0, 2))
+
+    def test_scalar_metrics(self):
+        plan = {"metrics": [
+            {"column": "Sales", "operation": "p50"},
+            {"column": "Sales", "operation": "max"},
+            {"column": "Sales", "operation": "p25"},
+            {"column": "Customer", "operation": "count_distinct"},
+        ]}
+        result = self.engine._handle_aggregation(self.df, plan)
+        self.assertEqual(result, {"p50_Sales": 25.0, "max_Sales": 50.0, "p25_Sales": 17.5, "count_distinct_Customer": 4})
+        self.assertIsInstance(result["count_distinct_Customer"], int)
+
+    def test_min_max_of_text_and_dates(self):
+        df = pd.DataFrame({
+            "Region": ["East", "West", "East", "West"],
+            "Name": ["m", "z", "a", None],
+            "Day": pd.to_datetime(["2024-01-05", "2024-03-01", None, "2024-02-01"]),
+            "Sales": [1, 2, 3, 4],
+        })
+        metrics = [{"column": col, "operation": op} for col in ("Name", "Day") for op in ("min", "max")]
+        metrics.append({"column": "Sales", "operation": "sum"})
+
+        scalar = self.engine._handle_aggregation(df, {"metrics": metrics})
+        self.assertEqual(scalar, {
+            "min_Name": "a", "max_Name": "z", "min_Day": "2024-01-05T00:00:00", "max_Day": "2024-03-01T00:00:00", "sum_Sales": 10
+        })
+        east, west = self.engine._handle_aggregation(df, {"metrics": metrics, "group_by": ["Region"]})
+        self.assertEqual((east["min_Name"], east["max_Name"], west["max_Name"]), ("a", "m", "z"))
+        self.assertEqual((east["max_Day"], west["min_Day"]), ("2024-01-05T00:00:00", "2024-02-01T00:00:00"))
+        # Mostly numeric text is still compared as numbers
+        self.assertEqual(self.engine._handle_aggregation(self.df, {"metrics": [{"column": "Sales", "operation": "min"}], "group_by": ["Region"]})[1]["min_Sales"], 20.0)
+
+    def test_count_is_non_null_values_grouped_or_not(self):
+        df = self.df.assign(Sales=[10.0, None, 30.0, 40.0, None])
+        metrics = [{"column": "Sales", "operation": "count"}]
+        scalar = self.engine._handle_aggregation(df, {"metrics": metrics})
+        grouped = self.engine._handle_aggregation(df, {"metrics": metrics, "group_by": ["Region"]})
+        self.assertEqual(scalar, {"count_Sales": 3})
+        self.assertEqual(sum(row["count_Sales"] for row in grouped), 3)
+
+    def test_matches_pandas_on_larger_data(self):
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({"g": rng.integers(0, 20, 5000), "v": rng.normal(size=5000)})
+        plan = {"metrics": [{"column": "v", "operation": op} for op in ("min", "p10", "p99")], "group_by": ["g"]}
+        result = self.engine._handle_aggregation(df, plan, as_frame=True).set_index("g")
+        grouped = df.groupby("g")["v"]
+        np.testing.assert_allclose(result["min_v"], grouped.min())
+        np.testing.assert_allclose(result["p10_v"], grouped.quantile(0.1))
+        np.testing.assert_allclose(result["p99_v"], grouped.quantile(0.99))
+
+
+if __name__ == "__main__":
+    unittest.main()
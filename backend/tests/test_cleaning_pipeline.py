@@ -0,0 +1,119 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.data_ingestion as data_ingestion
+import services.dashboard_cache as dashboard_cache
+from services.cleaning_pipeline import apply_operations
+from services.data_ingestion import DataIngestionService
+
+
+def eager_clean(df, operations):
+    """Reference: the original step-by-step cleaning on a deep copy."""
+    df_clean = df.copy()
+    for op in operations:
+        action, column, value = op.get("action"), op.get("column"), op.get("value")
+        if action == "DROP_NULLS":
+            df_clean.dropna(subset=[column] if column else None, inplace=True)
+        elif action == "FILL_NULLS":
+            if value == "mean":
+                value = df_clean[column].mean()
+            elif value == "median":
+                value = df_clean[column].median()
+            elif value == "mode":
+                value = df_clean[column].mode()[0]
+            df_clean[column] = df_clean[column].fillna(value)
+        elif action == "DROP_DUPLICATES":
+            df_clean.drop_duplicates(inplace=True)
+        elif action == "RENAME_COLUMN":
+            df_clean.rename(columns={column: value}, inplace=True)
+    return df_clean.reset_index(drop=True)
+
+
+class TestCleaningPipeline(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            "city": ["A", "B", None, "A", "B", "A", None],
+            "sales": [1.0, 2.0, np.nan, 1.0, 7.0, 1.0, 5.0],
+            "units": [1, 2, 3, 1, 2, 1, 3],
+        })
+
+    def test_matches_eager_cleaning(self):
+        operations = [
+            {"action": "DROP_NULLS", "column": "city"},
+            {"action": "FILL_NULLS", "column": "sales", "value": "median"},
+            {"action": "DROP_DUPLICATES"},
+            {"action": "RENAME_COLUMN", "column": "units", "value": "qty"},
+        ]
+        result = apply_operations(self.df, operations)
+        pd.testing.assert_frame_equal(result, eager_clean(self.df, operations))
+
+    def test_fill_before_drop_sees_all_rows(self):
+        operations = [
+            {"action": "FILL_NULLS", "column": "city", "value": "mode"},
+            {"action": "DROP_DUPLICATES"},
+            {"action": "DROP_NULLS"},
+        ]
+        result = apply_operations(self.df, operations)
+        pd.testing.assert_frame_equal(result, eager_clean(self.df, operations))
+
+    def test_base_frame_is_not_modified(self):
+        original = self.df.copy()
+        apply_operations(self.df, [
+            {"action": "FILL_NULLS", "column": "sales", "value": 0},
+            {"action": "RENAME_COLUMN", "column": "city", "value": "town"},
+        ])
+        pd.testing.assert_frame_equal(self.df, original)
+
+    def test_failing_operation_is_skipped(self):
+        result = apply_operations(self.df, [
+            {"action": "DROP_NULLS", "column": "missing"},
+            {"action": "DROP_DUPLICATES"},
+        ])
+        pd.testing.assert_frame_equal(result, self.df.drop_duplicates().reset_index(drop=True))
+
+
+class TestDerivedDatasets(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self._dirs = (data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR)
+        data_ingestion.UPLOAD_DIR = os.path.join(self.tmp, "original")
+        data_ingestion.PROCESSED_DIR = os.path.join(self.tmp, "processed")
+        dashboard_cache.DATA_DIR = self.tmp
+        os.makedirs(os.path.join(data_ingestion.UPLOAD_DIR, "u1"))
+        pd.DataFrame({"a": [1, 1, None], "b": ["x", "x", "y"]}).to_csv(
+            os.path.join(data_ingestion.UPLOAD_DIR, "u1", "f1.csv"), index=False
+        )
+        self.service = DataIngestionService()
+
+    def tearDown(self):
+        data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR = self._dirs
+        shutil.rmtree(self.tmp)
+
+    def test_derived_dataset_is_applied_on_load(self):
+        self.service.save_derived_dataset("f1_cleaned", "f1", [{"action": "DROP_DUPLICATES"}], "u1")
+        self.assertEqual(len(self.service.load_dataset("f1_cleaned", "u1")), 2)
+        # The parent keeps its own data
+        self.assertEqual(len(self.service.load_dataset("f1", "u1")), 3)
+
+    def test_materialized_dataset_matches_derived(self):
+        self.service.save_derived_dataset("f1_cleaned", "f1", [{"action": "DROP_NULLS"}], "u1")
+        derived = self.service.load_dataset("f1_cleaned", "u1")
+        self.service.materialize("f1_cleaned", "u1")
+        path = os.path.join(data_ingestion.PROCESSED_DIR, "u1", "f1_cleaned.parquet")
+        pd.testing.assert_frame_equal(pd.read_parquet(path), derived)
+
+    def test_derived_dataset_ids_are_immutable(self):
+        self.service.save_derived_dataset("f1_cleaned", "f1", [{"action": "DROP_NULLS"}], "u1")
+        with self.assertRaises(FileExistsError):
+            self.service.save_derived_dataset("f1_cleaned", "f1", [{"action": "DROP_DUPLICATES"}], "u1")
+        self.assertEqual(len(self.service.load_dataset("f1_cleaned", "u1")), 2)
+
+if __name__ == "__main__":
+    unittest.main()
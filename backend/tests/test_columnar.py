@@ -0,0 +1,68 @@
+import json
+import os
+import sys
+import unittest
+import pandas as pd
+import pyarrow as pa
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.columnar import ARROW, COLUMNAR, JSON, encode, negotiate
+
+
+def read_streams(body: bytes):
+    """(header metadata, [tables]) of an encoded Arrow response."""
+    source = pa.BufferReader(body)
+    header = pa.ipc.open_stream(source).read_all().schema.metadata
+    tables = []
+    while source.tell() < len(body):
+        tables.append(pa.ipc.open_stream(source).read_all())
+    return header, tables
+
+
+class TestColumnar(unittest.TestCase):
+    def setUp(self):
+        self.report = {
+            "title": "Sales",
+            "tiles": [
+                {"tile_id": "t1", "data": [{"region": "East", "sum_Sales": 10}, {"region": "West", "sum_Sales": 2.5}]},
+                {"tile_id": "t2", "data": {"Total": 12.5}},
+                {"tile_id": "t3", "data": [{"mixed": 1}, {"mixed": "text"}]},
+            ],
+        }
+
+    def test_negotiation(self):
+        self.assertEqual(negotiate(None), JSON)
+        self.assertEqual(negotiate("*/*"), JSON)
+        self.assertEqual(negotiate("application/json; format=columnar"), COLUMNAR)
+        self.assertEqual(negotiate("application/vnd.apache.arrow.stream, application/json;q=0.5"), ARROW)
+        self.assertEqual(negotiate("application/vnd.apache.arrow.stream;q=0.2, application/json"), JSON)
+
+    def test_columnar_json(self):
+        body, media_type = encode(self.report, COLUMNAR)
+        document = json.loads(body)
+        self.assertEqual(media_type, "application/json; format=columnar")
+        self.assertEqual(document["tiles"][0]["data"], {"columns": ["region", "sum_Sales"], "data": [["East", "West"], [10, 2.5]]})
+        self.assertEqual(document["tiles"][1]["data"], {"Total": 12.5})
+
+    def test_arrow_streams_carry_document_and_tables(self):
+        frame = pd.DataFrame({"n": [1, 2], "label": ["a", None]})
+        body, media_type = encode({"chart_data": None, "report": self.report}, ARROW, {"/chart_data": frame})
+        self.assertEqual(media_type, "application/vnd.apache.arrow.stream")
+
+        header, tables = read_streams(body)
+        document = json.loads(header[b"document"])
+        pointers = json.loads(header[b"tables"])
+        self.assertEqual(pointers, ["/chart_data", "/report/tiles/0/data"])
+        self.assertEqual([table.schema.metadata[b"pointer"].decode() for table in tables], pointers)
+
+        self.assertEqual(tables[0].to_pylist(), [{"n": 1, "label": "a"}, {"n": 2, "label": None}])
+        self.assertEqual(tables[1].column("sum_Sales").to_pylist(), [10.0, 2.5])
+        self.assertIsNone(document["chart_data"])
+        self.assertIsNone(document["report"]["tiles"][0]["data"])
+        # Arrow cannot type a column mixing numbers and text: that table stays inline
+        self.assertEqual(document["report"]["tiles"][2]["data"], [{"mixed": 1}, {"mixed": "text"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.csv_reader as csv_reader
+from services.csv_reader import read_csv, sniff_csv
+
+
+class TestCsvReader(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, content: bytes) -> str:
+        path = os.path.join(self.tmp, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def assert_matches_pandas(self, path, **read_csv_kwargs):
+        expected = pd.read_csv(path, **read_csv_kwargs)
+        df, hints = read_csv(path)
+        pd.testing.assert_frame_equal(df, expected)
+        # A second parse with the recorded hints gives the same frame
+        hinted, _ = read_csv(path, hints)
+        pd.testing.assert_frame_equal(hinted, expected)
+        return hints
+
+    def test_matches_c_engine(self):
+        path = self.write("mixed.csv", (
+            b'date,stamp,qty,price,name,empty,flag\n'
+            b'2024-01-01,2024-01-01T10:00,1,2.5,"a, b",,True\n'
+            b'2024-01-02,2024-01-02T11:30,2,NA,,,False\n'
+            b'2024-01-03,2024-01-03T12:45,3,4,c,,true\n'
+        ))
+        hints = self.assert_matches_pandas(path)
+        self.assertEqual(hints["date"]["kind"], "datetime")
+        self.assertEqual(hints["qty"], {"dtype": "int64"})
+
+    def test_sniffs_delimiter_and_encoding(self):
+        path = self.write("semicolon.csv", "city;amount\nZürich;1\nKöln;2\n".encode("cp1252"))
+        self.assertEqual(sniff_csv(path), {"encoding": "cp1252", "delimiter": ";"})
+        self.assert_matches_pandas(path, sep=";", encoding="cp1252")
+
+        path = self.write("bom.csv", b"\xef\xbb\xbfa,b\n1,2\n")
+        self.assertEqual(sniff_csv(path)["encoding"], "utf-8-sig")
+        self.assertEqual(read_csv(path)[0].columns.tolist(), ["a", "b"])
+
+    def test_late_bad_byte_falls_back_once(self):
+        rows = b"".join(b"%d,x\n" % i for i in range(60000))
+        path = self.write("late.csv", b"id,text\n" + rows + b"60000,caf\xe9\n")
+        self.assertEqual(sniff_csv(path)["encoding"], "utf-8")
+        df, _ = read_csv(path)
+        self.assertEqual(df["text"].iloc[-1], "café")
+
+    def test_duplicate_headers_use_c_engine(self):
+        path = self.write("dupes.csv", b"a,a,\n1,2,3\n")
+        self.assertEqual(read_csv(path)[0].columns.tolist(), ["a", "a.1", "Unnamed: 2"])
+
+    def test_without_pyarrow(self):
+        path = self.write("plain.csv", b"a,b\n1,x\n2,\n")
+        saved = csv_reader.pa_csv
+        csv_reader.pa_csv = None
+        try:
+            self.assert_matches_pandas(path)
+        finally:
+            csv_reader.pa_csv = saved
+
+
+if __name__ == "__main__":
+    unittest.main()
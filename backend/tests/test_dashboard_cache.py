@@ -0,0 +1,161 @@
+import os
+import sys
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+import pandas as pd
+from fastapi.testclient import TestClient
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "test")
+
+import app as app_module
+import services.data_ingestion as data_ingestion
+import services.dashboard_cache as dashboard_cache
+from services.dashboard_cache import DashboardCache, VersionCache
+from services.data_ingestion import DataIngestionService
+
+
+class StubLLM:
+    """Dashboard plans and stories without a provider; counts the calls."""
+    model = "stub"
+    provider = "stub"
+
+    def __init__(self):
+        self.plan_calls = 0
+        self.stories = []
+        self.metric = "sum"
+
+    async def get_dashboard_plan(self, summary):
+        self.plan_calls += 1
+        return {"dashboard": {
+            "kpis": [{"title": "Sales", "metric": {"column": "sales", "operation": self.metric}}],
+            "trends": [],
+            "distributions": [{"title": "By region", "chart_type": "bar", "x": "region", "y": {"column": "sales", "operation": self.metric}}],
+            "data_health": {"include": False},
+        }}
+
+    async def get_data_story(self, context):
+        self.stories.append(context)
+        return {"story": "Sales are up."}
+
+
+class TestDashboardCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self._saved = (data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR)
+        data_ingestion.UPLOAD_DIR = os.path.join(self.tmp, "original")
+        data_ingestion.PROCESSED_DIR = os.path.join(self.tmp, "processed")
+        dashboard_cache.DATA_DIR = self.tmp
+        os.makedirs(os.path.join(data_ingestion.UPLOAD_DIR, "u1"))
+        self.writes = 0
+        self.write_dataset([10, 20, 30, 40])
+
+        self.llm = StubLLM()
+        patcher = mock.patch.object(app_module, "llm_client", self.llm)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        app_module.app.dependency_overrides[app_module.get_current_user] = lambda: {"sub": "u1"}
+        self.addCleanup(app_module.app.dependency_overrides.clear)
+        self.client = TestClient(app_module.app)
+
+    def tearDown(self):
+        data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR = self._saved
+        shutil.rmtree(self.tmp)
+
+    def write_dataset(self, sales):
+        path = os.path.join(data_ingestion.UPLOAD_DIR, "u1", "f1.csv")
+        pd.DataFrame({"region": ["East", "West", "East", "West"], "sales": sales}).to_csv(path, index=False)
+        # The dataset version changes with the file's mtime and size
+        self.writes += 1
+        mtime = time.time() + self.writes
+        os.utime(path, (mtime, mtime))
+
+    def overview(self):
+        response = self.client.get("/api/v1/dashboard/overview", params={"file_id": "f1"})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_entries_are_keyed_by_version_and_plan(self):
+        cache = DashboardCache()
+        cache.put("u1", "f1", "v1", "plan-a", {"kpis": [{"title": "A"}]})
+        self.assertEqual(cache.get("u1", "f1", "v1", "plan-a"), {"kpis": [{"title": "A"}]})
+        self.assertIsNone(cache.get("u1", "f1", "v1", "plan-b"))
+        self.assertIsNone(cache.get("u1", "f1", "v2", "plan-a"))
+        self.assertIsNone(cache.get_latest("u1", "f1", "v2"))
+        # Errors are never cached
+        cache.put("u1", "f1", "v1", "plan-b", {"error": "boom"})
+        self.assertIsNone(cache.get("u1", "f1", "v1", "plan-b"))
+
+        # Other derived entries share the version directory, and go with it
+        versions = VersionCache()
+        versions.put_profile("u1", "f1", "v1", {"num_rows": 4})
+        self.assertEqual(cache.get_profile("u1", "f1", "v1"), {"num_rows": 4})
+        versions.prune("u1", "f1", keep_version="v2")
+        self.assertIsNone(cache.get_latest("u1", "f1", "v1"))
+        self.assertIsNone(versions.get_profile("u1", "f1", "v1"))
+
+    def test_entries_in_the_original_location_are_kept(self):
+        legacy = os.path.join(self.tmp, "u1", "dashboards", "f1", "v1")
+        os.makedirs(legacy)
+        with open(os.path.join(legacy, "latest.json"), "w") as f:
+            f.write('{"dashboard": {"kpis": []}}')
+
+        cache = DashboardCache()
+        self.assertEqual(cache.get_latest("u1", "f1", "v1"), {"kpis": []})
+        cache.put_profile("u1", "f1", "v1", {"num_rows": 4})
+        self.assertTrue(os.path.exists(os.path.join(self.tmp, "u1", "derived", "f1", "v1", "profile.json")))
+        self.assertEqual(cache.file_ids("u1"), ["f1"])
+        self.assertGreater(cache.size("u1"), 0)
+        cache.prune("u1", "f1", keep_version="v2")
+        self.assertIsNone(cache.get_latest("u1", "f1", "v1"))
+        self.assertFalse(os.listdir(os.path.join(self.tmp, "u1", "dashboards", "f1")))
+
+    def test_story_after_overview_reuses_dashboard_and_context(self):
+        dashboard = self.overview()
+        self.assertEqual(self.llm.plan_calls, 1)
+
+        with mock.patch.object(DataIngestionService, "load_dataset", side_effect=AssertionError("dataset scanned")), \
+                mock.patch.object(app_module.dashboard_service, "generate_dashboard_data") as execute, \
+                mock.patch.object(app_module.dashboard_service, "generate_fallback_dashboard") as fallback:
+            response = self.client.post("/api/v1/data-story", json={"file_id": "f1"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["story"], "Sales are up.")
+        self.assertEqual(self.llm.plan_calls, 1)
+        execute.assert_not_called()
+        fallback.assert_not_called()
+        context = self.llm.stories[0]
+        self.assertIn("4 rows", context["dataset_context"])
+        self.assertIn(dashboard["kpis"][0]["title"], context["kpis_context"])
+
+    def test_dataset_version_and_plan_change_the_key(self):
+        execute = mock.patch.object(
+            app_module.dashboard_service, "generate_dashboard_data",
+            wraps=app_module.dashboard_service.generate_dashboard_data
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+
+        first = self.overview()
+        self.overview()
+        # Same version and plan: executed once
+        self.assertEqual(execute.call_count, 1)
+
+        self.llm.metric = "avg"
+        self.overview()
+        self.assertEqual(execute.call_count, 2)
+
+        self.write_dataset([1, 2, 3, 4])
+        story_service = app_module.DataStoryService(self.llm)
+        self.assertIsNone(story_service.get_cached_dashboard("f1", "u1"))
+        self.llm.metric = "sum"
+        changed = self.overview()
+        self.assertEqual(execute.call_count, 3)
+        self.assertNotEqual(changed["kpis"][0]["value"], first["kpis"][0]["value"])
+        self.assertEqual(story_service.get_cached_dashboard("f1", "u1"), changed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import sys
+import unittest
+import numpy as np
+import pandas as pd
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.data_health import compute_data_health
+from services.sketches import HyperLogLog, hash_values
+
+
+class TestDataHealth(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            "city": ["A", "B", None, "A", "B", np.nan],
+            "sales": [1.0, 2.0, np.nan, 1.0, 3.0, np.nan],
+            "tags": [1, "x", None, 1, "y", None],
+        })
+
+    def test_matches_pandas(self):
+        health = compute_data_health(self.df)
+        self.assertEqual(health["total_rows"], 6)
+        self.assertEqual(health["duplicate_rows"], int(self.df.duplicated().sum()))
+        self.assertEqual(health["null_counts"], {k: int(v) for k, v in self.df.isnull().sum().items()})
+
+    def test_chunked_matches_single_pass(self):
+        whole = compute_data_health(self.df)
+        chunked = compute_data_health(self.df, chunk_rows=2)
+        self.assertEqual(whole, chunked)
+
+    def test_iterable_of_chunks(self):
+        chunks = [self.df.iloc[:3], self.df.iloc[3:]]
+        self.assertEqual(compute_data_health(chunks)["duplicate_rows"], 2)
+
+    def test_unhashable_cells_fall_back_to_strings(self):
+        df = pd.DataFrame({"a": [[1], [1], [2]]})
+        self.assertEqual(compute_data_health(df)["duplicate_rows"], 1)
+
+    def test_approximate_duplicates_within_error(self):
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({"v": rng.integers(0, 50_000, size=200_000)})
+        exact = int(df.duplicated().sum())
+        approx = compute_data_health(df, approximate_error=0.01)
+        self.assertTrue(approx["duplicate_rows_approximate"])
+        distinct = len(df) - exact
+        self.assertLess(abs(approx["duplicate_rows"] - exact), distinct * 0.05)
+        self.assertLessEqual(abs(approx["duplicate_rows"] - exact), approx["duplicate_rows_margin"])
+
+    def test_approximate_duplicates_within_margin_read_zero(self):
+        df = pd.DataFrame({"v": np.arange(200_000)})
+        approx = compute_data_health(df, approximate_error=0.01)
+        self.assertEqual(approx["duplicate_rows"], 0)
+        self.assertGreater(approx["duplicate_rows_margin"], 0)
+
+
+class TestHyperLogLog(unittest.TestCase):
+    def test_merge_equals_union(self):
+        a = pd.Series(np.arange(0, 30_000))
+        b = pd.Series(np.arange(20_000, 50_000))
+        left = HyperLogLog(error_rate=0.01).add(a)
+        right = HyperLogLog(error_rate=0.01).add(b)
+        union = HyperLogLog(error_rate=0.01).add_hashes(np.concatenate([hash_values(a), hash_values(b)]))
+        self.assertTrue(np.array_equal(left.merge(right).registers, union.registers))
+        self.assertLess(abs(union.count() - 50_000) / 50_000, 0.05)
+
+    def test_small_cardinality(self):
+        self.assertAlmostEqual(HyperLogLog().add(pd.Series([1, 2, 3, 3])).count(), 3, delta=0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
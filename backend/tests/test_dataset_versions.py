@@ -0,0 +1,83 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.data_ingestion as data_ingestion
+import services.dashboard_cache as dashboard_cache
+import services.dataset_versions as dataset_versions
+from services.data_ingestion import DataIngestionService
+from services.dataset_versions import DatasetVersionService
+
+
+class TestDatasetVersions(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self._saved = (data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR)
+        data_ingestion.UPLOAD_DIR = os.path.join(self.tmp, "original")
+        data_ingestion.PROCESSED_DIR = os.path.join(self.tmp, "processed")
+        dashboard_cache.DATA_DIR = self.tmp
+        os.makedirs(os.path.join(data_ingestion.UPLOAD_DIR, "u1"))
+        pd.DataFrame({"a": [1, 1, None, 4], "b": ["x", "x", "y", None]}).to_csv(
+            os.path.join(data_ingestion.UPLOAD_DIR, "u1", "f1.csv"), index=False
+        )
+        self.ingestion = DataIngestionService()
+        self.versions = DatasetVersionService(self.ingestion)
+
+    def tearDown(self):
+        data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR = self._saved
+        shutil.rmtree(self.tmp)
+
+    def test_each_cleaning_creates_a_new_version(self):
+        v1 = self.versions.create_version("f1", [{"action": "DROP_DUPLICATES"}], "u1")
+        v2 = self.versions.create_version("f1", [{"action": "DROP_NULLS"}], "u1")
+        self.assertEqual((v1, v2), ("f1_v1", "f1_v2"))
+        self.assertEqual(len(self.ingestion.load_dataset(v1, "u1")), 3)
+        self.assertEqual(len(self.ingestion.load_dataset(v2, "u1")), 2)
+
+        lineage = self.versions.list_versions(v2, "u1")
+        self.assertEqual([v.file_id for v in lineage], ["f1", "f1_v1", "f1_v2"])
+        self.assertEqual([v.parent for v in lineage], [None, "f1", "f1"])
+
+    def test_compare_chained_versions(self):
+        v1 = self.versions.create_version("f1", [{"action": "DROP_DUPLICATES"}], "u1")
+        v2 = self.versions.create_version(v1, [{"action": "RENAME_COLUMN", "column": "b", "value": "c"}], "u1")
+        self.assertTrue(v2.startswith("f1_v"))
+
+        comparison = self.versions.compare("f1", v2, "u1")
+        self.assertEqual(comparison.rows_removed, 1)
+        self.assertEqual(comparison.columns_added, ["c"])
+        self.assertEqual(comparison.columns_removed, ["b"])
+        self.assertEqual(comparison.null_changes, {"a": 0})
+        self.assertEqual([op["action"] for op in comparison.operations], ["DROP_DUPLICATES", "RENAME_COLUMN"])
+        self.assertIsNone(self.versions.compare(v2, "f1", "u1").operations)
+
+    def test_garbage_collection_keeps_versions_loadable(self):
+        v1 = self.versions.create_version("f1", [{"action": "DROP_NULLS"}], "u1")
+        self.versions.materialize(v1, "u1")
+        self.assertTrue(self.ingestion.is_materialized(v1, "u1"))
+
+        cache = self.versions.dashboards
+        cache.put("u1", "f1", "stale-version", "plan", {"charts": []})
+        current = self.ingestion.get_dataset_version("f1", "u1")
+        cache.put("u1", "f1", current, "plan", {"charts": []})
+
+        saved_budget = dataset_versions.DATASET_STORAGE_MB
+        dataset_versions.DATASET_STORAGE_MB = 0
+        try:
+            self.assertGreater(self.versions.collect_garbage("u1"), 0)
+        finally:
+            dataset_versions.DATASET_STORAGE_MB = saved_budget
+
+        self.assertFalse(self.ingestion.is_materialized(v1, "u1"))
+        self.assertIsNone(cache.get("u1", "f1", "stale-version", "plan"))
+        self.assertIsNotNone(cache.get("u1", "f1", current, "plan"))
+        self.assertEqual(len(self.ingestion.load_dataset(v1, "u1")), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
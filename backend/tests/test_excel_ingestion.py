@@ -0,0 +1,69 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.data_ingestion as data_ingestion
+import services.dashboard_cache as dashboard_cache
+from services.data_ingestion import DataIngestionService
+
+
+class TestExcelIngestion(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self._saved = (data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR)
+        data_ingestion.UPLOAD_DIR = os.path.join(self.tmp, "original")
+        data_ingestion.PROCESSED_DIR = os.path.join(self.tmp, "processed")
+        dashboard_cache.DATA_DIR = self.tmp
+        os.makedirs(os.path.join(data_ingestion.UPLOAD_DIR, "u1"))
+
+        self.path = os.path.join(data_ingestion.UPLOAD_DIR, "u1", "wb.xlsx")
+        self.sales = pd.DataFrame({
+            "region": ["North", "South", None],
+            "amount": [1.5, 2.0, 3.25],
+            "code": [1, "A-2", None],
+        })
+        with pd.ExcelWriter(self.path) as writer:
+            self.sales.to_excel(writer, sheet_name="Sales", index=False)
+            pd.DataFrame({"k": ["a", "b"]}).to_excel(writer, sheet_name="Lookup", index=False)
+        self.service = DataIngestionService()
+
+    def tearDown(self):
+        data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR = self._saved
+        shutil.rmtree(self.tmp)
+
+    def test_sheets_are_converted_once(self):
+        sheets = self.service.convert_workbook("wb", "u1")
+        self.assertEqual([(s["name"], s["file_id"]) for s in sheets], [("Sales", "wb"), ("Lookup", "wb_sheet2")])
+
+        # The query path never opens the workbook again
+        with mock.patch("pandas.ExcelFile", side_effect=AssertionError("workbook reopened")):
+            sales = self.service.load_dataset("wb", "u1")
+            lookup = self.service.load_dataset("wb_sheet2", "u1")
+
+        expected = pd.read_excel(self.path)
+        pd.testing.assert_frame_equal(sales[["region", "amount"]], expected[["region", "amount"]])
+        self.assertEqual(sales["code"].tolist()[:2], ["1", "A-2"])
+        self.assertEqual(lookup["k"].tolist(), ["a", "b"])
+
+    def test_metadata_lists_sheets(self):
+        self.service.convert_workbook("wb", "u1")
+        metadata = self.service.get_metadata("wb_sheet2", "u1")
+        self.assertEqual(metadata.sheet_name, "Lookup")
+        self.assertEqual([s.file_id for s in metadata.sheets], ["wb", "wb_sheet2"])
+        self.assertEqual(metadata.sheets[0].rows, 3)
+
+    def test_legacy_workbook_is_converted_on_first_load(self):
+        df = self.service.load_dataset("wb", "u1")
+        self.assertEqual(len(df), 3)
+        self.assertTrue(os.path.exists(os.path.join(data_ingestion.PROCESSED_DIR, "u1", "wb_sheet2.parquet")))
+        self.assertTrue(self.service.resolve_path("wb", "u1").endswith(".parquet"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+import asyncio
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.job_queue import JobQueue
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp, "jobs.db")
+        self.calls = []
+        self.release = None
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def make_queue(self, **options) -> JobQueue:
+        queue = JobQueue(self.db_path, **options)
+
+        async def handler(file_id, user_id, params):
+            self.calls.append((user_id, file_id))
+            if self.release is not None:
+                await self.release.wait()
+            return {"file_id": file_id, "params": params}
+
+        queue.register("report", handler)
+        queue.register("other", handler)
+        return queue
+
+    def test_identical_active_jobs_are_deduplicated(self):
+        async def run():
+            self.release = asyncio.Event()
+            queue = self.make_queue()
+            await queue.start()
+            first = await queue.submit("u1", "report", "f1")
+            again = await queue.submit("u1", "report", "f1")
+            other_kind = await queue.submit("u1", "other", "f1")
+            other_user = await queue.submit("u2", "report", "f1")
+            self.release.set()
+            await asyncio.sleep(0.05)
+            after = await queue.submit("u1", "report", "f1")
+            await asyncio.sleep(0.05)
+            await queue.stop()
+            return first, again, other_kind, other_user, after
+
+        first, again, other_kind, other_user, after = asyncio.run(run())
+        self.assertEqual(again["job_id"], first["job_id"])
+        self.assertEqual(len({first["job_id"], other_kind["job_id"], other_user["job_id"]}), 3)
+        # Once the first job finished, the same submission starts new work
+        self.assertNotEqual(after["job_id"], first["job_id"])
+        self.assertEqual(len(self.calls), 4)
+
+    def test_per_user_concurrency_limit(self):
+        async def run():
+            self.release = asyncio.Event()
+            queue = self.make_queue(max_concurrency=4, per_user_limit=1)
+            await queue.start()
+            a = await queue.submit("u1", "report", "f1")
+            b = await queue.submit("u1", "report", "f2")
+            c = await queue.submit("u2", "report", "f1")
+            await asyncio.sleep(0.01)
+            statuses = [queue.get(job["job_id"], user)["status"] for job, user in ((a, "u1"), (b, "u1"), (c, "u2"))]
+            self.release.set()
+            await asyncio.sleep(0.05)
+            final = queue.get(b["job_id"], "u1")["status"]
+            await queue.stop()
+            return statuses, final
+
+        statuses, final = asyncio.run(run())
+        self.assertEqual(statuses, ["running", "queued", "running"])
+        self.assertEqual(final, "succeeded")
+
+    def test_cancel_queued_and_running_jobs(self):
+        async def run():
+            self.release = asyncio.Event()
+            queue = self.make_queue(per_user_limit=1)
+            await queue.start()
+            running = await queue.submit("u1", "report", "f1")
+            queued = await queue.submit("u1", "report", "f2")
+            await asyncio.sleep(0.01)
+            self.assertIsNone(await queue.cancel(running["job_id"], "u2"))
+            cancelled = [await queue.cancel(job["job_id"], "u1") for job in (queued, running)]
+            await asyncio.sleep(0.01)
+            await queue.stop()
+            return cancelled
+
+        cancelled = asyncio.run(run())
+        self.assertEqual([job["status"] for job in cancelled], ["cancelled", "cancelled"])
+        # The queued job never ran
+        self.assertEqual(self.calls, [("u1", "f1")])
+
+    def test_restart_requeues_unfinished_jobs(self):
+        async def interrupted():
+            self.release = asyncio.Event()
+            queue = self.make_queue()
+            await queue.start()
+            job = await queue.submit("u1", "report", "f1", {"x": 1})
+            await asyncio.sleep(0.01)
+            await queue.stop()
+            return job
+
+        async def restarted(job_id):
+            self.release = None
+            queue = self.make_queue()
+            await queue.start()
+            await asyncio.sleep(0.05)
+            result = queue.get_result(job_id, "u1")
+            await queue.stop()
+            return result
+
+        job = asyncio.run(interrupted())
+        result = asyncio.run(restarted(job["job_id"]))
+        self.assertEqual(result["status"], "succeeded")
+        self.assertEqual(result["result"], {"file_id": "f1", "params": {"x": 1}})
+        self.assertEqual(self.calls, [("u1", "f1"), ("u1", "f1")])
+
+    def test_results_are_stored_and_not_recomputed(self):
+        async def run():
+            queue = self.make_queue()
+            await queue.start()
+            job = await queue.submit("u1", "report", "f1")
+            await asyncio.sleep(0.05)
+            results = [queue.get_result(job["job_id"], "u1") for _ in range(3)]
+            await queue.stop()
+            return results
+
+        results = asyncio.run(run())
+        self.assertEqual(len(self.calls), 1)
+        self.assertTrue(all(r["result"] == {"file_id": "f1", "params": {}} for r in results))
+
+    def test_finished_jobs_expire(self):
+        async def run():
+            self.release = asyncio.Event()
+            queue = self.make_queue(retention_seconds=3600)
+            await queue.start()
+            done = await queue.submit("u1", "report", "f1")
+            active = await queue.submit("u1", "report", "f2")
+            await asyncio.sleep(0.01)
+            # Backdate both rows; only the finished one may be purged
+            stale = (datetime.now() - timedelta(hours=2)).isoformat()
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute("UPDATE jobs SET status = 'succeeded', result = '{}', finished_at = ? WHERE job_id = ?", (stale, done["job_id"]))
+                conn.execute("UPDATE jobs SET finished_at = ? WHERE job_id = ?", (stale, active["job_id"]))
+            conn.close()
+            purged = queue.purge_expired()
+            remaining = (queue.get_result(done["job_id"], "u1"), queue.get(active["job_id"], "u1"))
+            self.release.set()
+            await queue.stop()
+            return purged, remaining
+
+        purged, (done, active) = asyncio.run(run())
+        self.assertEqual(purged, 1)
+        self.assertIsNone(done)
+        self.assertIsNotNone(active)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import sys
+import json
+import logging
+import unittest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logging_config import JsonFormatter, RequestContextFilter, RequestLoggingMiddleware, SamplingFilter
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.addFilter(RequestContextFilter())
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestLoggingConfig(unittest.TestCase):
+    def setUp(self):
+        self.handler = ListHandler()
+        self.loggers = [logging.getLogger("app.access"), logging.getLogger("tests.endpoint")]
+        for logger in self.loggers:
+            logger.addHandler(self.handler)
+            logger.setLevel(logging.INFO)
+
+    def tearDown(self):
+        for logger in self.loggers:
+            logger.removeHandler(self.handler)
+
+    def test_request_ids_reach_records_and_responses(self):
+        app = FastAPI()
+        app.add_middleware(RequestLoggingMiddleware, slow_request_ms=10_000)
+
+        @app.get("/work")
+        def work():
+            logging.getLogger("tests.endpoint").info("working", extra={"rows": 3})
+            return {"ok": True}
+
+        client = TestClient(app)
+        response = client.get("/work", headers={"X-Request-ID": "abc-123"})
+        self.assertEqual(response.headers["x-request-id"], "abc-123")
+        work_record, access = self.handler.records
+        self.assertEqual((work_record.request_id, work_record.rows), ("abc-123", 3))
+        self.assertEqual((access.request_id, access.status, access.sampled), ("abc-123", 200, True))
+
+        # Unusable ids are replaced; failures are never sampled away
+        response = client.get("/missing", headers={"X-Request-ID": "bad id\n"})
+        self.assertNotEqual(response.headers["x-request-id"], "bad id\n")
+        self.assertEqual(self.handler.records[-1].request_id, response.headers["x-request-id"])
+
+    def test_sampling_and_json_format(self):
+        drop_all = SamplingFilter(0.0)
+        sampled = logging.makeLogRecord({"levelno": logging.INFO, "msg": "GET /", "sampled": True})
+        warning = logging.makeLogRecord({"levelno": logging.WARNING, "msg": "slow", "sampled": True})
+        plain = logging.makeLogRecord({"levelno": logging.INFO, "msg": "started"})
+        self.assertFalse(drop_all.filter(sampled))
+        self.assertTrue(drop_all.filter(warning))
+        self.assertTrue(drop_all.filter(plain))
+        self.assertTrue(SamplingFilter(1.0).filter(sampled))
+
+        record = logging.makeLogRecord({"name": "app", "levelname": "INFO", "msg": "saved %s", "args": ("f1",),
+                                        "request_id": "r1", "rows": 3})
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual((entry["message"], entry["request_id"], entry["rows"]), ("saved f1", "r1", 3))
+        self.assertNotIn("args", entry)
+
+
+if __name__ == "__main__":
+    unittest.main()
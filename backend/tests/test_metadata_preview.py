@@ -0,0 +1,109 @@
+import asyncio
+import io
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+import pandas as pd
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.data_ingestion as data_ingestion
+import services.dashboard_cache as dashboard_cache
+from services.csv_reader import CsvRowIndex, read_csv_rows
+from services.data_ingestion import DataIngestionService
+
+
+CSV = (
+    b'id,note,amount\r\n'
+    b'1,"multi\nline",1.5\r\n'
+    b'\r\n'
+    b'2,"say ""hi""",2\r\n'
+    b'3,plain,\r\n'
+    + b''.join(b'%d,row %d,%d\n' % (i, i, i) for i in range(4, 40))
+    + b'40,"last\r\nrow",40'
+)
+
+
+class TestCsvRowIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "rows.csv")
+        with open(self.path, "wb") as f:
+            f.write(CSV)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_counts_rows_like_pandas_across_chunk_boundaries(self):
+        expected = len(pd.read_csv(self.path))
+        for chunk_size in (1, 3, 7, len(CSV)):
+            index = CsvRowIndex(stride=4)
+            for start in range(0, len(CSV), chunk_size):
+                index.feed(CSV[start:start + chunk_size])
+            result = index.result()
+            self.assertEqual(result["rows"], expected)
+            self.assertEqual(len(result["offsets"]), (expected + 3) // 4)
+
+    def test_read_rows_from_the_index(self):
+        expected = pd.read_csv(self.path)
+        index = CsvRowIndex(stride=4)
+        index.feed(CSV)
+        row_index = index.result()
+        for offset in (0, 1, 5, 17, 38, 45):
+            rows = read_csv_rows(self.path, offset, 3, row_index=row_index)
+            pd.testing.assert_frame_equal(
+                rows, expected.iloc[offset:offset + 3].reset_index(drop=True), check_dtype=False
+            )
+
+
+class TestMetadataPreview(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self._saved = (data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR)
+        data_ingestion.UPLOAD_DIR = os.path.join(self.tmp, "original")
+        data_ingestion.PROCESSED_DIR = os.path.join(self.tmp, "processed")
+        dashboard_cache.DATA_DIR = self.tmp
+        self.ingestion = DataIngestionService()
+        self.frame = pd.DataFrame({"n": range(1000), "label": [f"r{i}" for i in range(1000)]})
+
+    def tearDown(self):
+        data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR = self._saved
+        shutil.rmtree(self.tmp)
+
+    def upload(self, filename: str, content: bytes) -> str:
+        file = SimpleNamespace(filename=filename, file=io.BytesIO(content))
+        file_id, _ = asyncio.run(self.ingestion.save_upload(file, "u1"))
+        return file_id
+
+    def test_csv_metadata_reads_only_a_prefix_and_the_page(self):
+        file_id = self.upload("data.csv", self.frame.to_csv(index=False).encode())
+        with mock.patch.object(data_ingestion, "PREVIEW_SAMPLE_ROWS", 10), \
+                mock.patch.object(DataIngestionService, "load_dataset", side_effect=AssertionError("full load")):
+            metadata = self.ingestion.get_metadata(file_id, "u1")
+            page = self.ingestion.get_metadata(file_id, "u1", offset=500, limit=3)
+
+        self.assertEqual((metadata.rows, metadata.column_names), (1000, ["n", "label"]))
+        self.assertEqual(metadata.dtypes["n"], "int64")
+        self.assertEqual([row["n"] for row in metadata.preview], [0, 1, 2, 3, 4])
+        self.assertEqual(page.preview_offset, 500)
+        self.assertEqual(page.preview, [{"n": 500, "label": "r500"}, {"n": 501, "label": "r501"}, {"n": 502, "label": "r502"}])
+
+    def test_parquet_metadata_reads_only_overlapping_row_groups(self):
+        os.makedirs(os.path.join(data_ingestion.PROCESSED_DIR, "u1"))
+        self.frame.to_parquet(os.path.join(data_ingestion.PROCESSED_DIR, "u1", "p1.parquet"), index=False, row_group_size=100)
+        with mock.patch.object(DataIngestionService, "load_dataset", side_effect=AssertionError("full load")):
+            page = self.ingestion.get_metadata("p1", "u1", offset=398, limit=4)
+            past_end = self.ingestion.get_metadata("p1", "u1", offset=5000, limit=4)
+
+        self.assertEqual(page.rows, 1000)
+        self.assertEqual([row["n"] for row in page.preview], [398, 399, 400, 401])
+        self.assertEqual(past_end.preview, [])
+        self.assertEqual(past_end.column_names, ["n", "label"])
+
+
+if __name__ == "__main__":
+    unittest.main()
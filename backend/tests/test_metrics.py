@@ -0,0 +1,63 @@
+import os
+import sys
+import unittest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.metrics import LlmCall, MetricsMiddleware, plan_query_type
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestMetrics(unittest.TestCase):
+    def test_llm_call_records_latency_tokens_and_outcome(self):
+        with LlmCall("test", "model-a") as call:
+            call.usage(120, 30)
+        with self.assertRaises(RuntimeError):
+            with LlmCall("test", "model-a"):
+                raise RuntimeError("boom")
+
+        self.assertEqual(sample("llm_tokens_total", provider="test", model="model-a", kind="prompt"), 120)
+        self.assertEqual(sample("llm_tokens_total", provider="test", model="model-a", kind="completion"), 30)
+        for outcome in ("ok", "error"):
+            count = sample("llm_request_seconds_count", provider="test", model="model-a", call="generate", outcome=outcome)
+            self.assertEqual(count, 1)
+
+    def test_plan_query_type_bounds_the_label(self):
+        self.assertEqual(plan_query_type({"query_type": "filter"}), "filter")
+        self.assertEqual(plan_query_type({}), "metadata")
+        self.assertEqual(plan_query_type({"query_type": "drop table"}), "unknown")
+
+    def test_middleware_labels_requests_by_route_template(self):
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+
+        @app.api_route("/items/{item_id}", methods=["GET", "PURGE"])
+        def item(item_id: str):
+            return {"id": item_id}
+
+        def count(method, route, status):
+            return sample("http_request_duration_seconds_count", method=method, route=route, status=status)
+
+        before = {key: count(*key) for key in (("GET", "/items/{item_id}", "200"), ("GET", "unmatched", "404"), ("other", "/items/{item_id}", "200"))}
+        client = TestClient(app)
+        for item_id in ("a", "b"):
+            self.assertEqual(client.get(f"/items/{item_id}").status_code, 200)
+        self.assertEqual(client.get("/missing").status_code, 404)
+        # Methods outside the standard set share one label
+        self.assertEqual(client.request("PURGE", "/items/a").status_code, 200)
+
+        self.assertEqual(count("GET", "/items/{item_id}", "200") - before[("GET", "/items/{item_id}", "200")], 2)
+        self.assertEqual(count("GET", "unmatched", "404") - before[("GET", "unmatched", "404")], 1)
+        self.assertEqual(count("other", "/items/{item_id}", "200") - before[("other", "/items/{item_id}", "200")], 1)
+        self.assertEqual(sample("http_request_duration_seconds_count", method="PURGE", route="/items/{item_id}", status="200"), 0)
+        self.assertEqual(sample("http_requests_in_flight"), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
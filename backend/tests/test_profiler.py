@@ -0,0 +1,55 @@
+import os
+import sys
+import unittest
+import numpy as np
+import pandas as pd
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.profiler import profile_dataset
+from services.data_cleaning import DataCleaningService
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            "city": ["B", "A", None, "A", "B", "C"],
+            "sales": [3.0, 1.0, np.nan, 2.0, 8.0, np.nan],
+            "flag": [True, False, True, True, False, False],
+            "when": pd.to_datetime(["2024-01-02", None, "2024-01-01", "2024-01-01", "2024-01-02", None]),
+        })
+
+    def test_matches_pandas(self):
+        profile = profile_dataset(self.df)
+        self.assertEqual(profile["num_rows"], 6)
+        columns = {column["name"]: column for column in profile["columns"]}
+
+        for name in self.df.columns:
+            self.assertEqual(columns[name]["null_count"], int(self.df[name].isna().sum()))
+            self.assertEqual(columns[name]["distinct_count"], self.df[name].nunique())
+
+        # Ties resolve to the smallest value, like Series.mode()[0]
+        self.assertEqual(columns["city"]["mode"], self.df["city"].mode()[0])
+        self.assertEqual(columns["flag"]["mode"], bool(self.df["flag"].mode()[0]))
+        self.assertEqual(columns["when"]["mode"], self.df["when"].mode()[0].isoformat())
+        self.assertEqual(columns["sales"]["median"], self.df["sales"].median())
+        self.assertEqual([c["kind"] for c in profile["columns"]], ["text", "numeric", "boolean", "datetime"])
+
+    def test_parallel_matches_serial(self):
+        wide = pd.DataFrame(np.random.default_rng(0).integers(0, 50, size=(2000, 120)))
+        wide = wide.where(wide > 3)
+        self.assertEqual(profile_dataset(wide, max_workers=1), profile_dataset(wide, max_workers=4))
+
+    def test_summary_and_suggestions_use_profile(self):
+        service = DataCleaningService()
+        profile = profile_dataset(self.df)
+        summary = service.generate_summary(self.df, profile)
+        self.assertEqual(summary["missing_values"], {k: int(v) for k, v in self.df.isnull().sum().items()})
+
+        suggestions = {s["column"]: s for s in service.rule_based_suggestions(self.df, profile)}
+        self.assertEqual(suggestions["city"]["value"], "A")
+        self.assertEqual(suggestions["sales"]["value"], "median")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+import os
+import sys
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+import pandas as pd
+from fastapi.testclient import TestClient
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "test")
+
+import app as app_module
+import services.data_ingestion as data_ingestion
+import services.dashboard_cache as dashboard_cache
+import services.report_service as report_service
+from services.analytics_engine import AnalyticsEngine
+from services.report_refresh import ReportRefresher
+from services.report_service import ReportService
+from services.report_store import ReportVersionConflict
+
+
+class TestReportRefresh(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self._saved = (data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR, report_service.DATA_DIR)
+        data_ingestion.UPLOAD_DIR = os.path.join(self.tmp, "original")
+        data_ingestion.PROCESSED_DIR = os.path.join(self.tmp, "processed")
+        dashboard_cache.DATA_DIR = self.tmp
+        report_service.DATA_DIR = self.tmp
+        os.makedirs(os.path.join(data_ingestion.UPLOAD_DIR, "u1"))
+        self.writes = 0
+        self.write_dataset([10, 20, 30, 40])
+
+        self.engine = AnalyticsEngine()
+        self.reports = ReportService()
+        self.refresher = ReportRefresher(self.reports, self.engine)
+        self.report = self.reports.create_report("Sales", "f1", "u1")
+        by_region = {"query_type": "aggregation", "group_by": ["region"], "filters": []}
+        tiles = [
+            {"tile_id": "kpi", "type": "kpi", "title": "Total", "data": {"title": "Total", "value": 0},
+             "source": {"file_id": "f1", "plan": {"query_type": "aggregation", "metrics": [{"column": "sales", "operation": "sum"}]}}},
+            {"tile_id": "rows", "type": "kpi", "title": "Rows",
+             "source": {"file_id": "f1", "plan": {"query_type": "metadata"}}},
+            {"tile_id": "top", "type": "chart", "title": "Top region", "data": [],
+             "source": {"file_id": "f1", "plan": {**by_region, "metrics": [{"column": "sales", "operation": "sum"}],
+                                                  "sort": {"column": "sum_sales", "order": "desc"}, "limit": 1}}},
+            {"tile_id": "avg", "type": "chart", "title": "Average", "data": [],
+             "source": {"file_id": "f1", "plan": {**by_region, "metrics": [{"column": "sales", "operation": "avg"}]}}},
+            {"tile_id": "note", "type": "text", "title": "Note", "data": "Hello", "source": {"file_id": "f1"}},
+        ]
+        for tile in tiles:
+            self.reports.add_tile(self.report.report_id, tile, "u1")
+
+    def tearDown(self):
+        data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR, report_service.DATA_DIR = self._saved
+        shutil.rmtree(self.tmp)
+
+    def write_dataset(self, sales):
+        path = os.path.join(data_ingestion.UPLOAD_DIR, "u1", "f1.csv")
+        pd.DataFrame({"region": ["East", "West", "East", "West"], "sales": sales}).to_csv(path, index=False)
+        # The dataset version changes with the file's mtime and size
+        self.writes += 1
+        mtime = time.time() + self.writes
+        os.utime(path, (mtime, mtime))
+
+    def tiles(self, outcome):
+        return {tile.tile_id: tile for tile in outcome["report"].tiles}
+
+    def test_refresh_shares_passes_and_skips_unchanged_tiles(self):
+        with mock.patch.object(self.engine, "_execute", wraps=self.engine._execute) as execute:
+            outcome = self.refresher.refresh(self.report.report_id, "u1")
+        # KPI sum, row count, and one pass for both group-bys by region
+        self.assertEqual(execute.call_count, 3)
+        self.assertEqual(sorted(outcome["refreshed"]), ["avg", "kpi", "rows", "top"])
+        self.assertEqual(outcome["static"], ["note"])
+
+        tiles = self.tiles(outcome)
+        self.assertEqual(tiles["kpi"].data, {"title": "Total", "value": 100})
+        self.assertEqual(tiles["rows"].data["value"], 4)
+        self.assertEqual(tiles["top"].data, [{"region": "West", "sum_sales": 60}])
+        self.assertEqual(tiles["avg"].data, [{"region": "East", "avg_sales": 20.0}, {"region": "West", "avg_sales": 30.0}])
+        self.assertEqual(tiles["note"].data, "Hello")
+        # Persisted
+        stored = {tile.tile_id: tile for tile in self.reports.get_report(self.report.report_id, "u1").tiles}
+        self.assertEqual(stored["kpi"].data["value"], 100)
+
+        again = self.refresher.refresh(self.report.report_id, "u1")
+        self.assertEqual(sorted(again["unchanged"]), ["avg", "kpi", "rows", "top"])
+        self.assertEqual(again["refreshed"], [])
+
+        self.write_dataset([1, 2, 3, 4])
+        changed = self.refresher.refresh(self.report.report_id, "u1")
+        self.assertEqual(sorted(changed["refreshed"]), ["avg", "kpi", "rows", "top"])
+        self.assertEqual(self.tiles(changed)["kpi"].data["value"], 10)
+
+    def test_batch_matches_single_plans(self):
+        by_region = {"query_type": "aggregation", "group_by": ["region"]}
+        plans = [
+            {**by_region, "metrics": [{"column": "sales", "operation": "sum"}]},
+            # Only unknown columns or operations: per-group counts, as when run alone
+            {**by_region, "metrics": [{"column": "missing", "operation": "sum"}]},
+            {**by_region, "metrics": [{"column": "sales", "operation": "mode"}]},
+            {**by_region},
+            {"query_type": "aggregation", "metrics": [{"column": "missing", "operation": "sum"}]},
+            {"query_type": "aggregation"},
+        ]
+        batch = self.engine.execute_batch("f1", plans, "u1")
+        for plan, result in zip(plans, batch):
+            self.assertEqual(result, self.engine.execute_plan("f1", plan, "u1"), plan)
+        self.assertEqual(batch[1]["result"], [{"region": "East", "count": 2}, {"region": "West", "count": 2}])
+        # Skipped metrics are reported per plan, not for the whole shared pass
+        self.assertEqual(batch[1]["warnings"], ["Skipped metric sum(missing): unknown column 'missing'"])
+        self.assertNotIn("warnings", batch[0])
+
+        # A shared result lacking every metric of a plan fails that plan instead of returning bare keys
+        shared = {"result": pd.DataFrame({"region": ["East"], "avg_sales": [20.0]})}
+        selected = self.engine._select(shared, plans[0], {"avg_sales", "sum_sales"}, ["sum_sales"])
+        self.assertIn("error", selected)
+
+    def test_tiles_edited_during_a_refresh_are_kept(self):
+        execute_batch = self.engine.execute_batch
+
+        def edit_meanwhile(*args, **kwargs):
+            self.reports.add_tile(self.report.report_id, {"tile_id": "new", "type": "text", "title": "New"}, "u1")
+            self.reports.remove_tile(self.report.report_id, "avg", "u1")
+            return execute_batch(*args, **kwargs)
+
+        with mock.patch.object(self.engine, "execute_batch", side_effect=edit_meanwhile):
+            outcome = self.refresher.refresh(self.report.report_id, "u1")
+        stored = {tile.tile_id: tile for tile in self.reports.get_report(self.report.report_id, "u1").tiles}
+        self.assertEqual(sorted(stored), ["kpi", "new", "note", "rows", "top"])
+        self.assertEqual(stored["kpi"].data["value"], 100)
+        self.assertEqual(outcome["report"].version, self.reports.get_report(self.report.report_id, "u1").version)
+
+    def test_failed_tiles_keep_their_data(self):
+        self.reports.add_tile(self.report.report_id, {
+            "tile_id": "gone", "type": "chart", "title": "Gone", "data": [{"x": 1}],
+            "source": {"file_id": "missing", "plan": {"query_type": "aggregation", "group_by": ["x"]}}
+        }, "u1")
+        outcome = self.refresher.refresh(self.report.report_id, "u1")
+        self.assertEqual(outcome["failed"], ["gone"])
+        self.assertEqual(self.tiles(outcome)["gone"].data, [{"x": 1}])
+        self.assertIsNone(self.refresher.refresh("nope", "u1"))
+
+    def test_refresh_honours_expected_version(self):
+        version = self.reports.get_report(self.report.report_id, "u1").version
+        with self.assertRaises(ReportVersionConflict):
+            self.refresher.refresh(self.report.report_id, "u1", expected_version=version - 1)
+        self.assertEqual(self.reports.get_report(self.report.report_id, "u1").version, version)
+
+        # A write between the check and the save is not merged over
+        execute_batch = self.engine.execute_batch
+
+        def edit_meanwhile(*args, **kwargs):
+            self.reports.update_report(self.report.report_id, {"title": "Renamed"}, "u1")
+            return execute_batch(*args, **kwargs)
+
+        with mock.patch.object(self.engine, "execute_batch", side_effect=edit_meanwhile):
+            with self.assertRaises(ReportVersionConflict):
+                self.refresher.refresh(self.report.report_id, "u1", expected_version=version)
+        self.assertEqual(self.tiles({"report": self.reports.get_report(self.report.report_id, "u1")})["kpi"].data["value"], 0)
+
+    def test_refresh_endpoint_etags(self):
+        for name, value in (("report_service", self.reports), ("report_refresher", self.refresher)):
+            patcher = mock.patch.object(app_module, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        app_module.app.dependency_overrides[app_module.get_current_user] = lambda: {"sub": "u1"}
+        self.addCleanup(app_module.app.dependency_overrides.clear)
+        client = TestClient(app_module.app, headers={"Accept-Encoding": "identity"})
+        url = f"/api/v1/reports/{self.report.report_id}"
+
+        version = client.get(url).json()["version"]
+        self.assertEqual(client.post(f"{url}/refresh", headers={"If-Match": f'"{version - 1}"'}).status_code, 412)
+        refreshed = client.post(f"{url}/refresh", headers={"If-Match": f'"{version}"'})
+        self.assertEqual(refreshed.status_code, 200)
+        self.assertEqual(refreshed.headers["etag"], f'"{version + 1}"')
+
+        # Each representation has its own tag, and any of them works as If-Match
+        columnar = client.get(url, headers={"Accept": "application/json; format=columnar"})
+        self.assertEqual(columnar.headers["etag"], f'"{version + 1}-columnar"')
+        compressed = client.get(url, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(compressed.headers["etag"], f'"{version + 1}-gzip"')
+        response = client.put(url, json={"title": "Renamed"}, headers={"If-Match": columnar.headers["etag"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["etag"], f'"{version + 2}"')
+
+
+if __name__ == "__main__":
+    unittest.main()
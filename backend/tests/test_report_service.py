@@ -2,66 +2,156 @@ import unittest
 import os
 import json
 import sys
+import shutil
+import tempfile
+import threading
 # adjust path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from services.report_service import ReportService
+from services.report_store import JsonReportStore, ReportStore, ReportVersionConflict, SqliteReportStore
 
 class TestReportService(unittest.TestCase):
+    # Whether separate store instances (e.g. two workers) see each other's locks
+    shared_between_instances = True
+
+    def make_store(self):
+        return SqliteReportStore(os.path.join(self.tmp, "reports.db"), legacy_dir=self.tmp)
+
     def setUp(self):
-        # Use a temporary file for tests
-        self.service = ReportService()
-        # Override data file
-        self.original_file = self.service._load_reports
-        self.test_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "test_reports.json")
-        
-        # Monkey patch file path logic or just use a separate instance if possible?
-        # Since _load_reports reads from global constant in the module, standard patch or mock is needed.
-        # But for simplicity, I'll just check if I can modify the DATA_FILE location in logic.
-        # Actually report_service.py defines REPORTS_FILE globally.
-        # I will just write a functional test that creates a report and cleans it up.
-        
+        self.tmp = tempfile.mkdtemp()
+        self.service = ReportService(self.make_store())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
     def test_create_report(self):
-        report = self.service.create_report("Test Report")
+        report = self.service.create_report("Test Report", "f1", "u1")
         self.assertIsNotNone(report.report_id)
         self.assertEqual(report.title, "Test Report")
-        
-        # Verify persistence
-        loaded = self.service.get_report(report.report_id)
+
+        # Verify persistence, scoped to the owner
+        loaded = self.service.get_report(report.report_id, "u1")
         self.assertEqual(loaded.title, "Test Report")
-        
-        # Cleanup
-        self.service.delete_report(report.report_id)
-        
+        self.assertEqual(loaded.layout, {"columns": 2})
+        self.assertIsNone(self.service.get_report(report.report_id, "u2"))
+        self.assertFalse(self.service.delete_report(report.report_id, "u2"))
+
+        self.assertTrue(self.service.delete_report(report.report_id, "u1"))
+        self.assertIsNone(self.service.get_report(report.report_id, "u1"))
+
     def test_add_remove_tile(self):
-        report = self.service.create_report("Tile Test")
-        tile = {
-            "tile_id": "t1",
-            "type": "kpi",
-            "title": "KPI 1",
-            "data": {"value": 100}
-        }
-        
-        updated = self.service.add_tile(report.report_id, tile)
-        self.assertEqual(len(updated.tiles), 1)
-        self.assertEqual(updated.tiles[0].title, "KPI 1")
-        
-        updated = self.service.remove_tile(report.report_id, "t1")
-        self.assertEqual(len(updated.tiles), 0)
-        
-        self.service.delete_report(report.report_id)
+        report = self.service.create_report("Tile Test", "f1", "u1")
+        for i in range(3):
+            tile = {"tile_id": f"t{i}", "type": "kpi", "title": f"KPI {i}", "data": {"value": i}}
+            updated = self.service.add_tile(report.report_id, tile, "u1")
+        self.assertEqual([t.tile_id for t in updated.tiles], ["t0", "t1", "t2"])
+
+        # Re-adding a tile replaces it in place
+        updated = self.service.add_tile(report.report_id, {"tile_id": "t0", "type": "kpi", "title": "New"}, "u1")
+        self.assertEqual([t.title for t in updated.tiles], ["New", "KPI 1", "KPI 2"])
+
+        updated = self.service.remove_tile(report.report_id, "t1", "u1")
+        self.assertEqual([t.tile_id for t in updated.tiles], ["t0", "t2"])
+        self.assertIsNone(self.service.add_tile("missing", {"type": "text", "title": "x"}, "u1"))
+        self.assertIsNone(self.service.add_tile(report.report_id, {"type": "text", "title": "x"}, "u2"))
+
+        updated = self.service.update_report(report.report_id, {
+            "title": "Renamed",
+            "report_id": "ignored",
+            "tiles": [{"tile_id": "t2", "type": "kpi", "title": "KPI 2"}, {"type": "text", "title": "Note"}]
+        }, "u1")
+        self.assertEqual(updated.report_id, report.report_id)
+        self.assertEqual(updated.title, "Renamed")
+        self.assertEqual([t.title for t in updated.tiles], ["KPI 2", "Note"])
+        self.assertTrue(updated.tiles[1].tile_id)
 
     def test_list_reports(self):
-        r1 = self.service.create_report("Report 1")
-        r2 = self.service.create_report("Report 2")
-        
-        reports = self.service.list_reports()
-        ids = [r.report_id for r in reports]
-        self.assertIn(r1.report_id, ids)
-        self.assertIn(r2.report_id, ids)
-        
-        self.service.delete_report(r1.report_id)
-        self.service.delete_report(r2.report_id)
+        r1 = self.service.create_report("Report 1", "f1", "u1")
+        r2 = self.service.create_report("Report 2", "f1", "u1")
+        self.service.create_report("Other dataset", "f2", "u1")
+        self.service.create_report("Other user", "f1", "u2")
+        self.service.add_tile(r1.report_id, {"tile_id": "t1", "type": "text", "title": "T"}, "u1")
+
+        reports = self.service.list_reports("f1", "u1")
+        # Newest first
+        self.assertEqual([r.report_id for r in reports], [r2.report_id, r1.report_id])
+        self.assertEqual([t.tile_id for t in reports[1].tiles], ["t1"])
+        self.assertEqual(len(self.service.list_reports(None, "u1")), 3)
+
+    def test_concurrent_tile_adds_are_not_lost(self):
+        report = self.service.create_report("Busy", "f1", "u1")
+        # Another service instance stands in for a second worker
+        other = ReportService(self.make_store()) if self.shared_between_instances else self.service
+
+        def pin(service, start):
+            for i in range(start, start + 20):
+                service.add_tile(report.report_id, {"tile_id": f"t{i}", "type": "text", "title": str(i)}, "u1")
+
+        threads = [threading.Thread(target=pin, args=(svc, n * 20)) for n, svc in enumerate([self.service, other] * 2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        loaded = self.service.get_report(report.report_id, "u1")
+        self.assertEqual(len(loaded.tiles), 80)
+        self.assertEqual(loaded.version, 81)
+
+    def test_writes_compare_and_swap_versions(self):
+        report = self.service.create_report("Versioned", "f1", "u1")
+        self.assertEqual(report.version, 1)
+        updated = self.service.update_report(report.report_id, {"title": "Mine"}, "u1", expected_version=1)
+        self.assertEqual(updated.version, 2)
+
+        with self.assertRaises(ReportVersionConflict) as conflict:
+            self.service.update_report(report.report_id, {"title": "Stale"}, "u1", expected_version=1)
+        self.assertEqual(conflict.exception.current_version, 2)
+        with self.assertRaises(ReportVersionConflict):
+            self.service.add_tile(report.report_id, {"type": "text", "title": "x"}, "u1", expected_version=1)
+        with self.assertRaises(ReportVersionConflict):
+            self.service.delete_report(report.report_id, "u1", expected_version=1)
+        self.assertEqual(self.service.get_report(report.report_id, "u1").title, "Mine")
+        # Unknown reports are missing, not conflicting
+        self.assertIsNone(self.service.update_report("missing", {"title": "x"}, "u1", expected_version=1))
+        self.assertTrue(self.service.delete_report(report.report_id, "u1", expected_version=2))
+
+    def test_json_reports_are_migrated_once(self):
+        legacy = ReportService(JsonReportStore(self.tmp))
+        old = legacy.create_report("Old", "f1", "u3")
+        legacy.add_tile(old.report_id, {"tile_id": "t1", "type": "text", "title": "T", "data": "hi"}, "u3")
+        with open(os.path.join(self.tmp, "u3", "reports", "broken.json"), "w") as f:
+            f.write("{")
+
+        migrated = self.service.list_reports("f1", "u3")
+        self.assertEqual([r.report_id for r in migrated], [old.report_id])
+        self.assertEqual(migrated[0].tiles[0].data, "hi")
+
+        # A deleted report stays deleted, even in a new process
+        self.assertTrue(self.service.delete_report(old.report_id, "u3"))
+        self.assertEqual(ReportService(self.make_store()).list_reports("f1", "u3"), [])
+        with open(os.path.join(self.tmp, "u3", "reports", f"{old.report_id}.json")) as f:
+            self.assertEqual(json.load(f)["title"], "Old")
+
+
+class TestJsonReportService(TestReportService):
+    shared_between_instances = False
+
+    def make_store(self):
+        return JsonReportStore(self.tmp)
+
+    def test_json_reports_are_migrated_once(self):
+        pass
+
+    def test_reads_do_not_create_directories(self):
+        self.assertIsNone(self.service.get_report("missing", "u9"))
+        self.assertEqual(self.service.list_reports(None, "u9"), [])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, "u9")))
+        self.service.create_report("First", "f1", "u9")
+        self.assertTrue(os.path.isdir(os.path.join(self.tmp, "u9", "reports")))
+
+    def test_store_interface_is_abstract(self):
+        with self.assertRaises(TypeError):
+            ReportStore()
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.concurrency import run_in_threadpool
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.request_profiling as request_profiling
+from services.request_profiling import ProfileStore, ProfilingMiddleware, phase, profiled
+
+
+@profiled("test.work")
+def work():
+    with phase("test.inner"):
+        time.sleep(0.03)
+    return sum(range(10000))
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = ProfileStore(self.tmp, max_profiles=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def make_client(self, **options):
+        app = FastAPI()
+        app.add_middleware(ProfilingMiddleware, store=self.store, admin_token="secret", **options)
+
+        @app.get("/api/work")
+        async def endpoint():
+            # Phases also run in worker threads
+            return {"total": await run_in_threadpool(work)}
+
+        return TestClient(app)
+
+    def test_profiles_requests_with_the_admin_header(self):
+        client = self.make_client()
+        self.assertIsNone(client.get("/api/work").headers.get("x-profile-id"))
+        self.assertIsNone(client.get("/api/work", headers={"X-Profile": "sample", "X-Admin-Token": "wrong"}).headers.get("x-profile-id"))
+
+        for mode, suffix in (("sample", ".folded"), ("cprofile", ".prof")):
+            response = client.get("/api/work", headers={"X-Profile": mode, "X-Admin-Token": "secret"})
+            self.assertEqual(response.json(), {"total": 49995000})
+            profile = self.store.get(response.headers["x-profile-id"])
+            self.assertEqual(profile["mode"], mode)
+            self.assertEqual(profile["status"], 200)
+            phases = {p["name"]: p for p in profile["phases"]}
+            self.assertEqual(phases["test.work"]["calls"], 1)
+            self.assertGreaterEqual(phases["test.inner"]["total_ms"], 30)
+            self.assertTrue(profile["top"])
+            self.assertTrue(self.store.raw_path(profile["profile_id"]).endswith(suffix))
+
+        # Outside a profiled request phases are no-ops
+        self.assertEqual(work(), 49995000)
+
+    def test_sampling_rule_and_bounded_store(self):
+        client = self.make_client(sample_rate=1.0, sample_paths=["/api/"], default_mode="cprofile")
+        ids = [client.get("/api/work").headers["x-profile-id"] for _ in range(3)]
+        # Oldest dropped first
+        self.assertEqual(self.store.ids(), ids[1:])
+        self.assertEqual([p["profile_id"] for p in self.store.list()], ids[:0:-1])
+        self.assertIsNone(self.store.get("../secrets"))
+        self.assertIsNone(self.make_client(sample_rate=1.0, sample_paths=["/other/"]).get("/api/work").headers.get("x-profile-id"))
+
+    def test_cprofile_falls_back_to_sampling_when_busy(self):
+        class ActiveElsewhere(request_profiling.cProfile.Profile):
+            def enable(self, *args, **kwargs):
+                raise ValueError("Another profiling tool is already active")
+
+        client = self.make_client()
+        headers = {"X-Profile": "cprofile", "X-Admin-Token": "secret"}
+        # Held by another request's phase, or refused by the interpreter (Python 3.12+)
+        with request_profiling._cprofile_lock:
+            held = client.get("/api/work", headers=headers)
+        with mock.patch.object(request_profiling.cProfile, "Profile", ActiveElsewhere):
+            refused = client.get("/api/work", headers=headers)
+
+        for response in (held, refused):
+            self.assertEqual(response.status_code, 200)
+            profile = self.store.get(response.headers["x-profile-id"])
+            self.assertTrue(profile["sampled_fallback"])
+            self.assertEqual({p["name"] for p in profile["phases"]}, {"test.work", "test.inner"})
+            self.assertTrue(self.store.raw_path(profile["profile_id"]).endswith(".folded"))
+        # The slot was released, so the next request is profiled with cProfile again
+        profile = self.store.get(client.get("/api/work", headers=headers).headers["x-profile-id"])
+        self.assertFalse(profile["sampled_fallback"])
+
+
+if __name__ == '__main__':
+    unittest.main()
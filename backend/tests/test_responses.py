@@ -0,0 +1,91 @@
+import gzip
+import json
+import os
+import sys
+import unittest
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.compression import CompressionMiddleware, choose_encoding
+from services.json_response import FastJSONResponse, dumps
+
+
+def build_app() -> FastAPI:
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @app.get("/large")
+    def large():
+        return {"rows": [{"x": i, "y": float(i) / 3} for i in range(200)]}
+
+    @app.get("/tagged")
+    def tagged():
+        return FastJSONResponse({"rows": list(range(200))}, headers={"ETag": '"7"'})
+
+    @app.get("/small")
+    def small():
+        return {"ok": True}
+
+    @app.get("/events")
+    def events():
+        return StreamingResponse(iter(["event: a\ndata: {}\n\n"] * 100), media_type="text/event-stream")
+
+    @app.get("/export")
+    def export():
+        return StreamingResponse(iter([f"{i},row\n" for i in range(500)]), media_type="text/csv")
+
+    return app
+
+
+class TestResponses(unittest.TestCase):
+    def test_dumps_numpy_and_non_finite_values(self):
+        payload = {
+            "nan": float("nan"), "inf": np.float64("inf"), "int": np.int64(3),
+            "array": np.array([1.5, np.nan]), "when": pd.Timestamp("2024-01-02"), "missing": pd.NaT
+        }
+        self.assertEqual(json.loads(dumps(payload)), {
+            "nan": None, "inf": None, "int": 3, "array": [1.5, None], "when": "2024-01-02T00:00:00", "missing": None
+        })
+
+    def test_choose_encoding(self):
+        self.assertEqual(choose_encoding("gzip, deflate"), "gzip")
+        self.assertIsNone(choose_encoding("identity"))
+        self.assertIsNone(choose_encoding("gzip;q=0"))
+        self.assertIn(choose_encoding("*"), ("br", "gzip"))
+
+    def test_compresses_large_and_streamed_bodies_only(self):
+        client = TestClient(build_app())
+        headers = {"Accept-Encoding": "gzip"}
+
+        large = client.get("/large", headers=headers)
+        self.assertEqual(large.headers["content-encoding"], "gzip")
+        self.assertEqual(len(large.json()["rows"]), 200)
+        self.assertIn("Accept-Encoding", large.headers["vary"])
+
+        self.assertNotIn("content-encoding", client.get("/small", headers=headers).headers)
+        self.assertNotIn("content-encoding", client.get("/events", headers=headers).headers)
+        self.assertNotIn("content-encoding", client.get("/large", headers={"Accept-Encoding": "identity"}).headers)
+
+        export = client.get("/export", headers=headers)
+        self.assertEqual(export.headers["content-encoding"], "gzip")
+        self.assertEqual(export.text.splitlines()[-1], "499,row")
+
+    def test_compressed_bodies_get_their_own_etag(self):
+        client = TestClient(build_app())
+        self.assertEqual(client.get("/tagged", headers={"Accept-Encoding": "gzip"}).headers["etag"], '"7-gzip"')
+        self.assertEqual(client.get("/tagged", headers={"Accept-Encoding": "identity"}).headers["etag"], '"7"')
+
+    def test_streamed_chunks_decode_incrementally(self):
+        client = TestClient(build_app())
+        with client.stream("GET", "/export", headers={"Accept-Encoding": "gzip"}) as response:
+            raw = b"".join(response.iter_raw())
+        self.assertEqual(gzip.decompress(raw).decode().count("\n"), 500)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import io
+import json
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.analytics_engine as analytics_engine
+import services.data_ingestion as data_ingestion
+import services.dashboard_cache as dashboard_cache
+from services.analytics_engine import AnalyticsEngine
+from services.page_tokens import decode_page_token
+from services.streaming import iter_export
+
+
+class TestResultPagination(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self._saved = (data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR)
+        data_ingestion.UPLOAD_DIR = os.path.join(self.tmp, "original")
+        data_ingestion.PROCESSED_DIR = os.path.join(self.tmp, "processed")
+        dashboard_cache.DATA_DIR = self.tmp
+        os.makedirs(os.path.join(data_ingestion.UPLOAD_DIR, "u1"))
+        self.path = os.path.join(data_ingestion.UPLOAD_DIR, "u1", "f1.csv")
+        pd.DataFrame({"n": range(25), "even": [i % 2 == 0 for i in range(25)]}).to_csv(self.path, index=False)
+        self.engine = AnalyticsEngine()
+        self.plan = {
+            "query_type": "filter",
+            "filters": [{"column": "even", "operator": "equals", "value": True}],
+            "sort": {"column": "n", "order": "desc"}
+        }
+
+    def tearDown(self):
+        data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR = self._saved
+        shutil.rmtree(self.tmp)
+
+    def test_filter_results_are_capped_and_paged(self):
+        with mock.patch.object(analytics_engine, "MAX_INLINE_ROWS", 5):
+            first = self.engine.execute_plan("f1", self.plan, "u1")
+            self.assertEqual(len(first["result"]), 5)
+            self.assertEqual(first["total_rows"], 13)
+
+            rows, token = list(first["result"]), first["next_page_token"]
+            while token:
+                page = self.engine.execute_page(token, "u1", page_size=4)
+                self.assertLessEqual(len(page["result"]), 4)
+                rows += page["result"]
+                token = page["next_page_token"]
+
+        self.assertEqual([row["n"] for row in rows], list(range(24, -1, -2)))
+
+    def test_grouped_and_timeseries_results_are_capped(self):
+        pd.DataFrame({
+            "day": pd.date_range("2024-01-01", periods=25).strftime("%Y-%m-%d"), "n": range(25)
+        }).to_csv(os.path.join(data_ingestion.UPLOAD_DIR, "u1", "f2.csv"), index=False)
+        grouped = {"query_type": "aggregation", "group_by": ["n"], "metrics": [{"column": "n", "operation": "sum"}],
+                   "sort": {"column": "n", "order": "desc"}}
+        timeseries = {"query_type": "timeseries", "group_by": ["day"], "granularity": "day",
+                      "metrics": [{"column": "n", "operation": "sum"}]}
+
+        with mock.patch.object(analytics_engine, "MAX_INLINE_ROWS", 5):
+            result = self.engine.execute_plan("f1", grouped, "u1")
+            series = self.engine.execute_plan("f2", timeseries, "u1")
+            batch = self.engine.execute_batch("f1", [grouped, {**grouped, "limit": 3}], "u1")
+            small = self.engine.execute_plan("f1", {**grouped, "limit": 3}, "u1")
+
+        # Sorted before the cap: the top groups are kept
+        self.assertEqual([row["n"] for row in result["result"]], [24, 23, 22, 21, 20])
+        self.assertEqual((result["total_rows"], result["truncated"]), (25, True))
+        self.assertEqual(len(series["result"]), 5)
+        self.assertEqual((series["total_rows"], series["truncated"], series["granularity"]), (25, True, "day"))
+        self.assertEqual(batch, [result, small])
+        self.assertEqual((small["total_rows"], small["truncated"]), (3, False))
+
+    def test_export_streams_the_whole_result(self):
+        with mock.patch.object(analytics_engine, "MAX_INLINE_ROWS", 2):
+            token = self.engine.execute_plan("f1", self.plan, "u1")["next_page_token"]
+        self.assertEqual(decode_page_token(token)["offset"], 2)
+
+        rows = self.engine.export_rows(token, "u1")
+        ndjson = "".join(iter_export(rows, "ndjson", chunk_rows=5))
+        self.assertEqual([json.loads(line)["n"] for line in ndjson.splitlines()], list(range(24, -1, -2)))
+        exported = pd.read_csv(io.StringIO("".join(iter_export(rows, "csv", chunk_rows=5))))
+        self.assertEqual(exported["n"].tolist(), list(range(24, -1, -2)))
+
+    def test_rejects_invalid_and_outdated_tokens(self):
+        with self.assertRaises(ValueError):
+            self.engine.execute_page("not-a-token", "u1")
+
+        with mock.patch.object(analytics_engine, "MAX_INLINE_ROWS", 2):
+            token = self.engine.execute_plan("f1", self.plan, "u1")["next_page_token"]
+        pd.DataFrame({"n": [1], "even": [False]}).to_csv(self.path, index=False)
+        with self.assertRaises(ValueError):
+            self.engine.execute_page(token, "u1")
+
+
+if __name__ == "__main__":
+    unittest.main()
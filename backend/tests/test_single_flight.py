@@ -0,0 +1,84 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.single_flight import SingleFlight, AsyncSingleFlight, stable_hash
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+        results = []
+
+        def work():
+            calls.append(1)
+            time.sleep(0.1)
+            return {"value": 42}
+
+        threads = [threading.Thread(target=lambda: results.append(flight.do("k", work))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(r is results[0] for r in results))
+
+    def test_exception_is_shared_and_key_released(self):
+        flight = SingleFlight()
+
+        def boom():
+            raise ValueError("bad")
+
+        with self.assertRaises(ValueError):
+            flight.do("k", boom)
+        # Nothing is cached after the call finishes
+        self.assertEqual(flight.do("k", lambda: 1), 1)
+
+    def test_stable_hash_ignores_key_order(self):
+        self.assertEqual(stable_hash({"a": 1, "b": [1, 2]}), stable_hash({"b": [1, 2], "a": 1}))
+
+
+class TestAsyncSingleFlight(unittest.TestCase):
+    def test_concurrent_coroutines_share_one_call(self):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def plan(summary):
+            calls.append(summary)
+            await asyncio.sleep(0.05)
+            return {"dashboard": summary}
+
+        async def run():
+            return await asyncio.gather(*(flight.do("k", plan, "s") for _ in range(4)))
+
+        results = asyncio.run(run())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"dashboard": "s"}] * 4)
+
+    def test_cancelled_caller_does_not_cancel_shared_work(self):
+        flight = AsyncSingleFlight()
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        async def run():
+            first = asyncio.ensure_future(flight.do("k", slow))
+            second = asyncio.ensure_future(flight.do("k", slow))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        self.assertEqual(asyncio.run(run()), "done")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.data_ingestion as data_ingestion
+import services.dashboard_cache as dashboard_cache
+import services.analytics_engine as analytics_engine
+from services.analytics_engine import AnalyticsEngine
+from services.sketches import HyperLogLog, TDigest, grouped_approx_distinct_counts
+
+
+class TestSketches(unittest.TestCase):
+    def test_tdigest_quantiles_and_merge(self):
+        values = np.random.default_rng(0).lognormal(size=200_000)
+        digest = TDigest().add(values)
+        self.assertLessEqual(len(digest.means), digest.compression // 2 + 1)
+        for q in (0.01, 0.5, 0.9, 0.99):
+            self.assertAlmostEqual(digest.quantile(q), np.quantile(values, q), delta=0.01 * np.quantile(values, q))
+
+        halves = TDigest().add(values[:100_000]).merge(TDigest().add(values[100_000:]))
+        self.assertEqual(halves.count, len(values))
+        self.assertAlmostEqual(halves.quantile(0.5), np.median(values), delta=0.01)
+        restored = TDigest.from_dict(halves.to_dict())
+        self.assertEqual(restored.quantile(0.9), halves.quantile(0.9))
+
+    def test_tdigest_small_inputs_are_exact(self):
+        self.assertEqual(TDigest().add([4, 1, np.nan, 3, 2]).quantile(0.25), np.quantile([1, 2, 3, 4], 0.25))
+        self.assertTrue(np.isnan(TDigest().quantile(0.5)))
+
+    def test_hll_round_trip(self):
+        sketch = HyperLogLog(precision=12).add(pd.Series(np.arange(50_000)))
+        restored = HyperLogLog.from_dict(sketch.to_dict())
+        self.assertEqual(restored.count(), sketch.count())
+        self.assertEqual(restored.merge(HyperLogLog(precision=12).add(pd.Series(np.arange(50_000)))).count(), sketch.count())
+
+    def test_grouped_distinct_counts(self):
+        rng = np.random.default_rng(1)
+        codes = rng.integers(0, 5, 100_000)
+        values = pd.Series(rng.integers(0, 20_000, 100_000)).astype(str)
+        counts = grouped_approx_distinct_counts(np.r_[codes, -1], pd.concat([values, pd.Series(["x"])]), 6)
+        exact = values.groupby(codes).nunique().to_numpy()
+        np.testing.assert_allclose(counts[:5], exact, rtol=0.05)
+        self.assertEqual(counts[5], 0)
+
+
+class TestApproximateOperations(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self._saved = (data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR, analytics_engine.APPROX_MIN_ROWS)
+        data_ingestion.UPLOAD_DIR = os.path.join(self.tmp, "original")
+        data_ingestion.PROCESSED_DIR = os.path.join(self.tmp, "processed")
+        dashboard_cache.DATA_DIR = self.tmp
+        # Approximate from the first row, as on a large dataset
+        analytics_engine.APPROX_MIN_ROWS = 0
+        os.makedirs(os.path.join(data_ingestion.UPLOAD_DIR, "u1"))
+        rng = np.random.default_rng(2)
+        self.df = pd.DataFrame({
+            "customer": [f"c{i}" for i in rng.integers(0, 3000, 20_000)],
+            "region": rng.choice(["East", "West"], 20_000),
+            "amount": rng.normal(100, 20, 20_000).round(2),
+        })
+        self.df.to_csv(os.path.join(data_ingestion.UPLOAD_DIR, "u1", "f1.csv"), index=False)
+        self.engine = AnalyticsEngine()
+        self.plan = {"query_type": "aggregation", "metrics": [
+            {"column": "customer", "operation": "approx_count_distinct"},
+            {"column": "amount", "operation": "approx_median"},
+            {"column": "amount", "operation": "approx_p95"},
+        ]}
+
+    def tearDown(self):
+        data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR, analytics_engine.APPROX_MIN_ROWS = self._saved
+        shutil.rmtree(self.tmp)
+
+    def test_unfiltered_queries_read_persisted_sketches(self):
+        before = self.engine.execute_plan("f1", self.plan, "u1")["result"]
+        # Before profiling the rows are scanned
+        self.assertEqual(before["approx_count_distinct_customer"], self.df["customer"].nunique())
+        self.assertEqual(before["approx_median_amount"], self.df["amount"].median())
+
+        self.engine.profiler.get_profile("f1", "u1")
+        sketches = self.engine.profiler.get_sketches("f1", "u1")
+        self.assertEqual(set(sketches), {"customer", "region", "amount"})
+        self.assertIsNone(sketches["customer"]["tdigest"])
+
+        result = self.engine.execute_plan("f1", self.plan, "u1")["result"]
+        hll = HyperLogLog.from_dict(sketches["customer"]["hll"])
+        self.assertEqual(result["approx_count_distinct_customer"], round(hll.count()))
+        self.assertAlmostEqual(result["approx_count_distinct_customer"], self.df["customer"].nunique(), delta=100)
+        self.assertAlmostEqual(result["approx_median_amount"], self.df["amount"].median(), delta=0.5)
+        self.assertAlmostEqual(result["approx_p95_amount"], self.df["amount"].quantile(0.95), delta=0.5)
+
+    def test_filtered_and_grouped_queries_use_the_rows(self):
+        self.engine.profiler.get_profile("f1", "u1")
+        east = self.df[self.df["region"] == "East"]
+        filtered = {**self.plan, "filters": [{"column": "region", "operator": "equals", "value": "East"}]}
+        result = self.engine.execute_plan("f1", filtered, "u1")["result"]
+        self.assertEqual(result["approx_count_distinct_customer"], east["customer"].nunique())
+        self.assertEqual(result["approx_p95_amount"], east["amount"].quantile(0.95))
+
+        rows = self.engine.execute_plan("f1", {**self.plan, "group_by": ["region"]}, "u1")["result"]
+        exact = self.df.groupby("region")["customer"].nunique()
+        for row in rows:
+            self.assertAlmostEqual(row["approx_count_distinct_customer"], exact[row["region"]], delta=0.05 * exact[row["region"]])
+
+    def test_small_inputs_are_exact(self):
+        analytics_engine.APPROX_MIN_ROWS = len(self.df) + 1
+        self.engine.profiler.get_profile("f1", "u1")
+        result = self.engine.execute_plan("f1", self.plan, "u1")["result"]
+        self.assertEqual(result["approx_count_distinct_customer"], self.df["customer"].nunique())
+        self.assertEqual(result["approx_median_amount"], self.df["amount"].median())
+        self.assertEqual(result["approx_p95_amount"], self.df["amount"].quantile(0.95))
+
+        rows = self.engine.execute_plan("f1", {**self.plan, "group_by": ["region"]}, "u1")["result"]
+        exact = self.df.groupby("region")["customer"].nunique()
+        self.assertEqual({row["region"]: row["approx_count_distinct_customer"] for row in rows}, exact.to_dict())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import json
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from unittest import mock
+import pandas as pd
+from fastapi.testclient import TestClient
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "test")
+
+import app as app_module
+import services.data_ingestion as data_ingestion
+import services.dashboard_cache as dashboard_cache
+from services.streaming import format_sse
+
+
+def parse_sse(text):
+    """(event, data) pairs of an event stream."""
+    events = []
+    for frame in text.split("\n\n"):
+        if not frame:
+            continue
+        lines = dict(line.split(": ", 1) for line in frame.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class StubLLM:
+    """Canned LLM answers; records the thread each call runs on (the event loop's)."""
+    model = "stub"
+    provider = "stub"
+
+    def __init__(self):
+        self.loop_threads = set()
+
+    async def get_analytics_intent(self, query):
+        self.loop_threads.add(threading.get_ident())
+        return {"intent": "aggregation"}
+
+    async def get_analytics_insight(self, schema_summary, query, intent):
+        return {"query_type": "aggregation", "metrics": [{"column": "sales", "operation": "sum"}],
+                "group_by": ["region"], "explanation": "Sales by region"}
+
+    async def stream_analytics_explanation(self, query, explanation, preview):
+        for text in ("West ", "leads."):
+            yield text
+
+    async def stream_data_story(self, context):
+        self.loop_threads.add(threading.get_ident())
+        for text in ("Sales ", "grew."):
+            yield text
+
+
+class TestFormatSse(unittest.TestCase):
+    def test_frames(self):
+        frame = format_sse("token", {"text": "a\nb", "at": datetime(2024, 1, 2)})
+        self.assertTrue(frame.endswith("\n\n"))
+        lines = frame[:-2].split("\n")
+        # The payload is one JSON line, so newlines in values can't break the frame
+        self.assertEqual(lines, ["event: token", 'data: {"text": "a\\nb", "at": "2024-01-02 00:00:00"}'])
+        self.assertEqual(parse_sse(frame + format_sse("done", {})), [("token", {"text": "a\nb", "at": "2024-01-02 00:00:00"}), ("done", {})])
+
+
+class TestStreamingEndpoints(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self._saved = (data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR)
+        data_ingestion.UPLOAD_DIR = os.path.join(self.tmp, "original")
+        data_ingestion.PROCESSED_DIR = os.path.join(self.tmp, "processed")
+        dashboard_cache.DATA_DIR = self.tmp
+        os.makedirs(os.path.join(data_ingestion.UPLOAD_DIR, "u1"))
+        pd.DataFrame({"region": ["East", "West", "East", "West"], "sales": [10, 20, 30, 40]}).to_csv(
+            os.path.join(data_ingestion.UPLOAD_DIR, "u1", "f1.csv"), index=False
+        )
+
+        self.llm = StubLLM()
+        patcher = mock.patch.object(app_module, "llm_client", self.llm)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        app_module.app.dependency_overrides[app_module.get_current_user] = lambda: {"sub": "u1"}
+        self.addCleanup(app_module.app.dependency_overrides.clear)
+        self.client = TestClient(app_module.app)
+
+    def tearDown(self):
+        data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR = self._saved
+        shutil.rmtree(self.tmp)
+
+    def test_chat_stream_events(self):
+        plan_threads = set()
+        execute_plan = app_module.analytics_engine.execute_plan
+
+        def recording_execute_plan(*args, **kwargs):
+            plan_threads.add(threading.get_ident())
+            return execute_plan(*args, **kwargs)
+
+        with mock.patch.object(app_module.analytics_engine, "execute_plan", side_effect=recording_execute_plan):
+            response = self.client.post("/api/v1/chat/query/stream", json={"file_id": "f1", "query": "sales by region"})
+        self.assertEqual(response.headers["content-type"], "text/event-stream; charset=utf-8")
+        self.assertEqual(response.headers["x-accel-buffering"], "no")
+
+        events = parse_sse(response.text)
+        self.assertEqual([event for event, _ in events], ["progress"] * 4 + ["result", "token", "token", "done"])
+        self.assertEqual([data["stage"] for event, data in events if event == "progress"],
+                         ["dataset_loaded", "intent_classified", "plan_ready", "query_executed"])
+        result = dict(events)["result"]
+        self.assertEqual(result["chart_data"], [{"region": "East", "sum_sales": 40}, {"region": "West", "sum_sales": 60}])
+        self.assertEqual(events[-1], ("done", {"explanation": "West leads."}))
+        # The plan ran in a worker thread, not on the event loop
+        self.assertTrue(plan_threads)
+        self.assertFalse(plan_threads & self.llm.loop_threads)
+
+    def test_story_stream_events(self):
+        dashboard = {"kpis": [{"title": "Total sales", "value": 100}], "trends": [], "distributions": []}
+        context_threads = set()
+        build = app_module.DataStoryService._build_story_context
+
+        def recording_build(service, *args):
+            context_threads.add(threading.get_ident())
+            return build(service, *args)
+
+        with mock.patch.object(app_module.DataStoryService, "_build_story_context", recording_build):
+            response = self.client.post("/api/v1/data-story/stream", json={"file_id": "f1", "dashboard_data": dashboard})
+        events = parse_sse(response.text)
+        self.assertEqual([event for event, _ in events], ["progress", "token", "token", "done"])
+        self.assertEqual(events[0][1], {"stage": "context_ready"})
+        self.assertEqual(events[-1][1]["story"], "Sales grew.")
+        self.assertTrue(context_threads)
+        self.assertFalse(context_threads & self.llm.loop_threads)
+
+        self.assertEqual(self.client.post("/api/v1/data-story/stream", json={}).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auth.supabase_auth as supabase_auth
+from auth.supabase_auth import JwksCache, VerifiedTokenCache, verify_supabase_jwt
+
+
+SECRET = "test-secret-that-is-at-least-32-bytes"
+
+
+def ec_jwk(private_key, kid):
+    jwk = json.loads(jwt.algorithms.ECAlgorithm.to_jwk(private_key.public_key()))
+    return {**jwk, "kid": kid, "alg": "ES256", "use": "sig"}
+
+
+class TestSupabaseAuth(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.key = ec.generate_private_key(ec.SECP256R1())
+        self.jwks_path = os.path.join(self.tmp, "jwks.json")
+        self.write_jwks([ec_jwk(self.key, "k1")])
+        patches = {
+            "AUTH_MODE": "supabase",
+            "SUPABASE_JWT_SECRET": SECRET,
+            "_jwks": JwksCache(path=self.jwks_path, min_reload_seconds=0),
+            "_token_cache": VerifiedTokenCache(ttl_seconds=300),
+        }
+        for name, value in patches.items():
+            patcher = mock.patch.object(supabase_auth, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write_jwks(self, keys):
+        with open(self.jwks_path, "w") as f:
+            json.dump({"keys": keys}, f)
+
+    def es256(self, key, kid, **claims):
+        payload = {"sub": "u1", "exp": int(time.time()) + 3600, **claims}
+        return jwt.encode(payload, key, algorithm="ES256", headers={"kid": kid})
+
+    def test_es256_tokens_are_verified_against_the_jwks(self):
+        self.assertEqual(verify_supabase_jwt(self.es256(self.key, "k1"))["sub"], "u1")
+
+        forged = self.es256(ec.generate_private_key(ec.SECP256R1()), "k1")
+        with self.assertRaisesRegex(Exception, "Invalid token"):
+            verify_supabase_jwt(forged)
+        with self.assertRaisesRegex(Exception, "Unknown signing key"):
+            verify_supabase_jwt(self.es256(self.key, "other"))
+
+        # Rotated keys are picked up when an unknown kid shows up
+        rotated = ec.generate_private_key(ec.SECP256R1())
+        self.write_jwks([ec_jwk(self.key, "k1"), ec_jwk(rotated, "k2")])
+        self.assertEqual(verify_supabase_jwt(self.es256(rotated, "k2", sub="u2"))["sub"], "u2")
+
+    def test_verified_tokens_are_cached_until_they_expire(self):
+        token = jwt.encode({"sub": "u1", "exp": int(time.time()) + 3600}, SECRET, algorithm="HS256")
+        with mock.patch.object(supabase_auth.jwt, "decode", wraps=jwt.decode) as decode:
+            for _ in range(3):
+                self.assertEqual(verify_supabase_jwt(token)["sub"], "u1")
+        self.assertEqual(decode.call_count, 1)
+
+        with self.assertRaisesRegex(Exception, "Invalid token"):
+            verify_supabase_jwt(jwt.encode({"sub": "u1"}, "wrong-" + SECRET, algorithm="HS256"))
+
+        cache = VerifiedTokenCache(ttl_seconds=300)
+        cache.put("a", {"sub": "u1", "exp": time.time() - 1})
+        cache.put("b", {"sub": "u1"})
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), {"sub": "u1"})
+        self.assertIsNone(VerifiedTokenCache(ttl_seconds=0).get("b"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+# adjust path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.data_ingestion as data_ingestion
+import services.dashboard_cache as dashboard_cache
+import services.timeseries as timeseries
+from services.analytics_engine import AnalyticsEngine
+from services.dashboard_service import DashboardService
+from services.timeseries import bucket, choose_granularity
+
+
+class TestTimeseries(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self._saved = (data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR)
+        data_ingestion.UPLOAD_DIR = os.path.join(self.tmp, "original")
+        data_ingestion.PROCESSED_DIR = os.path.join(self.tmp, "processed")
+        dashboard_cache.DATA_DIR = self.tmp
+        os.makedirs(os.path.join(data_ingestion.UPLOAD_DIR, "u1"))
+        # One row every 6 hours for 60 days
+        stamps = pd.date_range("2024-01-01", periods=240, freq="6h")
+        pd.DataFrame({
+            "order_time": stamps.strftime("%Y-%m-%d %H:%M:%S"),
+            "region": np.where(np.arange(240) % 2 == 0, "East", "West"),
+            "sales": np.arange(240, dtype=float),
+        }).to_csv(os.path.join(data_ingestion.UPLOAD_DIR, "u1", "f1.csv"), index=False)
+        self.engine = AnalyticsEngine()
+
+    def tearDown(self):
+        data_ingestion.UPLOAD_DIR, data_ingestion.PROCESSED_DIR, dashboard_cache.DATA_DIR = self._saved
+        shutil.rmtree(self.tmp)
+
+    def test_choose_granularity(self):
+        start = pd.Timestamp("2024-01-01")
+        self.assertEqual(choose_granularity(start, start + pd.Timedelta(hours=5), 500), "minute")
+        self.assertEqual(choose_granularity(start, start + pd.Timedelta(days=60), 500), "day")
+        self.assertEqual(choose_granularity(start, start + pd.Timedelta(days=3 * 365), 500), "week")
+        self.assertEqual(choose_granularity(start, start + pd.Timedelta(days=3 * 365), 50), "month")
+
+    def test_bucket_labels_and_aggregates(self):
+        df = pd.DataFrame({"v": [1.0, 2.0, 4.0]})
+        dates = pd.Series(pd.to_datetime(["2024-01-03", "2024-01-09", "2024-01-10"]))
+        result, granularity = bucket(df, dates, [{"column": "v", "operation": "sum"}], [], "d", granularity="week")
+        self.assertEqual(granularity, "week")
+        self.assertEqual(result.to_dict(orient="records"), [
+            {"d": "2024-01-01", "sum_v": 1.0}, {"d": "2024-01-08", "sum_v": 6.0}
+        ])
+
+    def test_plan_buckets_filtered_rows_and_parses_once(self):
+        plan = {
+            "query_type": "timeseries",
+            "metrics": [{"column": "sales", "operation": "sum"}],
+            "group_by": ["order_time"],
+            "filters": [{"column": "region", "operator": "equals", "value": "East"}],
+        }
+        with mock.patch.object(timeseries, "parse_datetimes", wraps=timeseries.parse_datetimes) as parse:
+            result = self.engine.execute_plan("f1", plan, "u1")
+            self.engine.execute_plan("f1", {**plan, "filters": [], "granularity": "week"}, "u1")
+        self.assertEqual(parse.call_count, 1)
+
+        self.assertEqual(result["granularity"], "day")
+        rows = result["result"]
+        self.assertEqual(len(rows), 60)
+        # East rows are the 00:00 and 12:00 orders: indices 4d and 4d + 2 on day d
+        self.assertEqual(rows[0], {"order_time": "2024-01-01", "sum_sales": 2.0})
+        self.assertEqual(rows[1], {"order_time": "2024-01-02", "sum_sales": 10.0})
+
+        capped = self.engine.execute_plan("f1", {**plan, "filters": [], "max_points": 10}, "u1")
+        self.assertEqual(capped["granularity"], "week")
+        self.assertEqual(sum(row["sum_sales"] for row in capped["result"]), float(sum(range(240))))
+
+    def test_fallback_dashboard_has_a_trend(self):
+        dashboard = DashboardService().generate_fallback_dashboard("f1", "u1")
+        trend = dashboard["trends"][0]
+        self.assertEqual(trend["config"], {"x": "order_time", "y": "count", "granularity": "day"})
+        self.assertEqual(sum(point["count"] for point in trend["data"]), 240)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -15,7 +15,7 @@ import { exportToPDF, exportToPNG } from "@/lib/export-utils"
 
 import { ReportCanvas } from "./report/report-canvas"
 import { TileSidebar } from "./report/tile-sidebar"
-import { DashboardTile, Report } from "@/types/report"
+import { DashboardTile, Report, ReportRefreshResult } from "@/types/report"
 
 const Plot = dynamic(() => import("react-plotly.js"), { ssr: false })
 
@@ -106,12 +106,38 @@ export function DashboardOverview({ fileId }: DashboardOverviewProps) {
         onSuccess: () => refetchActiveReport()
     })
 
+    const refreshReportMutation = useMutation({
+        mutationFn: async () => {
+            if (!activeReportId) return
+            const res = await axios.post<ReportRefreshResult>(`/api/v1/reports/${activeReportId}/refresh`)
+            return res.data
+        },
+        onSuccess: (result) => {
+            refetchActiveReport()
+            if (!result) return
+            if (result.failed.length > 0) {
+                toast.warning(`Refreshed ${result.refreshed.length} tiles, ${result.failed.length} failed`)
+            } else {
+                toast.success(result.refreshed.length > 0 ? `Refreshed ${result.refreshed.length} tiles` : "Report is up to date")
+            }
+        },
+        onError: () => toast.error("Failed to refresh report")
+    })
+
     const updateReportMutation = useMutation({
         mutationFn: async (payload: { tiles?: DashboardTile[], title?: string }) => {
             if (!activeReportId) return
-            await axios.put(`/api/v1/reports/${activeReportId}`, payload)
+            // Only apply if nobody changed the report since we loaded it
+            const headers = activeReport?.version ? { "If-Match": `"${activeReport.version}"` } : undefined
+            await axios.put(`/api/v1/reports/${activeReportId}`, payload, { headers })
         },
-        onSuccess: () => refetchActiveReport()
+        onSuccess: () => refetchActiveReport(),
+        onError: (error: any) => {
+            if (error?.response?.status === 412) {
+                toast.warning("This report was changed elsewhere. Reloaded the latest version.")
+                refetchActiveReport()
+            }
+        }
     })
 
 
@@ -124,7 +150,7 @@ export function DashboardOverview({ fileId }: DashboardOverviewProps) {
                 type: 'kpi',
                 title: kpi.title,
                 data: kpi,
-                source: { file_id: fileId }
+                source: { file_id: fileId, plan: kpi.plan }
             })
         })
         dashboard.trends?.forEach((chart: any, i: number) => {
@@ -135,7 +161,7 @@ export function DashboardOverview({ fileId }: DashboardOverviewProps) {
                 data: chart.data,
                 chart_type: chart.chart_type,
                 config: chart.config,
-                source: { file_id: fileId }
+                source: { file_id: fileId, plan: chart.plan }
             })
         })
         dashboard.distributions?.forEach((chart: any, i: number) => {
@@ -146,7 +172,7 @@ export function DashboardOverview({ fileId }: DashboardOverviewProps) {
                 data: chart.data,
                 chart_type: chart.chart_type,
                 config: chart.config,
-                source: { file_id: fileId }
+                source: { file_id: fileId, plan: chart.plan }
             })
         })
     }
@@ -263,7 +289,7 @@ export function DashboardOverview({ fileId }: DashboardOverviewProps) {
                                     type: 'kpi',
                                     title: kpi.title,
                                     data: kpi,
-                                    source: { file_id: fileId }
+                                    source: { file_id: fileId, plan: kpi.plan }
                                 }
                                 const isAdded = addedTileIds.includes(tileId)
                                 return (
@@ -303,7 +329,7 @@ export function DashboardOverview({ fileId }: DashboardOverviewProps) {
                                         data: chart.data,
                                         chart_type: chart.chart_type,
                                         config: chart.config,
-                                        source: { file_id: fileId }
+                                        source: { file_id: fileId, plan: chart.plan }
                                     }
                                     return (
                                         <ChartCard
@@ -328,7 +354,7 @@ export function DashboardOverview({ fileId }: DashboardOverviewProps) {
                                         data: chart.data,
                                         chart_type: chart.chart_type,
                                         config: chart.config,
-                                        source: { file_id: fileId }
+                                        source: { file_id: fileId, plan: chart.plan }
                                     }
                                     return (
                                         <ChartCard
@@ -387,6 +413,8 @@ export function DashboardOverview({ fileId }: DashboardOverviewProps) {
                                 onRemoveTile={(id) => removeTileMutation.mutate(id)}
                                 onUpdateLayout={(tiles) => updateReportMutation.mutate({ tiles })}
                                 onUpdateTitle={(title) => updateReportMutation.mutate({ title })}
+                                onRefresh={() => refreshReportMutation.mutate()}
+                                isRefreshing={refreshReportMutation.isPending}
                                 fileId={fileId}
                             />
                             <div className="hidden xl:block h-full">
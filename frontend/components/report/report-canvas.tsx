@@ -4,7 +4,7 @@ import React, { useState, useRef } from 'react';
 import dynamic from 'next/dynamic';
 import { Card, CardHeader, CardTitle, CardContent } from "@/components/ui/card";
 import { Button } from "@/components/ui/button";
-import { X, GripVertical, Download, FileText, FileImage, FileJson } from "lucide-react";
+import { X, GripVertical, Download, FileText, FileImage, FileJson, RefreshCw } from "lucide-react";
 import { Report, DashboardTile } from "@/types/report";
 import { exportToPDF, exportToPNG } from "@/lib/export-utils";
 
@@ -23,6 +23,8 @@ interface ReportCanvasProps {
     onRemoveTile: (tileId: string) => void;
     onUpdateLayout: (tiles: DashboardTile[]) => void;
     onUpdateTitle: (title: string) => void;
+    onRefresh?: () => void;
+    isRefreshing?: boolean;
     fileId: string;
 }
 
@@ -31,6 +33,8 @@ export const ReportCanvas: React.FC<ReportCanvasProps> = ({
     onRemoveTile,
     onUpdateLayout,
     onUpdateTitle,
+    onRefresh,
+    isRefreshing,
     fileId
 }) => {
     const [draggedTileIndex, setDraggedTileIndex] = useState<number | null>(null);
@@ -82,6 +86,11 @@ export const ReportCanvas: React.FC<ReportCanvasProps> = ({
                     placeholder="Report Title..."
                 />
                 <div className="flex gap-2 items-center">
+                    {onRefresh && (
+                        <Button variant="outline" size="sm" onClick={onRefresh} disabled={isRefreshing} title="Re-run tile queries on the current data">
+                            <RefreshCw className={`w-4 h-4 mr-2 ${isRefreshing ? 'animate-spin' : ''}`} /> Refresh
+                        </Button>
+                    )}
                     <Download className="w-4 h-4 text-muted-foreground" />
                     <Button variant="outline" size="sm" onClick={handleExportPDF}>
                         <FileText className="w-4 h-4 mr-2" /> PDF
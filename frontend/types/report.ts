@@ -10,13 +10,26 @@ export interface DashboardTile {
     source?: {
         file_id?: string;
         query?: string;
+        plan?: Record<string, any>; // Analytics DSL plan; makes the tile refreshable
+        dataset_version?: string; // Set by report refresh
+        input_hash?: string;
+        refreshed_at?: string;
     };
 }
 
+export interface ReportRefreshResult {
+    report: Report;
+    refreshed: string[];
+    unchanged: string[];
+    failed: string[];
+    static: string[];
+}
+
 export interface Report {
     report_id: string;
     title: string;
     created_at: string;
     tiles: DashboardTile[];
     layout?: any;
+    version?: number; // Incremented by every write; send as If-Match to avoid overwriting newer changes
 }